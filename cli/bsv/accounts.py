@@ -0,0 +1,129 @@
+"""Registry of the users of a `WalletManager`, with per-user state loaded on first use."""
+
+from typing import Any, Callable
+
+from tx_engine import Wallet
+
+_NOT_LOADED = object()
+
+
+class LazyColumn:
+    """A list with one entry per user, each computed by `load(index)` the first time it is accessed.
+
+    Args:
+        size (int): The number of users.
+        load (Callable[[int], Any]): Computes the entry of the user at `index`.
+    """
+
+    def __init__(self, size: int, load: Callable[[int], Any]):
+        self._values = [_NOT_LOADED] * size
+        self._load = load
+
+    def __getitem__(self, index: int):
+        value = self._values[index]
+        if value is _NOT_LOADED:
+            value = self._load(range(len(self._values))[index])
+            self._values[index] = value
+        return value
+
+    def __setitem__(self, index: int, value):
+        self._values[index] = value
+        return
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self._values)))
+
+    def append(self, value):
+        self._values.append(value)
+        return
+
+    def is_loaded(self, index: int) -> bool:
+        return self._values[index] is not _NOT_LOADED
+
+
+class UserColumns:
+    """Columns holding the state of each user, loaded together the first time any of them is accessed.
+
+    Args:
+        size (int): The number of users.
+        names (list[str]): The names of the columns.
+        load (Callable[[int], dict]): Computes the entries of the user at `index`, by column name.
+    """
+
+    def __init__(self, size: int, names: list[str], load: Callable[[int], dict]):
+        self._load = load
+        self.columns = {
+            name: LazyColumn(size, lambda i, name=name: self.__load(i)[name])
+            for name in names
+        }
+
+    def __load(self, index: int) -> dict:
+        state = self._load(index)
+        for name, column in self.columns.items():
+            column[index] = state[name]
+        return state
+
+
+class AccountRegistry:
+    """The names, keys and source addresses of the users, indexed by name and source address.
+
+    Private keys are kept as hex strings and only decoded into a `Wallet` when the wallet of a user is
+    first accessed, so that commands touching a single user do not pay for decoding every key.
+
+    Args:
+        network_str (str): The network of the wallets, e.g., `"BSV_Testnet"`.
+        names (list[str]): The names of the users.
+        private_keys (list[str]): The private keys of the users, as hex strings.
+        source_addresses (list[bytes]): The addresses of the users on the source chain.
+    """
+
+    def __init__(
+        self,
+        network_str: str,
+        names: list[str],
+        private_keys: list[str],
+        source_addresses: list[bytes],
+    ):
+        assert len(names) == len(private_keys) == len(source_addresses)
+        self.network_str = network_str
+        self.names = names
+        self.private_keys = private_keys
+        self.source_addresses = source_addresses
+        self.wallets = LazyColumn(
+            len(names),
+            lambda i: Wallet.from_hexstr(self.network_str, self.private_keys[i]),
+        )
+        self._by_name = {name: i for i, name in enumerate(names)}
+        self._by_source_address = {
+            address: i for i, address in enumerate(source_addresses)
+        }
+        # Built on first use, as it needs every key to be decoded
+        self._by_bsv_address = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def index(self, name: str) -> int:
+        """The index of the user `name`. Raises `ValueError` if there is no such user."""
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise ValueError(f"Unknown user {name}") from None
+
+    def index_of_source_address(self, source_address: bytes) -> int | None:
+        """The index of the user with address `source_address` on the source chain, if any."""
+        return self._by_source_address.get(source_address)
+
+    def index_of_bsv_address(self, bsv_address: str) -> int | None:
+        """The index of the user with BSV address `bsv_address`, if any."""
+        if self._by_bsv_address is None:
+            self._by_bsv_address = {
+                wallet.get_address(): i for i, wallet in enumerate(self.wallets)
+            }
+        return self._by_bsv_address.get(bsv_address)
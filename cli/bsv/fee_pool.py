@@ -0,0 +1,129 @@
+"""Background manager keeping pools of pre-split fee UTXOs topped up."""
+
+import threading
+
+from bsv.utxo_index import MAX_UNCONFIRMED_ANCESTORS, InsufficientFundsError
+from bsv.wallet_store import LeaseError
+from bsv.wallet import (
+    BALLPARK_BURNING_TX_FEE,
+    BALLPARK_TRANSACTION_FEE,
+    MAX_FEE_OVERPAYMENT,
+    SETUP_SPLITS,
+    WalletManager,
+)
+
+# Fee UTXOs kept for each user: amount -> number of UTXOs
+DEFAULT_DENOMINATIONS = {
+    BALLPARK_TRANSACTION_FEE: SETUP_SPLITS,
+    BALLPARK_BURNING_TX_FEE: 1,
+}
+# A pool is refilled once less than this fraction of its UTXOs is left
+LOW_WATERMARK = 0.3
+CHECK_INTERVAL = 30  # Seconds
+
+
+class FeePool:
+    """Keep a pool of fee UTXOs for each of `wallet_indices`.
+
+    The pool of a user holds `denominations[amount]` funding UTXOs of `amount` satoshis for every
+    amount, i.e., UTXOs that `WalletManager.transfer_token` and `WalletManager.burn_token` can spend as
+    their single funding input. A background thread checks the pools every `interval` seconds, or as
+    soon as `notify` is called, and tops up every denomination that fell below the low watermark with
+    one fan-out transaction per user.
+
+    UTXOs created by unconfirmed transactions are spendable as long as the transaction spending them
+    stays within `MAX_UNCONFIRMED_ANCESTORS` unconfirmed ancestors, so change can be reused before a
+    block is mined, but only that many transactions deep. Confirmations are refreshed on every check,
+    which drops the mined transactions from the ancestors of the UTXOs.
+
+    The pools are only kept topped up while a long-running process, e.g., a service driving the wallet,
+    keeps the fee pool started. The demos run one command per process and do not start it.
+
+    Args:
+        wallet_manager (WalletManager): The wallet manager holding the funding UTXOs.
+        wallet_indices (list[int]): The users (and issuers) whose pools are managed.
+        denominations (dict[int, int]): The number of fee UTXOs to keep for each amount.
+        low_watermark (float): Fraction of a denomination below which it is refilled.
+        interval (float): Seconds between two checks of the pools.
+    """
+
+    def __init__(
+        self,
+        wallet_manager: WalletManager,
+        wallet_indices: list[int],
+        denominations: dict[int, int] = DEFAULT_DENOMINATIONS,
+        low_watermark: float = LOW_WATERMARK,
+        interval: float = CHECK_INTERVAL,
+    ):
+        self.wallet_manager = wallet_manager
+        self.wallet_indices = wallet_indices
+        self.denominations = denominations
+        self.low_watermark = low_watermark
+        self.interval = interval
+        # Last error raised while refilling the pool of each user, e.g., `InsufficientFundsError`
+        self.errors = {}
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start checking the pools in the background."""
+        assert self._thread is None, "The fee pool is already running"
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+        self._thread.start()
+        return
+
+    def stop(self):
+        """Stop the background thread, waiting for the refill in progress to finish."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return
+
+    def notify(self):
+        """Check the pools now, e.g., after spending fee UTXOs."""
+        self._wakeup.set()
+        return
+
+    def available(self, wallet_index: int, amount: int) -> int:
+        """Number of spendable fee UTXOs of wallet_index usable to pay a fee of `amount`."""
+        with self.wallet_manager.funding_lock:
+            return self.wallet_manager.funding_utxos[wallet_index].count(
+                amount,
+                amount * MAX_FEE_OVERPAYMENT,
+                max_ancestors=MAX_UNCONFIRMED_ANCESTORS,
+            )
+
+    def missing(self, wallet_index: int) -> list[int]:
+        """The amounts of the fee UTXOs needed to top up the pool of wallet_index, empty if it is not low."""
+        amounts = []
+        for amount, size in self.denominations.items():
+            available = self.available(wallet_index, amount)
+            if available < size * self.low_watermark or available == 0:
+                amounts += [amount] * (size - available)
+        return amounts
+
+    def check(self) -> dict[int, str]:
+        """Refill the pools that are low. Returns the txids of the fan-out transactions by user."""
+        fan_outs = {}
+        for wallet_index in self.wallet_indices:
+            try:
+                self.wallet_manager.refresh_confirmations(wallet_index)
+                amounts = self.missing(wallet_index)
+                if amounts:
+                    fan_outs[wallet_index] = self.wallet_manager.split_funding(
+                        wallet_index, amounts
+                    )
+                self.errors.pop(wallet_index, None)
+            except (InsufficientFundsError, LeaseError, AssertionError) as e:
+                self.errors[wallet_index] = e
+        return fan_outs
+
+    def __run(self):
+        while not self._stopped.is_set():
+            self.check()
+            self._wakeup.wait(timeout=self.interval)
+            self._wakeup.clear()
@@ -0,0 +1,67 @@
+"""Fixed-base scalar multiplication with a precomputed windowed table."""
+
+from pathlib import Path
+
+from bsv.vk_cache import load_or_build_artefact
+
+# Genesis txids are 32 bytes
+SCALAR_BITS = 256
+WINDOW_BITS = 4
+
+
+class FixedBaseTable:
+    """Table of the multiples `d * 2^(window_bits * i) * base` for every window `i` and digit `d`.
+
+    Multiplying `base` by a scalar of at most `scalar_bits` bits then costs one point addition per non-zero
+    window digit, instead of a full double-and-add. As every partial sum is a multiple of `base` strictly
+    smaller than the term added to it, additions never hit the doubling or inverse cases.
+
+    Args:
+        base: The fixed point.
+        windows (list[list]): `windows[i][d - 1] = d * 2^(window_bits * i) * base`.
+        window_bits (int): The width of the windows.
+    """
+
+    def __init__(self, base, windows: list[list], window_bits: int):
+        self.base = base
+        self.windows = windows
+        self.window_bits = window_bits
+
+    @staticmethod
+    def build(base, scalar_bits: int = SCALAR_BITS, window_bits: int = WINDOW_BITS):
+        """Precompute the table for `base`, covering scalars of at most `scalar_bits` bits."""
+        windows = []
+        window_base = base
+        for _ in range((scalar_bits + window_bits - 1) // window_bits):
+            row = [window_base, window_base.multiply(2)]
+            for _ in range(3, 2**window_bits):
+                row.append(row[-1] + window_base)
+            windows.append(row)
+            window_base = row[-1] + window_base
+
+        return FixedBaseTable(base, windows, window_bits)
+
+    def multiply(self, scalar: int):
+        """Compute `scalar * base`."""
+        if scalar < 0 or scalar >> (self.window_bits * len(self.windows)):
+            return self.base.multiply(scalar)
+
+        mask = 2**self.window_bits - 1
+        out = None
+        for i, row in enumerate(self.windows):
+            digit = (scalar >> (self.window_bits * i)) & mask
+            if digit:
+                out = row[digit - 1] if out is None else out + row[digit - 1]
+
+        return out if out is not None else self.base.multiply(0)
+
+
+def load_or_build_table(path: Path, tag: str, base) -> FixedBaseTable:
+    """Load the table stored at `path` if it was built for `tag`, otherwise build it for `base` and store it.
+
+    Args:
+        path (Path): Where the table is stored.
+        tag (str): Identifies the base point, e.g., the hash of the key it comes from.
+        base: The fixed point.
+    """
+    return load_or_build_artefact(path, tag, lambda: FixedBaseTable.build(base))
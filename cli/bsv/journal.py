@@ -0,0 +1,187 @@
+"""Write-ahead journal of the operations of a `WalletManager`, resumed after a crash."""
+
+import os
+import shutil
+import socket
+import time
+from pathlib import Path
+
+from bsv.proof_scheduler import ProofScheduler
+from bsv.prover_client import ZK_ENGINE_DIR
+from bsv.wallet_store import WalletStore
+
+# Kinds of journaled operations
+PEGIN = "pegin"
+PEGIN_BATCH = "pegin_batch"
+TRANSFER = "transfer"
+BURN = "burn"
+
+# Stages of an operation, each recorded once the step is done
+SIGNED = "signed"  # The transaction is signed, not broadcast yet
+BROADCAST = "broadcast"  # The transaction is broadcast, its txid is known
+PROVEN = "proven"  # The proof is generated, its path is known
+UNLOCKED = "unlocked"  # The unlocking script of the pegout UTXO is generated
+
+# Stages of each kind of operation, in order
+STAGES = {
+    PEGIN: (SIGNED, BROADCAST, PROVEN),
+    # The proofs of a batch are kept by the proof store, which returns them again when resuming
+    PEGIN_BATCH: (SIGNED, BROADCAST),
+    TRANSFER: (SIGNED, BROADCAST, PROVEN),
+    BURN: (SIGNED, PROVEN, UNLOCKED, BROADCAST),
+}
+
+
+class JournalEntry:
+    """An operation in progress, recorded in an `OperationJournal`.
+
+    Args:
+        entry_id (int | None): The id of the entry in the journal, `None` if the wallet has no store.
+        kind (str): The kind of operation, one of the keys of `STAGES`.
+        stage (str): The last stage completed.
+        worker (str): The worker running the operation.
+        data (dict): The arguments and artefacts of the operation, e.g., the signed transaction.
+        updated (float): When the last stage was recorded.
+    """
+
+    __slots__ = ("entry_id", "kind", "stage", "worker", "data", "updated")
+
+    def __init__(
+        self,
+        entry_id: int | None,
+        kind: str,
+        stage: str,
+        worker: str,
+        data: dict,
+        updated: float,
+    ):
+        assert stage in STAGES[kind], f"Unknown stage {stage} of {kind}"
+        self.entry_id = entry_id
+        self.kind = kind
+        self.stage = stage
+        self.worker = worker
+        self.data = data
+        self.updated = updated
+
+    def reached(self, stage: str) -> bool:
+        """Whether the operation completed `stage`."""
+        stages = STAGES[self.kind]
+        return stages.index(self.stage) >= stages.index(stage)
+
+    def __repr__(self):
+        return f"JournalEntry(id={self.entry_id}, kind={self.kind}, stage={self.stage}, worker={self.worker})"
+
+
+class OperationJournal:
+    """Write-ahead journal of the operations of a worker, kept in the wallet store.
+
+    An operation opens its entry before its first irreversible step, i.e., before broadcasting, with
+    everything needed to go on from there: the signed transaction, and the funding UTXOs it spends and
+    creates. Every later stage is recorded with its artefacts, e.g., the broadcast txid, the path of the
+    proof or the unlocking script. The entry is deleted in the same transaction as the changes of the
+    operation are saved, so that after a crash an operation is either saved or still in the journal,
+    from which `WalletManager.resume_operations` finishes it without redoing the completed stages.
+
+    Without a store, entries are only kept in memory.
+
+    Args:
+        store (WalletStore | None): The store of the wallet.
+        worker (str): The worker writing the entries.
+        scheduler (ProofScheduler | None): The scheduler of the jobs using the workspaces of the entries,
+            which are only removed once the jobs are finished.
+    """
+
+    def __init__(
+        self,
+        store: WalletStore | None,
+        worker: str,
+        scheduler: ProofScheduler | None = None,
+    ):
+        self.store = store
+        self.worker = worker
+        self.scheduler = scheduler
+
+    def begin(self, kind: str, stage: str, data: dict) -> JournalEntry:
+        """Open the entry of an operation of `kind` which completed `stage`."""
+        entry = JournalEntry(None, kind, stage, self.worker, data, time.time())
+        if self.store is not None:
+            entry.entry_id = self.store.journal_append(
+                kind, stage, self.worker, data, entry.updated
+            )
+        return entry
+
+    def record(self, entry: JournalEntry, stage: str, artefacts: dict):
+        """Record that the operation of `entry` completed `stage`, producing `artefacts`."""
+        assert STAGES[entry.kind].index(stage) > STAGES[entry.kind].index(
+            entry.stage
+        ), f"{entry} cannot go back to {stage}"
+        entry.stage = stage
+        entry.data.update(artefacts)
+        entry.updated = time.time()
+        if self.store is not None and entry.entry_id is not None:
+            self.store.journal_update(entry.entry_id, stage, entry.data, entry.updated)
+        return
+
+    def discard(self, entry: JournalEntry):
+        """Delete the entry of an operation which did not happen, e.g., whose transaction was rejected."""
+        if self.store is not None and entry.entry_id is not None:
+            self.store.journal_delete(entry.entry_id)
+        self.remove_workspaces(entry)
+        return
+
+    def unfinished(self) -> list[JournalEntry]:
+        """The entries of the operations in progress, of every worker, oldest first."""
+        if self.store is None:
+            return []
+        return [JournalEntry(*row) for row in self.store.journal_entries()]
+
+    def claim(self, entry: JournalEntry, outpoints: list[bytes]) -> bool:
+        """Take over the abandoned `entry`, dropping the leases of its worker on `outpoints`.
+
+        Returns `False` if another worker claimed it first.
+        """
+        if self.store is None:
+            return False
+        if not self.store.journal_claim(
+            entry.entry_id, entry.worker, self.worker, outpoints
+        ):
+            return False
+        entry.worker = self.worker
+        return True
+
+    def workspace(self, entry: JournalEntry, engine: str) -> Path:
+        """A directory for the files of `entry` run by `engine`, kept until the entry is finished."""
+        path = ZK_ENGINE_DIR / "data" / engine.replace("-", "_") / "journal"
+        path = path / self.__workspace_name(entry)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def remove_workspaces(self, entry: JournalEntry):
+        """Remove the directories created by `workspace` for `entry`."""
+        for root in (ZK_ENGINE_DIR / "data").glob("*/journal"):
+            workspace = root / self.__workspace_name(entry)
+            if not workspace.exists():
+                continue
+            if self.scheduler is not None:
+                self.scheduler.remove_workspace(workspace)
+            else:
+                shutil.rmtree(workspace, ignore_errors=True)
+        return
+
+    def __workspace_name(self, entry: JournalEntry) -> str:
+        if entry.entry_id is None:
+            return f"{os.getpid()}_{id(entry)}"
+        return f"{self.store.db_path.stem}_{entry.entry_id}"
+
+
+def abandoned(entry: JournalEntry, timeout: float) -> bool:
+    """Whether the worker of `entry` is gone: it is a dead process of this host, or silent for `timeout` seconds."""
+    hostname, pid, _ = entry.worker.rsplit(":", 2)
+    if hostname == socket.gethostname() and int(pid) != os.getpid():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+    return time.time() - entry.updated > timeout
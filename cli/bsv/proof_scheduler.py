@@ -0,0 +1,318 @@
+"""Scheduler admitting proving jobs against a memory and core budget."""
+
+import heapq
+import itertools
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from enum import Enum
+from pathlib import Path
+
+from bsv.prover_client import (
+    ProverClient,
+    TCP_ENGINE,
+    POB_ENGINE,
+    create_job_workspace,
+)
+
+GIB = 2**30
+# Peak resident memory of a single MNT4-753/MNT6-753 proof
+JOB_MEMORY = {TCP_ENGINE: 16 * GIB, POB_ENGINE: 12 * GIB}
+JOB_CORES = 8
+# Lower values are scheduled first: burns unlock pegouts, so they go ahead of transfers
+JOB_PRIORITY = {POB_ENGINE: 0, TCP_ENGINE: 1}
+JOB_TIMEOUT = 3600
+# Fraction of the physical memory the scheduler hands out by default
+MEMORY_BUDGET_FRACTION = 0.8
+# Finished jobs remembered by `ProofScheduler.job` and `ProofScheduler.status`
+JOB_HISTORY = 1000
+
+
+class JobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    TIMED_OUT = "timed_out"
+
+
+class ProofJob:
+    """A proving job submitted to a `ProofScheduler`.
+
+    Args:
+        engine (str): Either `TCP_ENGINE` or `POB_ENGINE`.
+        paths (dict[str, Path]): The config/proof/public_input/prepared paths forwarded to the prover.
+        memory (int): The memory (in bytes) reserved for the job.
+        cores (int): The cores reserved for the job.
+        timeout (float): Seconds after which the job is reported as timed out.
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        engine: str,
+        paths: dict[str, Path],
+        memory: int,
+        cores: int,
+        timeout: float,
+    ):
+        self.job_id = job_id
+        self.engine = engine
+        self.paths = paths
+        self.memory = memory
+        self.cores = cores
+        self.timeout = timeout
+        self.status = JobStatus.QUEUED
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self._done = threading.Event()
+
+    def result(self):
+        """Wait for the job to finish, re-raising the error if it failed or timed out."""
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def __repr__(self):
+        return f"ProofJob(id={self.job_id}, engine={self.engine}, status={self.status.value})"
+
+
+class ProofScheduler:
+    """Run proving jobs through a `ProverClient` within a memory and core budget.
+
+    Jobs are started in priority order (proofs of burn first, then transfers, FIFO within each
+    engine) as long as the memory and cores they reserve fit in what is left of the budget. The
+    first queued job is never overtaken, so large jobs are not starved by smaller ones. A job that
+    alone exceeds the budget is started once nothing else is running.
+
+    A job running past its timeout is reported as `TIMED_OUT` to whoever waits on it, but its
+    reservation is only released when the prover actually returns, as the prover service cannot
+    interrupt a running proof. For the same reason, the directories of the jobs should come from
+    `workspace`, which keeps them until the prover is done writing in them.
+
+    Only the last `JOB_HISTORY` finished jobs are remembered.
+
+    Args:
+        prover (ProverClient): The client used to run the jobs.
+        memory_budget (int | None): Bytes of memory available to jobs. Defaults to 80% of the physical memory.
+        core_budget (int | None): Cores available to jobs. Defaults to `os.cpu_count()`.
+    """
+
+    def __init__(
+        self,
+        prover: ProverClient,
+        memory_budget: int | None = None,
+        core_budget: int | None = None,
+    ):
+        self.prover = prover
+        self.memory_budget = (
+            memory_budget
+            if memory_budget is not None
+            else int(
+                os.sysconf("SC_PAGE_SIZE")
+                * os.sysconf("SC_PHYS_PAGES")
+                * MEMORY_BUDGET_FRACTION
+            )
+        )
+        self.core_budget = core_budget if core_budget is not None else os.cpu_count()
+        self.memory_in_use = 0
+        self.cores_in_use = 0
+        self._queue = []
+        self._running = {}
+        self._jobs = {}
+        # Ids of the finished jobs still in `_jobs`, oldest first
+        self._history = deque()
+        # Workspace -> ids of the unfinished jobs using it, removed once they finish
+        self._deferred = {}
+        self._ids = itertools.count()
+        self._condition = threading.Condition()
+        self._dispatcher = threading.Thread(target=self.__dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def submit(
+        self,
+        engine: str,
+        config: Path | None = None,
+        proof: Path | None = None,
+        public_input: Path | None = None,
+        prepared: Path | None = None,
+        memory: int | None = None,
+        cores: int | None = None,
+        timeout: float | None = None,
+    ) -> ProofJob:
+        """Queue a proving job and return immediately.
+
+        Args:
+            engine (str): Either `TCP_ENGINE` or `POB_ENGINE`.
+            config (Path | None): The proving data.
+            proof (Path | None): Where to save the proof.
+            public_input (Path | None): Where to save the public input (PoB only).
+            prepared (Path | None): Where to save the inverse Miller loop output (PoB only).
+            memory (int | None): Memory to reserve. Defaults to `JOB_MEMORY[engine]`.
+            cores (int | None): Cores to reserve. Defaults to `JOB_CORES`.
+            timeout (float | None): Timeout of the job. Defaults to `JOB_TIMEOUT`.
+        """
+        with self._condition:
+            job = ProofJob(
+                job_id=next(self._ids),
+                engine=engine,
+                paths={
+                    "config": config,
+                    "proof": proof,
+                    "public_input": public_input,
+                    "prepared": prepared,
+                },
+                memory=memory if memory is not None else JOB_MEMORY[engine],
+                cores=cores if cores is not None else JOB_CORES,
+                timeout=timeout if timeout is not None else JOB_TIMEOUT,
+            )
+            self._jobs[job.job_id] = job
+            heapq.heappush(self._queue, (JOB_PRIORITY[engine], job.job_id, job))
+            self._condition.notify_all()
+
+        return job
+
+    def prove(self, engine: str, **kwargs):
+        """Submit a job and wait for it to complete."""
+        return self.submit(engine, **kwargs).result()
+
+    def queue_depth(self) -> int:
+        """Number of jobs waiting to be admitted."""
+        with self._condition:
+            return len(self._queue)
+
+    def status(self) -> dict:
+        """Summary of the scheduler: budget usage and number of jobs per status."""
+        with self._condition:
+            counts = {status.value: 0 for status in JobStatus}
+            for job in self._jobs.values():
+                counts[job.status.value] += 1
+            return {
+                "queue_depth": len(self._queue),
+                "memory_in_use": self.memory_in_use,
+                "memory_budget": self.memory_budget,
+                "cores_in_use": self.cores_in_use,
+                "core_budget": self.core_budget,
+                "jobs": counts,
+            }
+
+    def job(self, job_id: int) -> ProofJob:
+        """The job `job_id`. Raises `KeyError` if it finished more than `JOB_HISTORY` jobs ago."""
+        with self._condition:
+            return self._jobs[job_id]
+
+    @contextmanager
+    def workspace(self, engine: str):
+        """Create a private directory for the files of `engine` jobs, removed with `remove_workspace`."""
+        workspace = create_job_workspace(engine)
+        try:
+            yield workspace
+        finally:
+            self.remove_workspace(workspace)
+
+    def remove_workspace(self, workspace: Path):
+        """Remove `workspace` once the jobs reading or writing files in it are finished, now if there are none.
+
+        The callers of a job stop waiting when it times out, but the prover keeps writing its outputs.
+        """
+        workspace = Path(workspace)
+        with self._condition:
+            users = {
+                job.job_id
+                for job in self._jobs.values()
+                if job.finished_at is None and ProofScheduler.__uses(job, workspace)
+            }
+            if users:
+                self._deferred[workspace] = users
+                return
+        shutil.rmtree(workspace, ignore_errors=True)
+        return
+
+    @staticmethod
+    def __uses(job: ProofJob, workspace: Path) -> bool:
+        return any(
+            path is not None and workspace in Path(path).parents
+            for path in job.paths.values()
+        )
+
+    def __fits(self, job: ProofJob) -> bool:
+        if not self._running:
+            return True
+        return (
+            self.memory_in_use + job.memory <= self.memory_budget
+            and self.cores_in_use + job.cores <= self.core_budget
+        )
+
+    def __dispatch(self):
+        while True:
+            with self._condition:
+                while self._queue and self.__fits(self._queue[0][2]):
+                    _, _, job = heapq.heappop(self._queue)
+                    self.__start(job)
+                self.__expire()
+                self._condition.wait(timeout=self.__next_deadline())
+
+    def __start(self, job: ProofJob):
+        self.memory_in_use += job.memory
+        self.cores_in_use += job.cores
+        job.status = JobStatus.RUNNING
+        job.started_at = time.monotonic()
+        self._running[job.job_id] = job
+        threading.Thread(target=self.__run, args=(job,), daemon=True).start()
+
+    def __run(self, job: ProofJob):
+        error = None
+        try:
+            self.prover.prove(job.engine, timeout=job.timeout, **job.paths)
+        except Exception as e:
+            error = e
+
+        removable = []
+        with self._condition:
+            self.memory_in_use -= job.memory
+            self.cores_in_use -= job.cores
+            del self._running[job.job_id]
+            job.finished_at = time.monotonic()
+            if job.status == JobStatus.RUNNING:
+                job.status = JobStatus.DONE if error is None else JobStatus.FAILED
+                job.error = error
+                job._done.set()
+            for workspace, users in list(self._deferred.items()):
+                users.discard(job.job_id)
+                if not users:
+                    del self._deferred[workspace]
+                    removable.append(workspace)
+            self._history.append(job.job_id)
+            while len(self._history) > JOB_HISTORY:
+                del self._jobs[self._history.popleft()]
+            self._condition.notify_all()
+
+        for workspace in removable:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    def __expire(self):
+        now = time.monotonic()
+        for job in self._running.values():
+            if job.status == JobStatus.RUNNING and now - job.started_at > job.timeout:
+                job.status = JobStatus.TIMED_OUT
+                job.error = TimeoutError(
+                    f"Proving job {job.job_id} ({job.engine}) exceeded {job.timeout}s"
+                )
+                job._done.set()
+
+    def __next_deadline(self) -> float | None:
+        deadlines = [
+            job.started_at + job.timeout - time.monotonic()
+            for job in self._running.values()
+            if job.status == JobStatus.RUNNING
+        ]
+        return max(min(deadlines), 0) if deadlines else None
@@ -0,0 +1,275 @@
+"""Content-addressed store of the transfer proofs generated by zk_engine."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+import toml
+
+from bsv.proof_scheduler import ProofScheduler
+from bsv.prover_client import PROVING_DATA, TCP_ENGINE, ZK_ENGINE_DIR
+from bsv.wallet_store import BUSY_TIMEOUT
+
+# zk_engine reads the proof named `name` from `PROOFS_DIR/<name>.bin`
+PROOFS_DIR = ZK_ENGINE_DIR / "data/tcp_engine/proofs"
+PROOF_INDEX = "index.db"
+PROOF = "proof.bin"
+
+# Default retention: the latest proofs of every token, other proofs for a week, no size cap
+KEEP_PER_TOKEN = 2
+MAX_PROOF_AGE = 7 * 24 * 3600
+MAX_PROOF_BYTES = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS proofs (
+    name TEXT PRIMARY KEY,
+    genesis_txid TEXT NOT NULL,
+    position INTEGER,
+    prior TEXT,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS proofs_by_token ON proofs (genesis_txid, position);
+"""
+
+
+class RetentionPolicy:
+    """Which proofs `ProofStore.collect` removes.
+
+    The latest `keep_per_token` proofs of every token, i.e., the ones further along its chain, are always
+    kept, as are the pinned proofs. The other proofs are removed once unused for `max_age` seconds, and
+    the least recently used ones until the store holds at most `max_bytes`.
+
+    Args:
+        keep_per_token (int): Number of proofs kept for each token, at least 1.
+        max_age (float | None): Seconds after which an unused proof is removed. Never if `None`.
+        max_bytes (int | None): Size of the store above which proofs are removed. Unbounded if `None`.
+    """
+
+    __slots__ = ("keep_per_token", "max_age", "max_bytes")
+
+    def __init__(
+        self,
+        keep_per_token: int = KEEP_PER_TOKEN,
+        max_age: float | None = MAX_PROOF_AGE,
+        max_bytes: int | None = MAX_PROOF_BYTES,
+    ):
+        assert keep_per_token >= 1, "The latest proof of every token must be kept"
+        self.keep_per_token = keep_per_token
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+
+class ProofStore:
+    """Store of the TCP proofs, named after the hash of their proving data.
+
+    The name of a proof is the SHA-256 of its chain parameters, public inputs and witness, which include
+    the name of the prior proof. A proof is therefore never overwritten by the next one of the same token,
+    and proving the same step again, e.g., when an operation is retried or resumed after a crash, returns
+    the stored proof without running the prover. Proofs are generated in a job workspace and moved to
+    `proofs_dir/<name>.bin` once complete, so that a stored proof is never partial.
+
+    An index in `proofs_dir/index.db` records the token (genesis txid) of every proof and its position
+    in the chain of proofs of the token: 0 for the genesis, then one more for each transfer. `collect`
+    removes the proofs no longer needed according to the retention policy.
+
+    Proofs named after the genesis txid, as generated before the store, are not indexed. They are still
+    used as prior proofs, and never removed.
+
+    Args:
+        proofs_dir (Path): The directory of the proofs read by zk_engine.
+        retention (RetentionPolicy): The proofs removed by `collect`.
+    """
+
+    def __init__(
+        self,
+        proofs_dir: Path = PROOFS_DIR,
+        retention: RetentionPolicy | None = None,
+    ):
+        self.proofs_dir = Path(proofs_dir)
+        self.retention = retention if retention is not None else RetentionPolicy()
+        # The index is opened on first use
+        self._connection = None
+        # Serialises the use of the connection by the threads of the process
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The connection to the index, which must be used while holding `_lock`."""
+        if self._connection is None:
+            self.proofs_dir.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self.proofs_dir / PROOF_INDEX,
+                isolation_level=None,
+                timeout=BUSY_TIMEOUT,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def proof_name(data: dict) -> str:
+        """The name of the proof of the proving data `data`, whatever its `proof_name`."""
+        inputs = {key: value for key, value in data.items() if key != "proof_name"}
+        digest = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+        return f"{digest[:2]}/{digest}"
+
+    def path(self, name: str) -> Path:
+        """The file of the proof `name`."""
+        return self.proofs_dir / f"{name}.bin"
+
+    def prove(self, scheduler: ProofScheduler, data: dict) -> str:
+        """Return the name of the proof of `data`, generating it with `scheduler` if it is not stored.
+
+        Args:
+            scheduler (ProofScheduler): The scheduler running the proving job.
+            data (dict): The proving data of `TCP_ENGINE`. Its `proof_name` is ignored.
+        """
+        name = self.prove_many(scheduler, [data])[0]
+        if isinstance(name, Exception):
+            raise name
+
+        return name
+
+    def prove_many(
+        self, scheduler: ProofScheduler, data: list[dict]
+    ) -> list[str | Exception]:
+        """Return the names of the proofs of `data`, generating the ones not stored in parallel.
+
+        The proof of a failed job is replaced by its error, so that the other proofs are kept.
+        """
+        names = [ProofStore.proof_name(item) for item in data]
+        errors = {}
+        with ExitStack() as workspaces:
+            jobs = {}
+            for name, item in zip(names, data):
+                if name in jobs or self.__hit(name, item):
+                    continue
+                workspace = workspaces.enter_context(scheduler.workspace(TCP_ENGINE))
+                with open(workspace / PROVING_DATA, "w") as f:
+                    toml.dump({**item, "proof_name": name}, f)
+                job = scheduler.submit(
+                    TCP_ENGINE,
+                    config=workspace / PROVING_DATA,
+                    proof=workspace / PROOF,
+                )
+                jobs[name] = (item, workspace, job)
+
+            for name, (item, workspace, job) in jobs.items():
+                try:
+                    job.result()
+                except Exception as e:
+                    errors[name] = e
+                    continue
+                path = self.path(name)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(workspace / PROOF, path)
+                self.__index(name, item)
+
+        return [errors.get(name, name) for name in names]
+
+    def lookup(self, genesis_txid: str, position: int | None = None) -> str | None:
+        """The name of the proof of the token `genesis_txid` at `position` in its chain, the latest if `None`."""
+        with self._lock:
+            if position is None:
+                row = self.connection.execute(
+                    "SELECT name FROM proofs WHERE genesis_txid = ? "
+                    "ORDER BY position DESC, created DESC LIMIT 1",
+                    (genesis_txid,),
+                ).fetchone()
+            else:
+                row = self.connection.execute(
+                    "SELECT name FROM proofs WHERE genesis_txid = ? AND position = ? "
+                    "ORDER BY created DESC LIMIT 1",
+                    (genesis_txid, position),
+                ).fetchone()
+        if row is None or not self.path(row[0]).exists():
+            return None
+        return row[0]
+
+    def collect(self, pinned: set[str] = frozenset()) -> list[str]:
+        """Remove the proofs not kept by the retention policy. Returns the names of the removed proofs.
+
+        Args:
+            pinned (set[str]): Proofs kept whatever their age, e.g., the proofs of the tokens held.
+        """
+        retention = self.retention
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT name, genesis_txid, size, used FROM proofs "
+                "ORDER BY genesis_txid, COALESCE(position, -1) DESC, created DESC"
+            ).fetchall()
+
+        total = 0
+        kept = {}
+        candidates = []
+        for name, genesis_txid, size, used in rows:
+            total += size
+            rank = kept.get(genesis_txid, 0)
+            kept[genesis_txid] = rank + 1
+            if rank >= retention.keep_per_token and name not in pinned:
+                candidates.append((used, name, size))
+
+        now = time.time()
+        removed = []
+        # Least recently used first
+        for used, name, size in sorted(candidates):
+            expired = retention.max_age is not None and now - used > retention.max_age
+            too_big = retention.max_bytes is not None and total > retention.max_bytes
+            if not expired and not too_big:
+                break
+            self.path(name).unlink(missing_ok=True)
+            total -= size
+            removed.append(name)
+
+        with self._lock:
+            self.connection.executemany(
+                "DELETE FROM proofs WHERE name = ?", [(name,) for name in removed]
+            )
+
+        return removed
+
+    def __hit(self, name: str, data: dict) -> bool:
+        """Whether the proof `name` is stored, recording that it was used again."""
+        if not self.path(name).exists():
+            return False
+        self.__index(name, data)
+        return True
+
+    def __index(self, name: str, data: dict):
+        prior = data["witness"]["prior_proof_path"] or None
+        now = time.time()
+        with self._lock:
+            if prior is None:
+                position = 0
+            else:
+                row = self.connection.execute(
+                    "SELECT position FROM proofs WHERE name = ?", (prior,)
+                ).fetchone()
+                # The position of proofs extending an unindexed proof is unknown
+                position = (
+                    row[0] + 1 if row is not None and row[0] is not None else None
+                )
+            self.connection.execute(
+                "INSERT INTO proofs (name, genesis_txid, position, prior, size, created, used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET used = excluded.used",
+                (
+                    name,
+                    data["public_inputs"]["genesis_txid"],
+                    position,
+                    prior,
+                    self.path(name).stat().st_size,
+                    now,
+                    now,
+                ),
+            )
+        return
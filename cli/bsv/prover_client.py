@@ -0,0 +1,209 @@
+"""Client for the zk_engine prover service."""
+
+import json
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ZK_ENGINE_DIR = Path(__file__).parent.parent.parent / "zk_engine"
+PROVER_SOCKET = ZK_ENGINE_DIR / "data/prover.sock"
+PROVER_LOG = ZK_ENGINE_DIR / "data/prover.log"
+PROVER_SERVICE = "cargo run --release -- serve"
+PROVER_COMMAND = "cargo run --release -- {engine} {command}"
+# Building zk_engine and loading the keys can take several minutes
+SERVICE_STARTUP_TIMEOUT = 1800
+
+TCP_ENGINE = "tcp-engine"
+POB_ENGINE = "pob-engine"
+
+PROVING_DATA = "prove.toml"
+PROOF_OF_BURN = "proof_of_burn.bin"
+INPUT_PROOF_OF_BURN = "input_proof_of_burn.bin"
+PREPARED_PROOF_OF_BURN = "prepared_proof_of_burn.bin"
+
+
+class ProverError(Exception):
+    """Raised when the zk_engine fails to execute a job."""
+
+
+def create_job_workspace(engine: str) -> Path:
+    """Create a private directory for the inputs and outputs of a single `engine` job.
+
+    The directory lives under `zk_engine/data/<engine>/jobs`, so that jobs running concurrently never
+    overwrite each other's files. It is removed by `ProofScheduler.remove_workspace`.
+    """
+    jobs_dir = ZK_ENGINE_DIR / "data" / engine.replace("-", "_") / "jobs"
+    jobs_dir.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(dir=jobs_dir))
+
+
+class ProverClient:
+    """Submit prove/verify jobs to zk_engine.
+
+    By default, jobs are sent to a long-running `zk_engine serve` process which keeps the proving keys
+    in memory. The service is started on first use if it is not already running. With `use_service=False`
+    every job runs as a one-shot `cargo run --release` command instead.
+
+    Args:
+        socket_path (Path): The Unix socket the prover service listens on.
+        use_service (bool): Whether to use the prover service. Defaults to `True`.
+        startup_timeout (float): Maximum number of seconds to wait for the service to come up.
+    """
+
+    def __init__(
+        self,
+        socket_path: Path = PROVER_SOCKET,
+        use_service: bool = True,
+        startup_timeout: float = SERVICE_STARTUP_TIMEOUT,
+    ):
+        self.socket_path = Path(socket_path)
+        self.use_service = use_service
+        self.startup_timeout = startup_timeout
+        self._service = None
+        self._service_lock = threading.Lock()
+
+    def prove(
+        self,
+        engine: str,
+        config: Path | None = None,
+        proof: Path | None = None,
+        public_input: Path | None = None,
+        prepared: Path | None = None,
+        timeout: float | None = None,
+    ):
+        """Generate a proof with `engine` for the proving data in `config`.
+
+        Args:
+            engine (str): Either `TCP_ENGINE` or `POB_ENGINE`.
+            config (Path | None): The proving data. Defaults to the engine's `prove.toml`.
+            proof (Path | None): Where to save the proof. Defaults to the engine's proofs folder.
+            public_input (Path | None): Where to save the public input (PoB only).
+            prepared (Path | None): Where to save the inverse Miller loop output used by the unlocking script
+                of the PoB UTXO (PoB only). Not computed if `None`.
+            timeout (float | None): Seconds after which a one-shot proving process is killed.
+                The service cannot interrupt a running job, so it ignores the timeout.
+        """
+        self.__submit(
+            engine,
+            "prove",
+            timeout,
+            config=config,
+            proof=proof,
+            public_input=public_input,
+            prepared=prepared,
+        )
+        return
+
+    def verify(
+        self,
+        engine: str,
+        config: Path | None = None,
+        proof: Path | None = None,
+        public_input: Path | None = None,
+    ) -> bool:
+        """Verify a proof with `engine` for the verifying data in `config` (TCP) or `proof` (PoB)."""
+        return self.__submit(
+            engine,
+            "verify",
+            None,
+            config=config,
+            proof=proof,
+            public_input=public_input,
+        )
+
+    def __submit(self, engine: str, command: str, timeout: float | None, **paths):
+        paths = {key: str(path) for key, path in paths.items() if path is not None}
+        if not self.use_service:
+            return self.__run_one_shot(engine, command, paths, timeout)
+
+        job = {"engine": engine, "command": command, **paths}
+        with self.__connect() as connection:
+            connection.sendall((json.dumps(job) + "\n").encode())
+            reply = b""
+            while not reply.endswith(b"\n"):
+                chunk = connection.recv(4096)
+                if not chunk:
+                    raise ProverError("Prover service closed the connection")
+                reply += chunk
+        result = json.loads(reply)
+        if not result["ok"]:
+            raise ProverError(f"{engine} {command} failed: {result['error']}")
+
+        return result.get("valid", True)
+
+    def __run_one_shot(
+        self,
+        engine: str,
+        command: str,
+        paths: dict[str, str],
+        timeout: float | None,
+    ):
+        flags = "".join(
+            f" --{key.replace('_', '-')} {path}" for key, path in paths.items()
+        )
+        try:
+            process = subprocess.run(
+                f"exec {PROVER_COMMAND.format(engine=engine, command=command)}{flags}",
+                shell=True,
+                cwd=ZK_ENGINE_DIR,
+                text=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            raise ProverError(f"{engine} {command} timed out after {timeout}s")
+        if process.returncode != 0:
+            raise ProverError(f"{engine} {command} failed: {process.stderr}")
+
+        return True
+
+    def __connect(self) -> socket.socket:
+        try:
+            return self.__open_socket()
+        except (FileNotFoundError, ConnectionRefusedError):
+            with self._service_lock:
+                self.__start_service()
+
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self._service.poll() is not None:
+                raise ProverError(
+                    f"Prover service exited with code {self._service.returncode}, see {PROVER_LOG}"
+                )
+            try:
+                return self.__open_socket()
+            except (FileNotFoundError, ConnectionRefusedError):
+                time.sleep(1)
+
+        raise ProverError(
+            f"Prover service did not start within {self.startup_timeout}s"
+        )
+
+    def __open_socket(self) -> socket.socket:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(str(self.socket_path))
+        except OSError:
+            connection.close()
+            raise
+        return connection
+
+    def __start_service(self):
+        """Start the prover service in its own session, so that it outlives this process."""
+        if self._service is not None and self._service.poll() is None:
+            return
+        PROVER_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with open(PROVER_LOG, "a") as log:
+            self._service = subprocess.Popen(
+                f"{PROVER_SERVICE} --socket {self.socket_path}",
+                shell=True,
+                cwd=ZK_ENGINE_DIR,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        return
@@ -0,0 +1,152 @@
+"""Fixed-size records identifying outputs and burnt tokens."""
+
+import struct
+from functools import total_ordering
+
+# Serialisation of an output index, as in a transaction input
+_INDEX = struct.Struct("<I")
+OUTPOINT_BYTES = 32 + _INDEX.size
+BURNT_TOKEN_BYTES = 64
+
+
+@total_ordering
+class Outpoint:
+    """An output of a transaction, identified by the txid and the index of the output.
+
+    The txid is stored as 32 bytes in the byte order of the hex txid. Outpoints are hashable and ordered
+    by `(txid, index)`, so they can be used as dict keys, and must not be modified. They are encoded as
+    `OUTPOINT_BYTES` bytes as in a transaction input (see `to_bytes`), and as `"txid:index"` in the
+    wallet JSON file, with the index as little-endian hex (see `to_hexstr`).
+
+    Args:
+        prev_tx (str | bytes): The txid, as hex or bytes.
+        prev_index (int): The index of the output.
+    """
+
+    __slots__ = ("txid", "prev_index")
+
+    def __init__(self, prev_tx: str | bytes, prev_index: int):
+        self.txid = prev_tx if isinstance(prev_tx, bytes) else bytes.fromhex(prev_tx)
+        self.prev_index = prev_index
+
+    @property
+    def prev_tx(self) -> str:
+        return self.txid.hex()
+
+    @property
+    def key(self) -> bytes:
+        """The `OUTPOINT_BYTES`-byte encoding of the outpoint, which identifies it in the wallet store."""
+        return self.to_bytes()
+
+    @staticmethod
+    def from_hexstr(outpoint: str):
+        txid, index = outpoint.split(":")
+        return Outpoint(bytes.fromhex(txid), _INDEX.unpack(bytes.fromhex(index))[0])
+
+    def to_hexstr(self) -> str:
+        return f"{self.txid.hex()}:{_INDEX.pack(self.prev_index).hex()}"
+
+    @staticmethod
+    def from_bytes(data: bytes):
+        return Outpoint(bytes(data[31::-1]), _INDEX.unpack_from(data, 32)[0])
+
+    def to_bytes(self) -> bytes:
+        """The serialisation of the outpoint in a transaction input: reversed txid and little-endian index."""
+        return self.txid[::-1] + _INDEX.pack(self.prev_index)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Outpoint):
+            return NotImplemented
+        return self.txid == other.txid and self.prev_index == other.prev_index
+
+    def __lt__(self, other) -> bool:
+        if not isinstance(other, Outpoint):
+            return NotImplemented
+        return (self.txid, self.prev_index) < (other.txid, other.prev_index)
+
+    def __hash__(self) -> int:
+        return hash((self.txid, self.prev_index))
+
+    def __repr__(self):
+        return f"prev_tx: {self.prev_tx}, prev_index: {self.prev_index}"
+
+
+@total_ordering
+class BurntToken:
+    """A burnt token, identified by the txids of its genesis and of the transaction burning it.
+
+    Like `Outpoint`, burnt tokens are hashable and ordered, and are encoded as `BURNT_TOKEN_BYTES`
+    bytes (see `to_bytes`) or as `"genesis_txid:burning_txid"` in the wallet JSON file.
+
+    Args:
+        genesis_txid (str | bytes): The txid of the genesis, as hex or bytes.
+        burning_txid (str | bytes): The txid of the burning transaction, as hex or bytes.
+    """
+
+    __slots__ = ("genesis", "burning")
+
+    def __init__(self, genesis_txid: str | bytes, burning_txid: str | bytes):
+        self.genesis = (
+            genesis_txid
+            if isinstance(genesis_txid, bytes)
+            else bytes.fromhex(genesis_txid)
+        )
+        self.burning = (
+            burning_txid
+            if isinstance(burning_txid, bytes)
+            else bytes.fromhex(burning_txid)
+        )
+
+    @property
+    def genesis_txid(self) -> str:
+        return self.genesis.hex()
+
+    @property
+    def burning_txid(self) -> str:
+        return self.burning.hex()
+
+    def to_hexstr(self) -> str:
+        return f"{self.genesis.hex()}:{self.burning.hex()}"
+
+    @staticmethod
+    def from_hexstr(burnt_token: str):
+        genesis_txid, burning_txid = burnt_token.split(":")
+        return BurntToken(bytes.fromhex(genesis_txid), bytes.fromhex(burning_txid))
+
+    @staticmethod
+    def from_bytes(data: bytes):
+        return BurntToken(bytes(data[:32]), bytes(data[32:64]))
+
+    def to_bytes(self) -> bytes:
+        return self.genesis + self.burning
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, BurntToken):
+            return NotImplemented
+        return self.genesis == other.genesis and self.burning == other.burning
+
+    def __lt__(self, other) -> bool:
+        if not isinstance(other, BurntToken):
+            return NotImplemented
+        return (self.genesis, self.burning) < (other.genesis, other.burning)
+
+    def __hash__(self) -> int:
+        return hash((self.genesis, self.burning))
+
+    def __repr__(self):
+        return f"Genesis: {self.genesis_txid}, Burning tx: {self.burning_txid}"
+
+
+def pack_outpoints(outpoints: list[Outpoint]) -> bytes:
+    """Concatenate the `OUTPOINT_BYTES`-byte encodings of `outpoints`."""
+    return b"".join(outpoint.to_bytes() for outpoint in outpoints)
+
+
+def unpack_outpoints(data: bytes) -> list[Outpoint]:
+    """The outpoints encoded by `pack_outpoints`."""
+    assert len(data) % OUTPOINT_BYTES == 0, "Truncated list of outpoints"
+    view = memoryview(data)
+    return [
+        Outpoint.from_bytes(view[i : i + OUTPOINT_BYTES])
+        for i in range(0, len(data), OUTPOINT_BYTES)
+    ]
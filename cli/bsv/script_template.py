@@ -0,0 +1,66 @@
+"""Templates of compiled scripts in which only some pushed numbers change."""
+
+from tx_engine import Script, encode_num
+
+
+def push_number(n: int) -> bytes:
+    """Serialisation of the minimal push of `n` as a script number."""
+    if n == 0:
+        return bytes([0x00])  # OP_0
+    if n == -1:
+        return bytes([0x4F])  # OP_1NEGATE
+    if 1 <= n <= 16:
+        return bytes([0x50 + n])  # OP_1 .. OP_16
+    script = Script()
+    script.append_pushdata(encode_num(n))
+    return script.raw_serialize()
+
+
+class ScriptTemplate:
+    """A compiled script split into constant segments and number slots.
+
+    Rendering the template with `values` yields `segments[0] + push(values[0]) + segments[1] + ...`,
+    so producing a script for new values costs a few byte concatenations instead of a full compilation.
+
+    Args:
+        segments (list[bytes]): The constant parts of the script, one more than the number of slots.
+        order (list[int]): `order[i]` is the index in `values` of the number pushed in the i-th slot.
+    """
+
+    def __init__(self, segments: list[bytes], order: list[int]):
+        assert len(segments) == len(order) + 1
+        self.segments = segments
+        self.order = order
+
+    @staticmethod
+    def from_script(script: bytes, values: list[int]):
+        """Build the template of `script`, in which `values` are the numbers that change.
+
+        Returns `None` if some value is not pushed exactly once in `script`.
+        """
+        positions = []
+        for i, value in enumerate(values):
+            push = push_number(value)
+            if script.count(push) != 1:
+                return None
+            positions.append((script.index(push), len(push), i))
+        positions.sort()
+
+        segments = []
+        cursor = 0
+        for start, length, _ in positions:
+            if start < cursor:
+                return None
+            segments.append(script[cursor:start])
+            cursor = start + length
+        segments.append(script[cursor:])
+
+        return ScriptTemplate(segments, [i for _, _, i in positions])
+
+    def render(self, values: list[int]) -> bytes:
+        """The serialisation of the script obtained by pushing `values` in the slots."""
+        out = [self.segments[0]]
+        for i, segment in zip(self.order, self.segments[1:]):
+            out.append(push_number(values[i]))
+            out.append(segment)
+        return b"".join(out)
@@ -0,0 +1,68 @@
+"""ECDSA signers with cached key material and deterministic nonces."""
+
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+
+import ecdsa
+from ecdsa.util import sigencode_der_canonize
+from tx_engine import SIGHASH, Wallet
+
+# Length of a signature pushed in an unlocking script: DER encoding of (r, s) followed by the sighash flag
+SIG_LEN = 0x48
+# Maximum number of signers kept by `signer_for`
+MAX_SIGNERS = 64
+
+
+class Signer:
+    """Sign transactions with the private key of a wallet.
+
+    The signing key (and its public key) is computed once. Nonces are derived deterministically from the
+    key and the sighash as in RFC 6979, and signatures are low-S. As the circuits expect signatures of
+    exactly `SIG_LEN` bytes, the nonce derivation is re-run with an increasing counter as extra entropy
+    until the signature has the right length, which takes two attempts on average. The counter makes the
+    result deterministic, so signing the same sighash twice gives the same signature.
+
+    Args:
+        wallet (Wallet): The wallet holding the private key.
+    """
+
+    def __init__(self, wallet: Wallet):
+        self.signing_key = ecdsa.SigningKey.from_secret_exponent(
+            wallet.to_int(), curve=ecdsa.SECP256k1, hashfunc=hashlib.sha256
+        )
+
+    def sign_digest(self, digest: bytes, flag: SIGHASH = SIGHASH.ALL_FORKID) -> bytes:
+        """Sign the sighash `digest`, returning the signature followed by `flag`."""
+        for counter in itertools.count():
+            der = self.signing_key.sign_digest_deterministic(
+                digest,
+                hashfunc=hashlib.sha256,
+                sigencode=sigencode_der_canonize,
+                extra_entropy=counter.to_bytes(32, "little") if counter else b"",
+            )
+            if len(der) + 1 == SIG_LEN:
+                return der + flag.to_bytes()
+
+
+# Signers of the wallets used last, by public key
+_SIGNERS = OrderedDict()
+_SIGNERS_LOCK = threading.Lock()
+
+
+def signer_for(wallet: Wallet) -> Signer:
+    """The `Signer` of `wallet`, reused while it is among the last `MAX_SIGNERS` wallets used."""
+    key = wallet.get_public_key_as_hexstr()
+    with _SIGNERS_LOCK:
+        if key in _SIGNERS:
+            _SIGNERS.move_to_end(key)
+            return _SIGNERS[key]
+
+    signer = Signer(wallet)
+    with _SIGNERS_LOCK:
+        _SIGNERS[key] = signer
+        while len(_SIGNERS) > MAX_SIGNERS:
+            _SIGNERS.popitem(last=False)
+
+    return signer
@@ -0,0 +1,283 @@
+"""Lifecycle of the bridged tokens, indexed by the outpoints that identify them on chain."""
+
+from typing import Callable
+
+from bsv.records import BurntToken, Outpoint
+
+# States of a token
+GENESIS = "genesis"  # The genesis transaction is broadcast, the pegout UTXO is not created yet
+PEGGED_IN = "pegged_in"  # The pegout UTXO is created, the token is held by the user who pegged in
+TRANSFERRED = "transferred"  # The token was transferred at least once
+BURNT = "burnt"  # The token and its pegout UTXO are spent by a burning transaction
+PEGGED_OUT = "pegged_out"  # The burn was redeemed on the source chain
+
+# Allowed transitions between states
+TRANSITIONS = {
+    GENESIS: (PEGGED_IN,),
+    PEGGED_IN: (TRANSFERRED, BURNT),
+    TRANSFERRED: (TRANSFERRED, BURNT),
+    BURNT: (PEGGED_OUT,),
+    PEGGED_OUT: (),
+}
+# States in which the token is held by its owner, i.e., can be transferred or burnt
+HELD = (GENESIS, PEGGED_IN, TRANSFERRED)
+
+
+class TokenRecord:
+    """The state of a token, from its genesis to its pegout.
+
+    Args:
+        genesis (Outpoint): The genesis output, which identifies the token.
+        zk_proof_path (str | None): The name of the proof of the current tip.
+        tip (Outpoint | None): The output currently holding the token. Defaults to `genesis`.
+        pegout (Outpoint | None): The pegout UTXO, spent when the token is burnt.
+        state (str): The state of the token, one of the keys of `TRANSITIONS`.
+        burning_txid (str | None): The txid of the transaction burning the token.
+    """
+
+    __slots__ = ("genesis", "tip", "pegout", "zk_proof_path", "state", "burning_txid")
+
+    def __init__(
+        self,
+        genesis: Outpoint,
+        zk_proof_path: str | None,
+        tip: Outpoint | None = None,
+        pegout: Outpoint | None = None,
+        state: str = GENESIS,
+        burning_txid: str | None = None,
+    ):
+        assert state in TRANSITIONS, f"Unknown token state {state}"
+        if tip is None and state in HELD:
+            tip = genesis
+        self.genesis = genesis
+        self.zk_proof_path = zk_proof_path
+        self.tip = tip
+        self.pegout = pegout
+        self.state = state
+        self.burning_txid = burning_txid
+
+    @property
+    def held(self) -> bool:
+        return self.state in HELD
+
+    def advance(self, state: str):
+        """Move the token to `state`. Raises `AssertionError` if the transition is not allowed."""
+        assert state in TRANSITIONS[self.state], (
+            f"Token {self.genesis.to_hexstr()} cannot go from {self.state} to {state}"
+        )
+        self.state = state
+        return
+
+    def to_dict(self) -> dict:
+        return {
+            "genesis": self.genesis.to_hexstr(),
+            "tip": self.tip.to_hexstr() if self.tip is not None else None,
+            "pegout": self.pegout.to_hexstr() if self.pegout is not None else None,
+            "zk_proof_path": self.zk_proof_path,
+            "state": self.state,
+            "burning_txid": self.burning_txid,
+        }
+
+    @staticmethod
+    def from_dict(data: dict):
+        return TokenRecord(
+            Outpoint.from_hexstr(data["genesis"]),
+            data.get("zk_proof_path"),
+            Outpoint.from_hexstr(data["tip"]) if data.get("tip") else None,
+            Outpoint.from_hexstr(data["pegout"]) if data.get("pegout") else None,
+            data.get("state", GENESIS),
+            data.get("burning_txid"),
+        )
+
+    def __repr__(self):
+        return f"Genesis: {self.genesis}, Tip: {self.tip}, Pegout: {self.pegout}, State: {self.state}"
+
+
+def tokens_from_lists(user: dict) -> list[dict]:
+    """The tokens of a user stored in the legacy wallet format, as dicts in the format of `TokenRecord.to_dict`.
+
+    The legacy format keeps `genesis_utxos`, `token_utxos`, `pegout_utxos` and `zk_proof_paths` as
+    lists aligned by position, and `burnt_tokens` as `"genesis_txid:burning_txid"` strings.
+    """
+    genesis_utxos = user.get("genesis_utxos", [])
+    token_utxos = user.get("token_utxos", [])
+    pegout_utxos = user.get("pegout_utxos", [])
+    zk_proof_paths = user.get("zk_proof_paths", [])
+    tokens = []
+    for i, genesis in enumerate(genesis_utxos):
+        tip = token_utxos[i] if i < len(token_utxos) else genesis
+        pegout = pegout_utxos[i] if i < len(pegout_utxos) else None
+        if pegout is None:
+            state = GENESIS
+        else:
+            state = PEGGED_IN if tip == genesis else TRANSFERRED
+        tokens.append(
+            {
+                "genesis": genesis,
+                "tip": tip,
+                "pegout": pegout,
+                "zk_proof_path": zk_proof_paths[i] if i < len(zk_proof_paths) else None,
+                "state": state,
+                "burning_txid": None,
+            }
+        )
+    for burnt_token in user.get("burnt_tokens", []):
+        burnt_token = BurntToken.from_hexstr(burnt_token)
+        tokens.append(
+            {
+                # Genesis transactions create the token in their first output
+                "genesis": Outpoint(burnt_token.genesis, 0).to_hexstr(),
+                "tip": None,
+                "pegout": None,
+                "zk_proof_path": None,
+                "state": BURNT,
+                "burning_txid": burnt_token.burning_txid,
+            }
+        )
+    return tokens
+
+
+class TokenRegistry:
+    """The tokens of every user, indexed by genesis, tip and pegout outpoint.
+
+    The tokens of a user are kept in a dict keyed by genesis outpoint, in the order the user received
+    them, except that burnt tokens are moved to the end, in the order they were burnt. Every change of
+    state goes through the registry, which keeps the indexes up to date, so that the token spent or
+    created by a transaction is found in constant time, whoever holds it.
+
+    The tokens of a user are indexed the first time they are accessed. If `locate` is set, `find` uses
+    it to look up the owner of a token that is not indexed, instead of indexing every user.
+
+    Args:
+        ledgers (list[dict[Outpoint, TokenRecord]]): The tokens of each user, keyed by genesis outpoint.
+            May be a `LazyColumn`.
+        locate (Callable[[Outpoint], int | None] | None): The index of the user owning the token with
+            the given genesis, tip or pegout outpoint, if any.
+    """
+
+    def __init__(
+        self,
+        ledgers: list[dict[Outpoint, TokenRecord]],
+        locate: Callable[[Outpoint], int | None] | None = None,
+    ):
+        self.ledgers = ledgers
+        self.locate = locate
+        # Genesis outpoint -> index of the owner
+        self._owners = {}
+        # Tip and pegout outpoints -> genesis outpoint
+        self._by_tip = {}
+        self._by_pegout = {}
+        self._indexed = set()
+
+    def tokens(self, wallet_index: int) -> list[TokenRecord]:
+        """The tokens held by wallet_index, in the order they were received."""
+        return [token for token in self.__ledger(wallet_index).values() if token.held]
+
+    def burnt(self, wallet_index: int) -> list[TokenRecord]:
+        """The tokens burnt by wallet_index, in the order they were burnt."""
+        return [
+            token for token in self.__ledger(wallet_index).values() if not token.held
+        ]
+
+    def find(self, outpoint: Outpoint) -> tuple[int, TokenRecord] | None:
+        """The `(owner index, record)` of the token with genesis, tip or pegout `outpoint`, if any."""
+        found = self.__lookup(outpoint)
+        if found is None and len(self._indexed) < len(self.ledgers):
+            if self.locate is not None:
+                owner = self.locate(outpoint)
+                if owner is not None:
+                    self.__ledger(owner)
+            else:
+                for wallet_index in range(len(self.ledgers)):
+                    self.__ledger(wallet_index)
+            found = self.__lookup(outpoint)
+        return found
+
+    def owner(self, token: TokenRecord) -> int:
+        return self._owners[token.genesis]
+
+    def add(self, wallet_index: int, token: TokenRecord):
+        """Add the new token `token`, held by wallet_index."""
+        assert token.genesis not in self._owners, (
+            f"Duplicate token {token.genesis.to_hexstr()}"
+        )
+        self.__ledger(wallet_index)[token.genesis] = token
+        self.__index(wallet_index, token)
+        return
+
+    def peg_in(self, token: TokenRecord, pegout: Outpoint):
+        """Record the creation of the pegout UTXO of `token`."""
+        token.advance(PEGGED_IN)
+        token.pegout = pegout
+        self._by_pegout[pegout] = token.genesis
+        return
+
+    def transfer(
+        self,
+        token: TokenRecord,
+        receiver_index: int,
+        tip: Outpoint,
+        zk_proof_path: str,
+    ):
+        """Record the transfer of `token` to receiver_index in the output `tip`, proven by `zk_proof_path`."""
+        token.advance(TRANSFERRED)
+        del self.__ledger(self._owners[token.genesis])[token.genesis]
+        del self._by_tip[token.tip]
+        token.tip = tip
+        token.zk_proof_path = zk_proof_path
+        self.__ledger(receiver_index)[token.genesis] = token
+        self.__index(receiver_index, token)
+        return
+
+    def burn(self, token: TokenRecord, burning_txid: str):
+        """Record the burn of `token` by the transaction `burning_txid`."""
+        token.advance(BURNT)
+        token.burning_txid = burning_txid
+        ledger = self.__ledger(self._owners[token.genesis])
+        ledger[token.genesis] = ledger.pop(token.genesis)
+        return
+
+    def peg_out(self, token: TokenRecord):
+        """Record the redemption of the burnt `token` on the source chain."""
+        token.advance(PEGGED_OUT)
+        return
+
+    def reload(self, wallet_index: int, ledger: dict[Outpoint, TokenRecord]):
+        """Replace the tokens of wallet_index, e.g., with the ones saved by another process."""
+        if wallet_index in self._indexed:
+            for token in self.ledgers[wallet_index].values():
+                if self._owners.get(token.genesis) == wallet_index:
+                    del self._owners[token.genesis]
+                    self._by_tip.pop(token.tip, None)
+                    self._by_pegout.pop(token.pegout, None)
+            self._indexed.discard(wallet_index)
+        self.ledgers[wallet_index] = ledger
+        self.__ledger(wallet_index)
+        return
+
+    def __ledger(self, wallet_index: int) -> dict[Outpoint, TokenRecord]:
+        ledger = self.ledgers[wallet_index]
+        if wallet_index not in self._indexed:
+            self._indexed.add(wallet_index)
+            for token in ledger.values():
+                self.__index(wallet_index, token)
+        return ledger
+
+    def __index(self, wallet_index: int, token: TokenRecord):
+        self._owners[token.genesis] = wallet_index
+        if token.tip is not None:
+            self._by_tip[token.tip] = token.genesis
+        if token.pegout is not None:
+            self._by_pegout[token.pegout] = token.genesis
+        return
+
+    def __lookup(self, outpoint: Outpoint) -> tuple[int, TokenRecord] | None:
+        genesis = (
+            outpoint
+            if outpoint in self._owners
+            else self._by_tip.get(outpoint, self._by_pegout.get(outpoint))
+        )
+        if genesis is None:
+            return None
+        owner = self._owners[genesis]
+        return owner, self.ledgers[owner][genesis]
@@ -0,0 +1,267 @@
+"""Pipeline overlapping the build, broadcast, proof and commit of many token transfers."""
+
+import queue
+import threading
+import time
+from collections import deque
+
+from bsv.proof_scheduler import JOB_CORES, JOB_MEMORY
+from bsv.prover_client import TCP_ENGINE
+from bsv.records import Outpoint
+from bsv.tokens import TokenRecord
+from bsv.wallet import OperationState, WalletManager
+
+BUILD = "build"
+BROADCAST = "broadcast"
+PROVE = "prove"
+COMMIT = "commit"
+STAGES = (BUILD, BROADCAST, PROVE, COMMIT)
+
+
+class PendingTransfer:
+    """A transfer submitted to a `TransferPipeline`.
+
+    Args:
+        sender_index (int): The owner of the token when the transfer starts.
+        receiver_index (int): The receiver of the token.
+        genesis (Outpoint): The genesis outpoint of the token.
+    """
+
+    def __init__(self, sender_index: int, receiver_index: int, genesis: Outpoint):
+        self.sender_index = sender_index
+        self.receiver_index = receiver_index
+        self.genesis = genesis
+        self.operation = OperationState()
+        self.transfer = None
+        self.stage = None
+        self.error = None
+        self._done = threading.Event()
+
+    def result(self) -> TokenRecord:
+        """Wait for the transfer to be committed, re-raising the error if it failed."""
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.transfer.token
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def __repr__(self):
+        return (
+            f"PendingTransfer(genesis={self.genesis.to_hexstr()}, stage={self.stage})"
+        )
+
+
+class StageCounters:
+    """Throughput counters of a stage of a `TransferPipeline`."""
+
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.busy = 0
+        # Seconds spent processing transfers, summed over the workers of the stage
+        self.busy_time = 0.0
+
+    def to_dict(self, elapsed: float) -> dict:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "busy": self.busy,
+            "busy_time": self.busy_time,
+            "per_second": self.completed / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+class TransferPipeline:
+    """Run token transfers through the stages build → broadcast → prove → commit, connected by queues.
+
+    Each stage has its own worker threads, so that the transfers of independent tokens go through the
+    stages at the same time: while a proof runs, other transfers are built and broadcast, and as many
+    proofs run as the `ProofScheduler` of the wallet manager admits. The transfers of a token are
+    strictly ordered: the next one is only built once the previous one is committed, as it spends the
+    output and extends the proof created by the previous one.
+
+    Each transfer is a single `WalletManager.operation` spanning the stages: the token and funding
+    outputs it spends stay leased until it is committed, and nothing is saved if any stage fails. The
+    stages touching the state of the wallet manager (build and commit) hold a lock shared by the whole
+    pipeline, broadcasting and proving do not.
+
+    Args:
+        wallet_manager (WalletManager): The wallet manager holding the tokens.
+        provers (int | None): Worker threads of the prove stage. Defaults to the number of transfer proofs
+            fitting in the budget of the scheduler of `wallet_manager`.
+        broadcasters (int): Worker threads of the broadcast stage.
+    """
+
+    def __init__(
+        self,
+        wallet_manager: WalletManager,
+        provers: int | None = None,
+        broadcasters: int = 2,
+    ):
+        self.wallet_manager = wallet_manager
+        if provers is None:
+            scheduler = wallet_manager.scheduler
+            provers = max(
+                1,
+                min(
+                    scheduler.memory_budget // JOB_MEMORY[TCP_ENGINE],
+                    scheduler.core_budget // JOB_CORES,
+                ),
+            )
+        self.workers = {BUILD: 1, BROADCAST: broadcasters, PROVE: provers, COMMIT: 1}
+        self.counters = {stage: StageCounters() for stage in STAGES}
+        self._queues = {stage: queue.Queue() for stage in STAGES}
+        # Genesis outpoint -> transfers of the token waiting for the one in flight
+        self._waiting = {}
+        # Guards the counters and `_waiting`, notified when no token has a transfer in flight
+        self._condition = threading.Condition()
+        # Serialises the stages changing the state of the wallet manager
+        self._wallet_lock = threading.Lock()
+        self._threads = []
+        self._started_at = None
+
+    def start(self):
+        """Start the worker threads of every stage."""
+        assert not self._threads, "The transfer pipeline is already running"
+        self._started_at = time.monotonic()
+        for stage in STAGES:
+            for _ in range(self.workers[stage]):
+                thread = threading.Thread(
+                    target=self.__run,
+                    args=(stage,),
+                    name=f"transfer-{stage}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+        return
+
+    def stop(self):
+        """Wait for the transfers already submitted to be done, then stop the worker threads."""
+        with self._condition:
+            self._condition.wait_for(lambda: not self._waiting)
+        for stage in STAGES:
+            for _ in range(self.workers[stage]):
+                self._queues[stage].put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        return
+
+    def submit(
+        self, sender_index: int, receiver_index: int, token: int | Outpoint
+    ) -> PendingTransfer:
+        """Queue the transfer of the token from sender_index to receiver_index and return immediately.
+
+        Args:
+            sender_index (int): The owner of the token when the transfer starts, i.e., after the transfers
+                of the same token submitted before.
+            receiver_index (int): The receiver of the token.
+            token (int | Outpoint): The token, see `WalletManager.token`. A position is resolved now,
+                among the tokens currently held by sender_index.
+        """
+        with self._wallet_lock:
+            if isinstance(token, int):
+                genesis = self.wallet_manager.token(sender_index, token).genesis
+            else:
+                found = self.wallet_manager.tokens.find(token)
+                assert found is not None, f"Unknown token {token}"
+                genesis = found[1].genesis
+        pending = PendingTransfer(sender_index, receiver_index, genesis)
+
+        with self._condition:
+            if genesis in self._waiting:
+                self._waiting[genesis].append(pending)
+                return pending
+            self._waiting[genesis] = deque()
+        self.__enqueue(BUILD, pending)
+        return pending
+
+    def status(self) -> dict:
+        """Per-stage counters and queue depths, and the number of tokens with a transfer in flight."""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        with self._condition:
+            return {
+                "stages": {
+                    stage: {
+                        **self.counters[stage].to_dict(elapsed),
+                        "queue_depth": self._queues[stage].qsize(),
+                        "workers": self.workers[stage],
+                    }
+                    for stage in STAGES
+                },
+                "tokens_in_flight": len(self._waiting),
+            }
+
+    def __enqueue(self, stage: str, pending: PendingTransfer):
+        pending.stage = stage
+        self._queues[stage].put(pending)
+        return
+
+    def __run(self, stage: str):
+        while True:
+            pending = self._queues[stage].get()
+            if pending is None:
+                return
+            with self._condition:
+                self.counters[stage].busy += 1
+            start = time.monotonic()
+            try:
+                self.__process(stage, pending)
+                failed = False
+            except Exception as e:
+                pending.error = e
+                failed = True
+            with self._condition:
+                counters = self.counters[stage]
+                counters.busy -= 1
+                counters.busy_time += time.monotonic() - start
+                if failed:
+                    counters.failed += 1
+                else:
+                    counters.completed += 1
+            if failed or stage == COMMIT:
+                self.__finish(pending)
+            else:
+                self.__enqueue(STAGES[STAGES.index(stage) + 1], pending)
+
+    def __process(self, stage: str, pending: PendingTransfer):
+        wallet_manager = self.wallet_manager
+        if stage == BUILD:
+            with self._wallet_lock:
+                with wallet_manager.operation(pending.operation, end=False):
+                    pending.transfer = wallet_manager.build_transfer(
+                        pending.sender_index, pending.receiver_index, pending.genesis
+                    )
+        elif stage == BROADCAST:
+            with wallet_manager.operation(pending.operation, end=False):
+                wallet_manager.broadcast_transfer(pending.transfer)
+        elif stage == PROVE:
+            with wallet_manager.operation(pending.operation, end=False):
+                wallet_manager.prove_transfer(pending.transfer)
+        else:
+            with self._wallet_lock:
+                with wallet_manager.operation(pending.operation):
+                    wallet_manager.commit_transfer(pending.transfer)
+        return
+
+    def __finish(self, pending: PendingTransfer):
+        """Release the token of `pending` to its next transfer, failing them all if `pending` failed."""
+        pending._done.set()
+        with self._condition:
+            waiting = self._waiting[pending.genesis]
+            if pending.error is not None:
+                # The next transfers spend the output `pending` was meant to create
+                for following in waiting:
+                    following.error = pending.error
+                    following._done.set()
+                waiting.clear()
+            following = waiting.popleft() if waiting else None
+            if following is None:
+                del self._waiting[pending.genesis]
+                self._condition.notify_all()
+        if following is not None:
+            self.__enqueue(BUILD, following)
+        return
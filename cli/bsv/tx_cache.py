@@ -0,0 +1,105 @@
+"""Content-addressed cache of the transactions fetched from or broadcast to the blockchain."""
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+from tx_engine import Tx
+
+TX_CACHE_DIR = Path(__file__).parent.parent / "data/tx_cache"
+MAX_PARSED_TXS = 256
+
+
+class TxCache:
+    """Two-level cache (in-process LRU of parsed transactions + on-disk raw transactions) keyed by txid.
+
+    A txid commits to the whole transaction, so entries never go stale: a transaction is fetched at most
+    once, and never if it was broadcast through `put`. Raw transactions are stored under
+    `cache_dir/<txid[:2]>/<txid>.bin`, and their txid is checked when they are loaded.
+
+    The parsed transactions are shared between callers, so they must not be modified.
+
+    Args:
+        cache_dir (Path): The directory in which to store the raw transactions.
+        max_entries (int): Maximum number of parsed transactions kept in memory.
+    """
+
+    def __init__(
+        self, cache_dir: Path = TX_CACHE_DIR, max_entries: int = MAX_PARSED_TXS
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self._txs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, txid: str, fetch: Callable[[str], str]) -> Tx:
+        """Return the transaction `txid`, calling `fetch(txid)` for its hex serialisation on a miss."""
+        with self._lock:
+            if txid in self._txs:
+                self._txs.move_to_end(txid)
+                return self._txs[txid]
+
+        tx = self.__load(txid)
+        if tx is None:
+            tx = Tx.parse_hexstr(fetch(txid))
+            assert tx.id() == txid, f"Fetched transaction {tx.id()} instead of {txid}"
+            self.__store(txid, tx.serialize())
+
+        self.__remember(txid, tx)
+        return tx
+
+    def put(self, tx: Tx):
+        """Store `tx`, e.g., because we are about to broadcast it."""
+        txid = tx.id()
+        self.__store(txid, tx.serialize())
+        self.__remember(txid, tx)
+        return
+
+    def put_raw(self, txid: str, raw_tx: bytes):
+        """Store the serialised transaction `raw_tx`, parsing it only if it is requested."""
+        self.__store(txid, raw_tx)
+        return
+
+    def clear(self):
+        """Drop every transaction, both in memory and on disk."""
+        with self._lock:
+            self._txs.clear()
+        for path in self.cache_dir.glob("*/*.bin"):
+            path.unlink(missing_ok=True)
+        return
+
+    def __path(self, txid: str) -> Path:
+        return self.cache_dir / txid[:2] / f"{txid}.bin"
+
+    def __load(self, txid: str) -> Tx | None:
+        try:
+            tx = Tx.parse(self.__path(txid).read_bytes())
+        except (FileNotFoundError, ValueError):
+            return None
+        # Discard corrupted entries, they are fetched again
+        return tx if tx.id() == txid else None
+
+    def __store(self, txid: str, raw_tx: bytes):
+        path = self.__path(txid)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that concurrent readers never see a partial entry
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+            f.write(raw_tx)
+        os.replace(f.name, path)
+        return
+
+    def __remember(self, txid: str, tx: Tx):
+        with self._lock:
+            self._txs[txid] = tx
+            self._txs.move_to_end(txid)
+            while len(self._txs) > self.max_entries:
+                self._txs.popitem(last=False)
+        return
+
+
+TX_CACHE = TxCache()
@@ -1,15 +1,24 @@
 """Utilies to facilitate interaction with the blockchain."""
 
-from random import randint
+import hashlib
 
-import ecdsa
-from tx_engine import SIGHASH, Script, Tx, TxIn, TxOut, Wallet, sig_hash
+from tx_engine import SIGHASH, Script, Tx, TxIn, TxOut, Wallet
 from tx_engine.interface.blockchain_interface import BlockchainInterface
 from tx_engine.interface.interface_factory import InterfaceFactory
 
-GROUP_ORDER = ecdsa.curves.SECP256k1.order
+from bsv.signer import SIG_LEN, signer_for
+from bsv.tx_cache import TX_CACHE, TxCache
 
-SIG_LEN = 0x48
+# Size of the push of a signature in an unlocking script: signers always produce `SIG_LEN` bytes
+SIGNATURE_PUSH_SIZE = 1 + SIG_LEN
+# Signature followed by the push of a compressed public key
+P2PKH_UNLOCKING_SCRIPT_SIZE = SIGNATURE_PUSH_SIZE + 1 + 33
+# Version, locktime
+TX_FIXED_SIZE = 8
+# Outpoint, sequence
+TX_IN_FIXED_SIZE = 40
+# Amount
+TX_OUT_FIXED_SIZE = 8
 
 
 def setup_network_connection(network):
@@ -37,30 +46,94 @@ def tx_to_input(tx: Tx, index: int, unlocking_script: Script, sequence=0) -> TxI
     )
 
 
+def varint_size(n: int) -> int:
+    """Size of the varint encoding of `n`."""
+    if n < 0xFD:
+        return 1
+    if n <= 0xFFFF:
+        return 3
+    if n <= 0xFFFFFFFF:
+        return 5
+    return 9
+
+
+def script_size(script: Script) -> int:
+    """Size of the raw serialisation of `script`."""
+    return len(script.raw_serialize())
+
+
+def tx_in_size(unlocking_script_size: int) -> int:
+    """Serialised size of an input whose unlocking script is `unlocking_script_size` bytes long."""
+    return TX_IN_FIXED_SIZE + varint_size(unlocking_script_size) + unlocking_script_size
+
+
+def tx_out_size(locking_script_size: int) -> int:
+    """Serialised size of an output whose locking script is `locking_script_size` bytes long."""
+    return TX_OUT_FIXED_SIZE + varint_size(locking_script_size) + locking_script_size
+
+
+def tx_size_from_scripts(
+    unlocking_script_sizes: list[int], locking_script_sizes: list[int]
+) -> int:
+    """Serialised size of a transaction with scripts of the given sizes."""
+    return (
+        TX_FIXED_SIZE
+        + varint_size(len(unlocking_script_sizes))
+        + sum(tx_in_size(size) for size in unlocking_script_sizes)
+        + varint_size(len(locking_script_sizes))
+        + sum(tx_out_size(size) for size in locking_script_sizes)
+    )
+
+
+def tx_size(tx: Tx, unsigned_inputs: list[int] | None = None) -> int:
+    """Serialised size of `tx`, computed from the sizes of its scripts.
+
+    Args:
+        tx (Tx): The transaction.
+        unsigned_inputs (list[int] | None): Indices of the inputs whose signature is still to be prepended
+            to the unlocking script. `SIGNATURE_PUSH_SIZE` bytes are reserved for each of them.
+    """
+    unsigned_inputs = set(unsigned_inputs or [])
+    return tx_size_from_scripts(
+        [
+            script_size(txin.script_sig) + SIGNATURE_PUSH_SIZE * (i in unsigned_inputs)
+            for i, txin in enumerate(tx.tx_ins)
+        ],
+        [script_size(output.script_pubkey) for output in tx.tx_outs],
+    )
+
+
+def deduct_fee(outputs: list[TxOut], index: int, fee: int) -> list[TxOut]:
+    """Deduct `fee` from the amount of `outputs[index]`."""
+    assert outputs[index].amount > fee, (
+        f"Not enough funds. Fee: {fee}, amount: {outputs[index].amount}"
+    )
+    return [
+        TxOut(
+            amount=output.amount - fee * (i == index),
+            script_pubkey=output.script_pubkey,
+        )
+        for i, output in enumerate(outputs)
+    ]
+
+
 def update_tx_balance(
     tx: Tx,
     index: int,
     fee_rate: int,  # Quoted in satoshis / kB
+    unsigned_inputs: list[int] | None = None,
 ) -> Tx:
-    """Update the amount of tx.tx_outs[index] according to the fee rate."""
-    tx_size = len(tx.serialize())
-    fee = tx_size * fee_rate // 1024
-
-    assert tx.tx_outs[index].amount > fee, (
-        f"Not enough funds. Fee: {fee}, amount: {tx.tx_outs[index].amount}"
-    )
+    """Update the amount of tx.tx_outs[index] according to the fee rate.
 
-    new_tx_outs = []
-    for i, output in enumerate(tx.tx_outs):
-        new_tx_outs.append(
-            TxOut(
-                amount=output.amount - fee * (i == index),
-                script_pubkey=output.script_pubkey,
-            )
-        )
+    The fee covers the signatures still to be prepended to the inputs in `unsigned_inputs`, see `tx_size`.
+    """
+    fee = tx_size(tx, unsigned_inputs) * fee_rate // 1024
 
     return Tx(
-        version=tx.version, tx_ins=tx.tx_ins, tx_outs=new_tx_outs, locktime=tx.locktime
+        version=tx.version,
+        tx_ins=tx.tx_ins,
+        tx_outs=deduct_fee(tx.tx_outs, index, fee),
+        locktime=tx.locktime,
     )
 
 
@@ -71,6 +144,325 @@ def bytes_to_script(data: list[bytes]):
     return out
 
 
+def _hash256d(data: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def _varint(n: int) -> bytes:
+    if n < 0xFD:
+        return n.to_bytes(1, "little")
+    if n <= 0xFFFF:
+        return b"\xfd" + n.to_bytes(2, "little")
+    if n <= 0xFFFFFFFF:
+        return b"\xfe" + n.to_bytes(4, "little")
+    return b"\xff" + n.to_bytes(8, "little")
+
+
+def _serialise_output(output: TxOut) -> bytes:
+    return output.amount.to_bytes(8, "little") + output.script_pubkey.serialize()
+
+
+def raw_tx_id(raw_tx: bytes) -> str:
+    """The txid of the serialised transaction `raw_tx`."""
+    return _hash256d(raw_tx)[::-1].hex()
+
+
+class SighashCache:
+    """FORKID (BIP143) sighashes of the inputs of `tx`.
+
+    hashPrevouts, hashSequence and hashOutputs are the same for every input signed with the same flag, so
+    they are computed once instead of once per input, which makes signing all the inputs linear in the size
+    of the transaction rather than quadratic.
+
+    Args:
+        tx (Tx): The transaction to be signed.
+    """
+
+    def __init__(self, tx: Tx):
+        self.version = tx.version.to_bytes(4, "little")
+        self.locktime = tx.locktime.to_bytes(4, "little")
+        tx_ins = tx.tx_ins
+        self.outpoints = [
+            bytes.fromhex(txin.prev_tx)[::-1] + txin.prev_index.to_bytes(4, "little")
+            for txin in tx_ins
+        ]
+        self.sequences = [txin.sequence.to_bytes(4, "little") for txin in tx_ins]
+        self.outputs = [_serialise_output(output) for output in tx.tx_outs]
+        self._hash_prevouts = None
+        self._hash_sequence = None
+        self._hash_outputs = None
+
+    def sighash(
+        self,
+        index: int,
+        prev_locking_script: Script,
+        prev_amount: int,
+        flag: SIGHASH = SIGHASH.ALL_FORKID,
+    ) -> bytes:
+        """The sighash of the input at position `index`, equal to `tx_engine.sig_hash`.
+
+        Args:
+            index (int): The index of the input to be signed.
+            prev_locking_script (Script): The locking script of the output spent by the input.
+            prev_amount (int): The amount of the output spent by the input.
+            flag (SIGHASH): The sighash flag. Defaults to `SIGHASH.ALL_FORKID`.
+        """
+        assert flag & SIGHASH.FORKID, "Only FORKID sighashes are supported"
+        anyone_can_pay = flag & SIGHASH.ANYONECANPAY
+        base_flag = flag & 0x1F
+
+        hash_prevouts = bytes(32) if anyone_can_pay else self.__hash_prevouts()
+        hash_sequence = (
+            self.__hash_sequence()
+            if not anyone_can_pay and base_flag == SIGHASH.ALL
+            else bytes(32)
+        )
+        if base_flag == SIGHASH.ALL:
+            hash_outputs = self.__hash_outputs()
+        elif base_flag == SIGHASH.SINGLE and index < len(self.outputs):
+            hash_outputs = _hash256d(self.outputs[index])
+        else:
+            hash_outputs = bytes(32)
+
+        preimage = b"".join(
+            [
+                self.version,
+                hash_prevouts,
+                hash_sequence,
+                self.outpoints[index],
+                prev_locking_script.serialize(),
+                prev_amount.to_bytes(8, "little"),
+                self.sequences[index],
+                hash_outputs,
+                self.locktime,
+                int(flag).to_bytes(4, "little"),
+            ]
+        )
+        return _hash256d(preimage)
+
+    def __hash_prevouts(self) -> bytes:
+        if self._hash_prevouts is None:
+            self._hash_prevouts = _hash256d(b"".join(self.outpoints))
+        return self._hash_prevouts
+
+    def __hash_sequence(self) -> bytes:
+        if self._hash_sequence is None:
+            self._hash_sequence = _hash256d(b"".join(self.sequences))
+        return self._hash_sequence
+
+    def __hash_outputs(self) -> bytes:
+        if self._hash_outputs is None:
+            self._hash_outputs = _hash256d(b"".join(self.outputs))
+        return self._hash_outputs
+
+
+class TransactionBuilder:
+    """Build a transaction, then sign all its inputs in one pass and assemble it once.
+
+    Inputs are added together with the key signing them (if any) and the part of the unlocking script that
+    follows the signature, e.g., the public key for P2PKH. `sign` computes every sighash from a single
+    `SighashCache` of the unsigned transaction and creates the final transaction with all its unlocking
+    scripts in one go.
+
+    FORKID sighashes do not cover unlocking scripts, so signatures are computed on the skeleton of the
+    transaction (all unlocking scripts empty). Large unlocking scripts are never copied while signing,
+    and `serialise` writes the final transaction straight to bytes without creating a `Tx` at all.
+
+    Args:
+        version (int): The version of the transaction. Defaults to `1`.
+        locktime (int): The locktime of the transaction. Defaults to `0`.
+    """
+
+    def __init__(self, version: int = 1, locktime: int = 0):
+        self.version = version
+        self.locktime = locktime
+        self.inputs = []
+        self.outputs = []
+        # Sizes of the scripts, measured once when they are added
+        self._unlocking_script_sizes = []
+        self._locking_script_sizes = []
+
+    def add_input(
+        self,
+        prev_tx: Tx,
+        prev_index: int,
+        public_key: Wallet | None = None,
+        unlocking_script: Script | None = None,
+        sequence: int = 0,
+    ) -> int:
+        """Add an input spending `prev_tx.tx_outs[prev_index]` and return its index.
+
+        Args:
+            prev_tx (Tx): The transaction generating the output being spent.
+            prev_index (int): The index of the output being spent.
+            public_key (Wallet | None): The key signing the input. If `None`, the input is not signed.
+            unlocking_script (Script | None): The unlocking script, without the signature.
+            sequence (int): The sequence number of the input. Defaults to `0`.
+        """
+        return self.add_outpoint(
+            prev_tx.id(),
+            prev_index,
+            # The spent output is only needed to sign the input
+            prev_tx.tx_outs[prev_index] if public_key is not None else None,
+            public_key,
+            unlocking_script,
+            sequence,
+        )
+
+    def add_outpoint(
+        self,
+        prev_txid: str,
+        prev_index: int,
+        prev_output: TxOut | None,
+        public_key: Wallet | None = None,
+        unlocking_script: Script | None = None,
+        sequence: int = 0,
+    ) -> int:
+        """Add an input spending the output `prev_output` at `prev_txid:prev_index` and return its index.
+
+        Unlike `add_input`, it does not need the transaction creating the output.
+
+        Args:
+            prev_txid (str): The txid of the transaction generating the output being spent.
+            prev_index (int): The index of the output being spent.
+            prev_output (TxOut | None): The output being spent. Only required if the input is signed.
+            public_key (Wallet | None): The key signing the input. If `None`, the input is not signed.
+            unlocking_script (Script | None): The unlocking script, without the signature.
+            sequence (int): The sequence number of the input. Defaults to `0`.
+        """
+        unlocking_script = (
+            unlocking_script if unlocking_script is not None else Script()
+        )
+        self.inputs.append(
+            (prev_txid, prev_index, prev_output, public_key, unlocking_script, sequence)
+        )
+        self._unlocking_script_sizes.append(script_size(unlocking_script))
+        return len(self.inputs) - 1
+
+    def add_output(self, output: TxOut) -> int:
+        """Add `output` and return its index."""
+        self.outputs.append(output)
+        self._locking_script_sizes.append(script_size(output.script_pubkey))
+        return len(self.outputs) - 1
+
+    def size(self) -> int:
+        """Serialised size of the signed transaction."""
+        return tx_size_from_scripts(
+            [
+                size + SIGNATURE_PUSH_SIZE * (public_key is not None)
+                for size, (_, _, _, public_key, _, _) in zip(
+                    self._unlocking_script_sizes, self.inputs
+                )
+            ],
+            self._locking_script_sizes,
+        )
+
+    def pay_fee(self, index: int, fee_rate: int):
+        """Deduct the fee for the signed transaction from `self.outputs[index]`.
+
+        Args:
+            index (int): The index of the output paying the fee.
+            fee_rate (int): The fee rate, quoted in satoshis / kB.
+        """
+        self.outputs = deduct_fee(self.outputs, index, self.size() * fee_rate // 1024)
+        return
+
+    def set_unlocking_script(self, index: int, unlocking_script: Script):
+        """Set the unlocking script (without the signature) of the input at position `index`."""
+        prev_txid, prev_index, prev_output, public_key, _, sequence = self.inputs[index]
+        self.inputs[index] = (
+            prev_txid,
+            prev_index,
+            prev_output,
+            public_key,
+            unlocking_script,
+            sequence,
+        )
+        self._unlocking_script_sizes[index] = script_size(unlocking_script)
+        return
+
+    def skeleton_tx(self) -> Tx:
+        """The transaction with empty unlocking scripts."""
+        return Tx(
+            version=self.version,
+            tx_ins=[
+                TxIn(
+                    prev_tx=prev_txid,
+                    prev_index=prev_index,
+                    script=Script(),
+                    sequence=sequence,
+                )
+                for prev_txid, prev_index, _, _, _, sequence in self.inputs
+            ],
+            tx_outs=self.outputs,
+            locktime=self.locktime,
+        )
+
+    def sign(self, flag: SIGHASH = SIGHASH.ALL_FORKID) -> Tx:
+        """Sign every input with a key and return the final transaction."""
+        return self.__assemble(self.__signatures(flag))
+
+    def serialise(self, flag: SIGHASH = SIGHASH.ALL_FORKID) -> bytes:
+        """Sign every input with a key and return the serialisation of the final transaction."""
+        signatures = self.__signatures(flag)
+        out = [self.version.to_bytes(4, "little"), _varint(len(self.inputs))]
+        for i, (prev_txid, prev_index, _, _, unlocking_script, sequence) in enumerate(
+            self.inputs
+        ):
+            script = unlocking_script.raw_serialize()
+            if i in signatures:
+                script = bytes_to_script(signatures[i]).raw_serialize() + script
+            out += [
+                bytes.fromhex(prev_txid)[::-1],
+                prev_index.to_bytes(4, "little"),
+                _varint(len(script)),
+                script,
+                sequence.to_bytes(4, "little"),
+            ]
+        out.append(_varint(len(self.outputs)))
+        out += [_serialise_output(output) for output in self.outputs]
+        out.append(self.locktime.to_bytes(4, "little"))
+        return b"".join(out)
+
+    def __signatures(self, flag: SIGHASH) -> dict[int, bytes]:
+        cache = SighashCache(self.skeleton_tx())
+        signatures = {}
+        for i, (_, _, prev_output, public_key, _, _) in enumerate(self.inputs):
+            if public_key is None:
+                continue
+            signatures[i] = signer_for(public_key).sign_digest(
+                cache.sighash(i, prev_output.script_pubkey, prev_output.amount, flag),
+                flag,
+            )
+        return signatures
+
+    def __assemble(self, signatures: dict[int, bytes]) -> Tx:
+        tx_ins = [
+            TxIn(
+                prev_tx=prev_txid,
+                prev_index=prev_index,
+                script=bytes_to_script(signatures[i]) + unlocking_script
+                if i in signatures
+                else unlocking_script,
+                sequence=sequence,
+            )
+            for i, (
+                prev_txid,
+                prev_index,
+                _,
+                _,
+                unlocking_script,
+                sequence,
+            ) in enumerate(self.inputs)
+        ]
+        return Tx(
+            version=self.version,
+            tx_ins=tx_ins,
+            tx_outs=self.outputs,
+            locktime=self.locktime,
+        )
+
+
 def prepend_signature(
     prev_tx: Tx,
     tx: Tx,
@@ -79,9 +471,13 @@ def prepend_signature(
     flag: SIGHASH = SIGHASH.ALL_FORKID,
 ) -> Tx:
     """Prepend signature to a the input at position `index` in `tx`."""
-    sig = sign_tx_with_random_k(prev_tx, tx, index, public_key, flag)
-    while len(sig) != SIG_LEN:
-        sig = sign_tx_with_random_k(prev_tx, tx, index, public_key, flag)
+    prev_output = prev_tx.tx_outs[tx.tx_ins[index].prev_index]
+    sig = signer_for(public_key).sign_digest(
+        SighashCache(tx).sighash(
+            index, prev_output.script_pubkey, prev_output.amount, flag
+        ),
+        flag,
+    )
     new_tx_ins = []
     for i, txin in enumerate(tx.tx_ins):
         new_tx_ins.append(
@@ -113,20 +509,15 @@ def spend_utxo(
 
     NOTE: It requires knowledge of the unlocking script needed to spend tx.tx_outs[index].
     """
-    spending_tx = Tx(
-        version=1,
-        tx_ins=[tx_to_input(tx, index, unlocking_script)],
-        tx_outs=outputs,
-        locktime=0,
-    )
+    builder = TransactionBuilder()
+    builder.add_input(tx, index, unlocking_script=unlocking_script)
+    for output in outputs:
+        builder.add_output(output)
+    builder.pay_fee(index_output, fee_rate)
 
-    spending_tx = update_tx_balance(
-        spending_tx,
-        index_output,
-        fee_rate,
-    )
+    spending_tx = builder.sign()
 
-    return spending_tx, network.broadcast_tx(spending_tx.serialize().hex())
+    return spending_tx, broadcast_tx(spending_tx, network)
 
 
 def spend_p2pk(
@@ -151,24 +542,16 @@ def spend_p2pk(
         network (BlockchainInterface): The connection to the blockchain.
         flag (SIGHASH): The sighash flag used to create the signatures. Defaults to `SIGHASH.ALL_FORKID`.
     """
-    inputs = [tx_to_input(tx, index, Script()) for (index, tx) in zip(indices, txs)]
-    spending_tx = Tx(version=1, tx_ins=inputs, tx_outs=outputs, locktime=0)
-    spending_tx = update_tx_balance(
-        tx=spending_tx,
-        index=index_output,
-        fee_rate=fee_rate,
-    )
+    builder = TransactionBuilder()
+    for index, tx, pub_key in zip(indices, txs, public_keys):
+        builder.add_input(tx, index, pub_key)
+    for output in outputs:
+        builder.add_output(output)
+    builder.pay_fee(index_output, fee_rate)
 
-    for i, (tx, pub_key) in enumerate(zip(txs, public_keys)):
-        spending_tx = prepend_signature(
-            prev_tx=tx,
-            tx=spending_tx,
-            index=i,
-            public_key=pub_key,
-            flag=flag,
-        )
+    spending_tx = builder.sign(flag)
 
-    return spending_tx, network.broadcast_tx(spending_tx.serialize().hex())
+    return spending_tx, broadcast_tx(spending_tx, network)
 
 
 def spend_p2pkh(
@@ -193,31 +576,21 @@ def spend_p2pkh(
         network (BlockchainInterface): The connection to the blockchain.
         flag (SIGHASH): The sighash flag used to create the signatures. Defaults to `SIGHASH.ALL_FORKID`.
     """
-    inputs = [
-        tx_to_input(
+    builder = TransactionBuilder()
+    for index, tx, pub_key in zip(indices, txs, public_keys):
+        builder.add_input(
             tx,
             index,
+            pub_key,
             bytes_to_script(bytes.fromhex(pub_key.get_public_key_as_hexstr())),
         )
-        for (index, tx, pub_key) in zip(indices, txs, public_keys)
-    ]
-    spending_tx = Tx(version=1, tx_ins=inputs, tx_outs=outputs, locktime=0)
-    spending_tx = update_tx_balance(
-        spending_tx,
-        index_output,
-        fee_rate,
-    )
+    for output in outputs:
+        builder.add_output(output)
+    builder.pay_fee(index_output, fee_rate)
 
-    for i, (tx, pub_key) in enumerate(zip(txs, public_keys)):
-        spending_tx = prepend_signature(
-            prev_tx=tx,
-            tx=spending_tx,
-            index=i,
-            public_key=pub_key,
-            flag=flag,
-        )
+    spending_tx = builder.sign(flag)
 
-    return spending_tx, network.broadcast_tx(spending_tx.serialize().hex())
+    return spending_tx, broadcast_tx(spending_tx, network)
 
 
 def p2pk_script(public_key: Wallet) -> Script:
@@ -244,40 +617,47 @@ def p2pkh(public_key: Wallet, amount: int, data_payload: None | bytes = None) ->
     return TxOut(amount, script)
 
 
-def tx_from_id(txid: str, network: BlockchainInterface) -> Tx:
-    """Retrieve `txid` from the Blockchain and convert it to an instance of `Tx`."""
-    return Tx.parse_hexstr(network.get_raw_transaction(txid))
+def tx_from_id(
+    txid: str, network: BlockchainInterface, cache: TxCache = TX_CACHE
+) -> Tx:
+    """Retrieve `txid` from the Blockchain and convert it to an instance of `Tx`.
 
+    Transactions are looked up in `cache` first, so each of them is fetched at most once.
+    """
+    return cache.get(txid, network.get_raw_transaction)
 
-def sign_tx_with_random_k(
-    prev_tx: Tx,
-    tx: Tx,
-    index: int,
-    public_key: Wallet,
-    flag: SIGHASH = SIGHASH.ALL_FORKID,
-) -> list[bytes]:
-    """Sign `tx.tx_ins[index]` with a random ephemeral key.
 
-    Args:
-        prev_tx (Tx): The transaction generating the output being spent by `tx.tx_ins[index]`.
-        tx (Tx): The transaction to be signed.
-        index (int): The index of the input of `tx` to be signed.
-        public_key (Wallet): The key required to sign `tx.tx_ins[index]`.
-        flag (SIGHASH): The sighash flag used to sign `tx.tx_ins[index]`. Defaults to `SIGHASH.ALL_FORKID`.
+def broadcast_tx(tx: Tx, network: BlockchainInterface, cache: TxCache = TX_CACHE):
+    """Broadcast `tx`, storing it in `cache` once accepted so that it is never fetched from the Blockchain."""
+    response = network.broadcast_tx(tx.serialize().hex())
+    if response.status_code == 200:
+        cache.put(tx)
+    return response
+
+
+def broadcast_raw_tx(
+    raw_tx: bytes, network: BlockchainInterface, cache: TxCache = TX_CACHE
+):
+    """Broadcast the serialised transaction `raw_tx`, storing it in `cache` once accepted."""
+    response = network.broadcast_tx(raw_tx.hex())
+    if response.status_code == 200:
+        cache.put_raw(raw_tx_id(raw_tx), raw_tx)
+    return response
+
+
+def broadcast_txs(
+    txs: list[Tx], network: BlockchainInterface, cache: TxCache = TX_CACHE
+) -> list:
+    """Broadcast `txs` in order, so that parents go before the transactions spending them.
+
+    The transactions are sent back to back, without waiting for them to be mined. Broadcasting stops at
+    the first transaction rejected by the network, so the returned responses are those of the first
+    `len(responses)` transactions, all accepted except possibly the last one.
     """
-    # Convert private key
-    priv_key_int = public_key.to_int()
-    generator = ecdsa.SECP256k1.generator
-    pub_key = ecdsa.ecdsa.Public_key(generator, generator * priv_key_int)
-    priv_key = ecdsa.ecdsa.Private_key(pub_key, priv_key_int)
-    # Generate sighash
-    prev_locking_script = prev_tx.tx_outs[tx.tx_ins[index].prev_index].script_pubkey
-    prev_amount = prev_tx.tx_outs[tx.tx_ins[index].prev_index].amount
-    msg = int.from_bytes(
-        sig_hash(tx, index, prev_locking_script, prev_amount, sighash_flags=flag)
-    )
-    # Generate signature
-    random_k = randint(2, GROUP_ORDER - 1)  # noqa: S311
-    sig = priv_key.sign(msg, random_k)
-    der = ecdsa.util.sigencode_der_canonize(sig.r, sig.s, GROUP_ORDER)
-    return der + flag.to_bytes()
+    responses = []
+    for tx in txs:
+        response = broadcast_tx(tx, network, cache)
+        responses.append(response)
+        if response.status_code != 200:
+            break
+    return responses
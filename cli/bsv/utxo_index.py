@@ -0,0 +1,314 @@
+"""Indexed set of the funding UTXOs of a user, with coin selection."""
+
+import bisect
+import random
+
+from bsv.records import Outpoint
+
+P2PKH = "p2pkh"
+P2PK = "p2pk"
+
+# Maximum number of branches explored by branch-and-bound
+BNB_MAX_TRIES = 100000
+# Number of random subsets tried by the knapsack solver
+KNAPSACK_ITERATIONS = 1000
+# Maximum number of unconfirmed ancestors (including itself) of a transaction accepted in the mempool
+MAX_UNCONFIRMED_ANCESTORS = 25
+
+
+class InsufficientFundsError(Exception):
+    """Raised when the UTXOs cannot pay for the requested amount."""
+
+
+class Utxo:
+    """An unspent output owned by the wallet.
+
+    Args:
+        prev_tx (str): The txid of the transaction creating the output.
+        prev_index (int): The index of the output in the transaction.
+        amount (int): The amount of the output, in satoshis.
+        script_type (str): The type of the locking script, either `P2PKH` or `P2PK`.
+        ancestors (set[str] | None): The txids of the unconfirmed transactions in the chain leading to the
+            output, including the one creating it, which is the only one if `None`. Empty once the
+            transaction creating the output has been mined.
+    """
+
+    def __init__(
+        self,
+        prev_tx: str,
+        prev_index: int,
+        amount: int,
+        script_type: str = P2PKH,
+        ancestors: set[str] | None = None,
+    ):
+        self.prev_tx = prev_tx
+        self.prev_index = prev_index
+        self.amount = amount
+        self.script_type = script_type
+        self.ancestors = {prev_tx} if ancestors is None else set(ancestors)
+
+    @property
+    def key(self) -> bytes:
+        return Outpoint(self.prev_tx, self.prev_index).key
+
+    @property
+    def confirmed(self) -> bool:
+        return not self.ancestors
+
+    def to_dict(self) -> dict:
+        return {
+            "outpoint": f"{self.prev_tx}:{self.prev_index.to_bytes(4, 'little').hex()}",
+            "amount": self.amount,
+            "script_type": self.script_type,
+            "ancestors": sorted(self.ancestors),
+        }
+
+    @staticmethod
+    def from_dict(data: dict):
+        prev_tx, prev_index = data["outpoint"].split(":")
+        return Utxo(
+            prev_tx,
+            int.from_bytes(bytes.fromhex(prev_index), "little"),
+            data["amount"],
+            data.get("script_type", P2PKH),
+            data.get("ancestors"),
+        )
+
+    def __repr__(self):
+        return f"prev_tx: {self.prev_tx}, prev_index: {self.prev_index}, amount: {self.amount}"
+
+
+class UtxoIndex:
+    """The UTXOs of a user, indexed by outpoint and ordered by amount.
+
+    Args:
+        utxos (list[Utxo] | None): The initial UTXOs.
+    """
+
+    def __init__(self, utxos: list[Utxo] | None = None):
+        self._by_outpoint = {}
+        self._by_amount = []
+        for utxo in utxos or []:
+            self.add(utxo)
+
+    def add(self, utxo: Utxo):
+        assert utxo.key not in self._by_outpoint, f"Duplicate UTXO {utxo.key}"
+        self._by_outpoint[utxo.key] = utxo
+        bisect.insort(self._by_amount, (utxo.amount, utxo.key))
+        return
+
+    def remove(self, prev_tx: str, prev_index: int) -> Utxo:
+        utxo = self._by_outpoint.pop(Outpoint(prev_tx, prev_index).key)
+        position = bisect.bisect_left(self._by_amount, (utxo.amount, utxo.key))
+        del self._by_amount[position]
+        return utxo
+
+    def get(self, prev_tx: str, prev_index: int) -> Utxo | None:
+        return self._by_outpoint.get(Outpoint(prev_tx, prev_index).key)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._by_outpoint
+
+    def __len__(self) -> int:
+        return len(self._by_outpoint)
+
+    def __iter__(self):
+        """Iterate over the UTXOs in increasing order of amount."""
+        return (self._by_outpoint[key] for _, key in self._by_amount)
+
+    def total(self) -> int:
+        return sum(amount for amount, _ in self._by_amount)
+
+    def count(
+        self, min_amount: int, max_amount: int, max_ancestors: int | None = None
+    ) -> int:
+        """Number of UTXOs with amount in [min_amount, max_amount] and fewer than `max_ancestors` unconfirmed ancestors."""
+        start = bisect.bisect_left(self._by_amount, (min_amount,))
+        end = bisect.bisect_left(self._by_amount, (max_amount + 1,))
+        return sum(
+            _spendable(self._by_outpoint[key], max_ancestors)
+            for _, key in self._by_amount[start:end]
+        )
+
+    def select_single(
+        self,
+        target: int,
+        max_amount: int | None = None,
+        max_ancestors: int | None = None,
+        exclude: set[bytes] | None = None,
+    ) -> Utxo:
+        """The smallest UTXO of at least `target` satoshis.
+
+        Used for transactions whose shape is fixed by the circuits, which can only have one funding input.
+
+        Args:
+            target (int): The minimum amount.
+            max_amount (int | None): If set, UTXOs larger than this are not used.
+            max_ancestors (int | None): If set, only UTXOs with fewer unconfirmed ancestors are used.
+            exclude (set[bytes] | None): Keys (see `Outpoint.key`) of UTXOs not to use, e.g., leased by another process.
+        """
+        position = bisect.bisect_left(self._by_amount, (target,))
+        for amount, key in self._by_amount[position:]:
+            if max_amount is not None and amount > max_amount:
+                break
+            utxo = self._by_outpoint[key]
+            if _spendable(utxo, max_ancestors) and (
+                exclude is None or key not in exclude
+            ):
+                return utxo
+
+        raise InsufficientFundsError(
+            f"No UTXO with amount in [{target}, {max_amount if max_amount is not None else 'inf'}]"
+        )
+
+    def select(
+        self,
+        target: int,
+        fee_per_input: int = 0,
+        cost_of_change: int = 0,
+        max_ancestors: int | None = None,
+        rng: random.Random | None = None,
+        exclude: set[bytes] | None = None,
+    ) -> list[Utxo]:
+        """Select UTXOs paying for `target` satoshis plus the fee for spending them.
+
+        Branch-and-bound looks for a selection whose excess is at most `cost_of_change`, so that the
+        transaction needs no change output. If there is none, the knapsack solver returns the selection
+        with the smallest excess it finds.
+
+        Args:
+            target (int): The amount to pay, including the fee for everything except the selected inputs.
+            fee_per_input (int): The fee for spending one UTXO.
+            cost_of_change (int): The cost of creating and later spending a change output.
+            max_ancestors (int | None): If set, only UTXOs with fewer unconfirmed ancestors are used.
+            rng (random.Random | None): Source of randomness for the knapsack solver.
+            exclude (set[bytes] | None): Keys (see `Outpoint.key`) of UTXOs not to use, e.g., leased by another process.
+        """
+        candidates = [
+            (utxo.amount - fee_per_input, utxo)
+            for utxo in reversed(list(self))
+            if utxo.amount > fee_per_input
+            and _spendable(utxo, max_ancestors)
+            and (exclude is None or utxo.key not in exclude)
+        ]
+        if sum(value for value, _ in candidates) < target:
+            raise InsufficientFundsError(
+                f"Not enough funds: {target} required, {self.total()} available"
+            )
+
+        selection = _branch_and_bound(candidates, target, cost_of_change)
+        if selection is None:
+            selection = _knapsack(
+                candidates,
+                target,
+                rng if rng is not None else random.Random(),
+            )
+        return selection
+
+
+def _spendable(utxo: Utxo, max_ancestors: int | None) -> bool:
+    return max_ancestors is None or len(utxo.ancestors) < max_ancestors
+
+
+def _branch_and_bound(
+    candidates: list[tuple[int, Utxo]], target: int, cost_of_change: int
+) -> list[Utxo] | None:
+    """Depth-first search for the selection with value in [target, target + cost_of_change] and least excess.
+
+    `candidates` are `(effective value, UTXO)` pairs in decreasing order of value.
+    """
+    values = [value for value, _ in candidates]
+    available = sum(values)
+    selected = []
+    value = 0
+    best = None
+    best_excess = None
+
+    index = 0
+    for _ in range(BNB_MAX_TRIES):
+        backtrack = False
+        if value + available < target or value > target + cost_of_change:
+            backtrack = True
+        elif value >= target:
+            if best_excess is None or value - target < best_excess:
+                best = list(selected)
+                best_excess = value - target
+                if best_excess == 0:
+                    break
+            backtrack = True
+
+        if backtrack:
+            if not selected:
+                break
+            # Put back the values skipped after the last selected candidate, then exclude it
+            index -= 1
+            while index > selected[-1]:
+                available += values[index]
+                index -= 1
+            value -= values[index]
+            selected.pop()
+        else:
+            available -= values[index]
+            # Excluding a candidate and including the next one with the same value gives the same selections
+            if (
+                not selected
+                or index - 1 == selected[-1]
+                or values[index] != values[index - 1]
+            ):
+                selected.append(index)
+                value += values[index]
+        index += 1
+
+    if best is None:
+        return None
+    return [candidates[i][1] for i in best]
+
+
+def _knapsack(
+    candidates: list[tuple[int, Utxo]], target: int, rng: random.Random
+) -> list[Utxo]:
+    """Approximate the selection with the smallest value of at least `target`.
+
+    `candidates` are `(effective value, UTXO)` pairs in decreasing order of value, whose sum is at least `target`.
+    """
+    smaller = [(value, utxo) for value, utxo in candidates if value < target]
+    larger = [(value, utxo) for value, utxo in candidates if value >= target]
+    # Smallest candidate covering the target on its own
+    lowest_larger = larger[-1] if larger else None
+    if lowest_larger is not None and lowest_larger[0] == target:
+        return [lowest_larger[1]]
+
+    total_smaller = sum(value for value, _ in smaller)
+    if total_smaller < target:
+        return [lowest_larger[1]]
+    if total_smaller == target:
+        return [utxo for _, utxo in smaller]
+
+    best = [True] * len(smaller)
+    best_value = total_smaller
+    for _ in range(KNAPSACK_ITERATIONS):
+        if best_value == target:
+            break
+        included = [False] * len(smaller)
+        value = 0
+        reached_target = False
+        for first_pass in (True, False):
+            if reached_target:
+                break
+            for i, (candidate_value, _) in enumerate(smaller):
+                # First pass: random subset, second pass: add everything else until the target is reached
+                if included[i] or (first_pass and not rng.getrandbits(1)):
+                    continue
+                value += candidate_value
+                included[i] = True
+                if value >= target:
+                    reached_target = True
+                    if value < best_value:
+                        best_value = value
+                        best = list(included)
+                    value -= candidate_value
+                    included[i] = False
+
+    if lowest_larger is not None and lowest_larger[0] <= best_value:
+        return [lowest_larger[1]]
+    return [utxo for (_, utxo), chosen in zip(smaller, best) if chosen]
@@ -0,0 +1,137 @@
+"""Persistent cache of the PoB verifying key processed for a given genesis."""
+
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable
+
+MAX_IN_MEMORY_ENTRIES = 16
+
+# Artefacts already loaded in this process, as `path -> (tag, value)`
+_LOADED_ARTEFACTS = {}
+
+
+def load_or_build_artefact(path: Path, tag: str, build: Callable[[], Any]) -> Any:
+    """Load the value pickled at `path` if it was built for `tag`, otherwise call `build()` and store the result.
+
+    Used for values derived once per key set and stored next to the keys.
+
+    Args:
+        path (Path): Where the value is stored.
+        tag (str): Identifies what the value was built from, e.g., the hash of the key.
+        build (Callable[[], Any]): Computes the value.
+    """
+    loaded_tag, value = _LOADED_ARTEFACTS.get(path, (None, None))
+    if loaded_tag == tag:
+        return value
+
+    try:
+        with open(path, "rb") as f:
+            stored_tag, value = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+        stored_tag = None
+
+    if stored_tag != tag:
+        value = build()
+        _store(path, (tag, value))
+
+    _LOADED_ARTEFACTS[path] = (tag, value)
+    return value
+
+
+def _store(path: Path, value: Any):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so that concurrent readers never see a partial entry
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f.name, path)
+
+
+class VkCache:
+    """Two-level cache (in-process LRU + on-disk pickles) of values derived from a verifying key.
+
+    Entries are keyed by the SHA-256 of the verifying key file and by the genesis txid, and stored on disk
+    under `cache_dir/<vk hash>/<genesis txid>.pkl`. Regenerating the keys changes the hash of the file,
+    which invalidates every entry: directories belonging to other hashes are removed the first time the
+    new key is seen.
+
+    Args:
+        vk_path (Path): The serialised verifying key, as written by zk_engine.
+        cache_dir (Path): The directory in which to store the cache.
+        max_entries (int): Maximum number of entries kept in memory.
+    """
+
+    def __init__(
+        self,
+        vk_path: Path,
+        cache_dir: Path,
+        max_entries: int = MAX_IN_MEMORY_ENTRIES,
+    ):
+        self.vk_path = Path(vk_path)
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._vk_hash = None
+        self._vk_stat = None
+        self._lock = threading.Lock()
+
+    def vk_hash(self) -> str:
+        """SHA-256 of the verifying key file, recomputed only when the file changes."""
+        stat = os.stat(self.vk_path)
+        stat_key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if stat_key != self._vk_stat:
+            with open(self.vk_path, "rb") as f:
+                vk_hash = hashlib.file_digest(f, "sha256").hexdigest()
+            if vk_hash != self._vk_hash:
+                self.__prune(vk_hash)
+            self._vk_hash = vk_hash
+            self._vk_stat = stat_key
+
+        return self._vk_hash
+
+    def get(self, genesis_txid: bytes, compute: Callable[[], Any]) -> Any:
+        """Return the entry for `genesis_txid`, calling `compute()` and storing the result on a miss."""
+        with self._lock:
+            key = (self.vk_hash(), genesis_txid)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        path = self.cache_dir / key[0] / f"{genesis_txid.hex()}.pkl"
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            value = compute()
+            _store(path, value)
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        """Drop every entry, both in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def __prune(self, vk_hash: str):
+        """Remove the entries computed for verifying keys other than `vk_hash`."""
+        self._entries = OrderedDict(
+            (key, value) for key, value in self._entries.items() if key[0] == vk_hash
+        )
+        if not self.cache_dir.is_dir():
+            return
+        for entry in self.cache_dir.iterdir():
+            if entry.is_dir() and entry.name != vk_hash:
+                shutil.rmtree(entry, ignore_errors=True)
+        return
@@ -1,142 +1,326 @@
 import sys
 import json
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable
 from pathlib import Path
-import subprocess
 import toml
 
 sys.path.append(str(Path(__file__).parent.parent.parent / "zkscript_package"))
 
 from bsv.utils import (
+    P2PKH_UNLOCKING_SCRIPT_SIZE,
+    TransactionBuilder,
+    broadcast_raw_tx,
+    broadcast_tx,
+    broadcast_txs,
     bytes_to_script,
-    prepend_signature,
-    tx_to_input,
+    p2pk_script,
+    raw_tx_id,
+    script_size,
     tx_from_id,
-    spend_p2pkh,
+    tx_in_size,
+    tx_out_size,
     p2pkh,
 )
-from bsv.zk_utils import load_and_process_vk, generate_pob_utxo
+from bsv.records import Outpoint
+from bsv.tokens import GENESIS, TokenRecord, TokenRegistry, tokens_from_lists
+from bsv.utxo_index import MAX_UNCONFIRMED_ANCESTORS, P2PKH, Utxo, UtxoIndex
+from bsv.prover_client import (
+    ProverClient,
+    POB_ENGINE,
+    PROVING_DATA,
+    PROOF_OF_BURN,
+    INPUT_PROOF_OF_BURN,
+    PREPARED_PROOF_OF_BURN,
+)
+from bsv.proof_scheduler import ProofScheduler
+from bsv.proof_store import ProofStore
+from bsv.journal import (
+    BROADCAST,
+    BURN,
+    PEGIN,
+    PEGIN_BATCH,
+    PROVEN,
+    SIGNED,
+    TRANSFER,
+    UNLOCKED,
+    JournalEntry,
+    OperationJournal,
+    abandoned,
+)
+from bsv.wallet_store import LeaseError, WalletStore
+from bsv.accounts import AccountRegistry, LazyColumn, UserColumns
+from bsv.zk_utils import (
+    load_and_process_vk,
+    load_pob_proof,
+    generate_pob_utxo,
+    prepare_pob_proof,
+)
 
-from elliptic_curves.instantiations.mnt4_753.mnt4_753 import MNT4_753, ProofMnt4753
 from src.zkscript.groth16.mnt4_753.mnt4_753 import mnt4_753
 from src.zkscript.script_types.unlocking_keys.reftx import RefTxUnlockingKey
-from tx_engine import Wallet, Script, Tx, TxOut
+from bitcoinrpc.authproxy import JSONRPCException
+from tx_engine import Script, Tx, TxOut
 from tx_engine.interface.blockchain_interface import BlockchainInterface
 from tx_engine.interface.interface_factory import WoCInterface, RPCInterface
 
-ScalarFieldMNT4 = MNT4_753.scalar_field
-
-
-SETUP_INDEX = -1  # Funding index for setup
-BURNING_FUNDING_INDEX = -2  # Funding index for burning is second to last
+FEE_RATE = 50  # Satoshis per kB
+# Number of funding UTXOs created by `setup` to pay for transfers
+SETUP_SPLITS = 10
+# A single funding UTXO paying the whole fee of a transfer or a burn is at most this many times the fee
+MAX_FEE_OVERPAYMENT = 10
 BALLPARK_TRANSACTION_SIZE = 300
 BALLPARK_TRANSACTION_FEE = BALLPARK_TRANSACTION_SIZE * 50 // 1000  # 50 satoshis per kB
 BALLPARK_BURNING_TX_SIZE = 300000
 BALLPARK_BURNING_TX_FEE = BALLPARK_BURNING_TX_SIZE * 50 // 1000  # 50 satoshis per kB
-TRANSFER_ZK_PROOF = "cargo run --release -- tcp-engine prove"
-BURNING_ZK_PROOF = "cargo run --release -- pob-engine prove"
+# Maximum size of a transaction created by `generate_pegouts`, the default `maxtxsizepolicy` of BSV nodes
+MAX_PEGOUT_TX_SIZE = 10000000
+
+# Per-user state of a WalletManager, beside the accounts
+USER_STATE_COLUMNS = ["tokens", "funding_utxos"]
+# Seconds after which the outpoints leased by a worker are available again, long enough for a burn
+LEASE_TIMEOUT = 1800
+# Number of coin selections tried when the selected UTXOs were leased or spent by another worker
+LEASE_RETRIES = 3
+# Error code of the node RPC for a transaction that is neither in the mempool nor in a block
+RPC_UNKNOWN_TX = -5
+
+
+def _operation(method):
+    """Run the `WalletManager` method `method` in a `WalletManager.operation`."""
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.operation():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class OperationState:
+    """The outpoints leased and created by a `WalletManager.operation`, possibly spanning several threads,
+    and the journal entries it finished."""
+
+    __slots__ = ("leases", "created", "touched", "kept", "finished")
+
+    def __init__(self):
+        self.leases = []
+        self.created = set()
+        # Other outpoints whose funding UTXO or token the operation changed
+        self.touched = set()
+        # Leases not released if the operation fails, as an unfinished journal entry needs them
+        self.kept = set()
+        self.finished = []
+
+    def outpoints(self) -> set[bytes]:
+        """The outpoints of the funding UTXOs and tokens changed by the operation, the only ones it saves."""
+        return set(self.leases) | self.created | self.touched
+
+
+class Transfer:
+    """A transfer of a token in progress, see `WalletManager.build_transfer`.
+
+    Args:
+        sender_index (int): The owner of the token.
+        receiver_index (int): The receiver of the token.
+        token (TokenRecord): The token.
+        funding (Utxo): The funding UTXO of receiver_index paying the fee.
+        spending_tx (Tx): The signed transaction transferring the token.
+        entry (JournalEntry): The journal entry of the transfer.
+    """
+
+    __slots__ = (
+        "sender_index",
+        "receiver_index",
+        "token",
+        "funding",
+        "spending_tx",
+        "entry",
+    )
 
-"""
-The structure of the WalletManager assumes that genesis & pegout are added in order. So, if genesis_1 and genesis_2 are created,
-then pegout_1 and pegout_2 must be added in this order. If not, the structure will be messed up.
-"""
-
-
-class Outpoint:
-    def __init__(self, prev_tx: str, prev_index: int):
-        self.prev_tx = prev_tx
-        self.prev_index = prev_index
-
-    @staticmethod
-    def from_hexstr(outpoint: str):
-        return Outpoint(
-            outpoint.split(":")[0],
-            int.from_bytes(bytes.fromhex(outpoint.split(":")[1]), "little"),
-        )
-
-    def to_hexstr(self) -> str:
-        return f"{self.prev_tx}:{self.prev_index.to_bytes(4, 'little').hex()}"
-
-    def __repr__(self):
-        return f"prev_tx: {self.prev_tx}, prev_index: {self.prev_index}"
-
-
-class BurntToken:
-    def __init__(self, genesis_txid: str, burning_txid: str):
-        self.genesis_txid = genesis_txid
-        self.burning_txid = burning_txid
-
-    def to_hexstr(self) -> str:
-        return f"{self.genesis_txid}:{self.burning_txid}"
-
-    @staticmethod
-    def from_hexstr(burnt_token: str):
-        elements = burnt_token.split(":")
-        return BurntToken(genesis_txid=elements[0], burning_txid=elements[1])
-
-    def __repr__(self):
-        return f"Genesis: {self.genesis_txid}, Burning tx: {self.burning_txid}"
+    def __init__(
+        self,
+        sender_index: int,
+        receiver_index: int,
+        token: TokenRecord,
+        funding: Utxo,
+        spending_tx: Tx,
+        entry: JournalEntry,
+    ):
+        self.sender_index = sender_index
+        self.receiver_index = receiver_index
+        self.token = token
+        self.funding = funding
+        self.spending_tx = spending_tx
+        self.entry = entry
 
 
 class WalletManager:
     def __init__(
         self,
-        names: list[str],
-        bsv_wallets: list[Wallet],
-        source_addresses: list[bytes],
-        genesis_utxos: list[list[Outpoint]],
-        token_utxos: list[list[Outpoint]],
-        pegout_utxos: list[list[Outpoint]],
-        zk_proof_paths: list[str],
-        funding_utxos: list[list[Outpoint]],
-        burnt_tokens: list[BurntToken],
+        accounts: AccountRegistry,
+        tokens: list[dict[Outpoint, TokenRecord]],
+        funding_utxos: list[UtxoIndex],
         network: BlockchainInterface,
+        prover: ProverClient | None = None,
+        scheduler: ProofScheduler | None = None,
+        proof_store: ProofStore | None = None,
     ):
-        self.names = names
-        self.bsv_wallets = bsv_wallets
-        self.source_addresses = source_addresses
-        self.genesis_utxos = genesis_utxos
-        self.token_utxos = token_utxos
-        self.pegout_utxos = pegout_utxos
-        self.zk_proof_paths = zk_proof_paths
+        self.accounts = accounts
+        self.names = accounts.names
+        self.bsv_wallets = accounts.wallets
+        self.source_addresses = accounts.source_addresses
+        self.tokens = TokenRegistry(tokens)
         self.funding_utxos = funding_utxos
-        self.burnt_tokens = burnt_tokens
+        # Guards `funding_utxos`, which a `FeePool` refills from a background thread
+        self.funding_lock = threading.RLock()
         self.network = network
+        self.prover = prover if prover is not None else ProverClient()
+        self.scheduler = (
+            scheduler if scheduler is not None else ProofScheduler(self.prover)
+        )
+        self.proof_store = proof_store if proof_store is not None else ProofStore()
+        # Set by `load_wallet` and `save_wallet`
+        self.store = None
+        # Identifies the leases of this process in the store shared with other workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_timeout = LEASE_TIMEOUT
+        # Outpoints leased by the operation in progress in each thread
+        self._operation = threading.local()
 
     def clear_wallet(self):
         return WalletManager(
-            names=self.names,
-            bsv_wallets=self.bsv_wallets,
-            source_addresses=self.source_addresses,
-            genesis_utxos=[[]] * len(self.bsv_wallets),
-            token_utxos=[[]] * len(self.bsv_wallets),
-            pegout_utxos=[[]] * len(self.bsv_wallets),
-            zk_proof_paths=[[]] * len(self.bsv_wallets),
-            funding_utxos=[[]] * len(self.bsv_wallets),
-            burnt_tokens=[[]] * len(self.bsv_wallets),
+            accounts=self.accounts,
+            tokens=[{} for _ in range(len(self.accounts))],
+            funding_utxos=[UtxoIndex() for _ in range(len(self.accounts))],
             network=self.network,
+            prover=self.prover,
+            scheduler=self.scheduler,
+            proof_store=self.proof_store,
         )
 
     @staticmethod
-    def load_wallet(wallet_path: str, network: WoCInterface | RPCInterface):
+    def load_wallet(
+        wallet_path: str, network: WoCInterface | RPCInterface, replace: bool = False
+    ):
         """
-        Load a wallet from a JSON file.
+        Load a wallet from its store, importing it from a JSON file if needed.
 
         [
             "name" : {
                 "bsv_wallet": [],
                 "source_address": [],
-                "genesis_utxos": [],
-                "token_utxos": [],
-                "pegout_utxos": [],
-                "zk_proof_paths": [],
+                "tokens": [],
                 "funding_utxos": [],
-                "burnt_tokens": [],
             }
         ]
 
+        Tokens are stored as `{"genesis", "tip", "pegout", "zk_proof_path", "state", "burning_txid"}`
+        (see `TokenRecord`). Wallets in the legacy format, with the lists `genesis_utxos`, `token_utxos`,
+        `pegout_utxos` and `zk_proof_paths` aligned by position and `burnt_tokens`, are converted when
+        they are loaded.
+
+        Funding UTXOs are stored as `{"outpoint", "amount", "script_type", "ancestors"}`. Entries given
+        as bare outpoints (`"txid:index"`) are looked up on the network once, when the wallet is loaded.
+
+        The wallet is kept in a SQLite store next to the JSON file (see `WalletStore.for_json`). The
+        JSON file is imported into the store the first time it is loaded and whenever it is modified,
+        otherwise it is not read, and the state of each user is only read from the store when it is
+        first accessed (see `from_store`).
+
+        `save_wallet` only writes to the store, so the JSON file falls behind it. A JSON file modified
+        after changes were saved to the store is not imported, as importing it would discard them: the
+        wallet is not loaded, unless `replace` is set. Use `export_wallet` to bring the JSON file up to
+        date with the store before editing it.
+
         Args:
             wallet_path (str): The path to the wallet configuration file.
+            replace (bool): Import a modified JSON file even if it discards the changes saved to the
+                store since the last import, e.g., when the wallet is set up again.
+        """
+        try:
+            if (
+                not Path(wallet_path).exists()
+                and not WalletStore.for_json_path(wallet_path).exists()
+            ):
+                raise FileNotFoundError(f"No wallet at {wallet_path}")
+            store = WalletStore.for_json(wallet_path)
+            if store.is_stale(wallet_path):
+                if store.changed_since_import() and not replace:
+                    raise ValueError(
+                        f"{wallet_path} was modified after changes were saved to {store.db_path}, "
+                        "export the wallet before editing it"
+                    )
+                with open(wallet_path, "r") as file:
+                    wallet_manager = WalletManager.from_dict(json.load(file), network)
+                store.import_data(wallet_manager.to_dict(), wallet_path)
+                wallet_manager.store = store
+            else:
+                wallet_manager = WalletManager.from_store(store, network)
+            return wallet_manager
+
+        except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
+            print(f"Error loading wallet data: {e}")
+            return None
+
+    @staticmethod
+    def from_dict(data: dict, network: WoCInterface | RPCInterface):
+        """Build a wallet manager from `data`, in the format described in `load_wallet`."""
+        accounts = AccountRegistry(
+            WalletManager.__network_str(network),
+            list(data.keys()),
+            [user["bsv_wallet"] for user in data.values()],
+            [bytes.fromhex(user["source_address"]) for user in data.values()],
+        )
+        states = [WalletManager.__user_state(user, network) for user in data.values()]
+        return WalletManager(
+            accounts,
+            *[[state[column] for state in states] for column in USER_STATE_COLUMNS],
+            network,
+        )
+
+    @staticmethod
+    def from_store(store: WalletStore, network: WoCInterface | RPCInterface):
+        """Build a wallet manager backed by `store`.
+
+        Only the names, keys and source addresses of the users are read. Private keys are decoded when
+        the wallet of a user is first used, and the state of a user (tokens and funding UTXOs) is read
+        from the store the first time any of it is accessed. Tokens held by users that are not loaded are
+        looked up in the store by `TokenRegistry.find`.
         """
+        names, private_keys, source_addresses = [], [], []
+        for name, private_key, source_address in store.load_accounts():
+            names.append(name)
+            private_keys.append(private_key)
+            source_addresses.append(bytes.fromhex(source_address))
+        accounts = AccountRegistry(
+            WalletManager.__network_str(network), names, private_keys, source_addresses
+        )
+        states = UserColumns(
+            len(names),
+            USER_STATE_COLUMNS,
+            lambda i: WalletManager.__user_state(store.load_user(names[i]), network),
+        )
+        wallet_manager = WalletManager(
+            accounts,
+            *[states.columns[column] for column in USER_STATE_COLUMNS],
+            network,
+        )
+        wallet_manager.store = store
+        wallet_manager.tokens.locate = lambda outpoint: (
+            accounts.index(owner)
+            if (owner := store.find_token(outpoint.key)) is not None
+            else None
+        )
+        return wallet_manager
+
+    @staticmethod
+    def __network_str(network: WoCInterface | RPCInterface) -> str:
         if isinstance(network, RPCInterface):
             network_str = "BSV_Testnet"
         else:
@@ -144,97 +328,347 @@ class WalletManager:
                 network_str = "BSV_Testnet"
             else:
                 network_str = "BSV_Mainnet"
-        try:
-            names = []
-            bsv_wallets = []
-            source_addresses = []
-            genesis_utxos = []
-            token_utxos = []
-            pegout_utxos = []
-            zk_proof_paths = []
-            funding_utxos = []
-            burnt_tokens = []
-            with open(wallet_path, "r") as file:
-                data = json.load(file)
-                for name in data.keys():
-                    names.append(name)
-                    bsv_wallets.append(
-                        Wallet.from_hexstr(network_str, data[name]["bsv_wallet"])
-                    )
-                    source_addresses.append(bytes.fromhex(data[name]["source_address"]))
-                    genesis_utxos_to_add = []
-                    token_utxos_to_add = []
-                    pegout_utxos_to_add = []
-                    zk_proof_paths_to_add = []
-                    funding_utxos_to_add = []
-                    burnt_tokens_to_add = []
-                    for outpoint in data[name]["genesis_utxos"]:
-                        genesis_utxos_to_add.append(Outpoint.from_hexstr(outpoint))
-                    for outpoint in data[name]["token_utxos"]:
-                        token_utxos_to_add.append(Outpoint.from_hexstr(outpoint))
-                    for outpoint in data[name]["pegout_utxos"]:
-                        pegout_utxos_to_add.append(Outpoint.from_hexstr(outpoint))
-                    for path in data[name]["zk_proof_paths"]:
-                        zk_proof_paths_to_add.append(path)
-                    for outpoint in data[name]["funding_utxos"]:
-                        funding_utxos_to_add.append(Outpoint.from_hexstr(outpoint))
-                    for outpoint in data[name]["burnt_tokens"]:
-                        burnt_tokens_to_add.append(BurntToken.from_hexstr(outpoint))
-                    genesis_utxos.append(genesis_utxos_to_add)
-                    token_utxos.append(token_utxos_to_add)
-                    pegout_utxos.append(pegout_utxos_to_add)
-                    zk_proof_paths.append(zk_proof_paths_to_add)
-                    funding_utxos.append(funding_utxos_to_add)
-                    burnt_tokens.append(burnt_tokens_to_add)
-            return WalletManager(
-                names,
-                bsv_wallets,
-                source_addresses,
-                genesis_utxos,
-                token_utxos,
-                pegout_utxos,
-                zk_proof_paths,
-                funding_utxos,
-                burnt_tokens,
-                network,
+        return network_str
+
+    @staticmethod
+    def __user_state(user: dict, network: WoCInterface | RPCInterface) -> dict:
+        """The state of a user, by column of `USER_STATE_COLUMNS`, from its entry in the wallet data."""
+        tokens = user["tokens"] if "tokens" in user else tokens_from_lists(user)
+        funding_utxos_to_add = []
+        for utxo in user["funding_utxos"]:
+            funding_utxos_to_add.append(
+                Utxo.from_dict(utxo)
+                if isinstance(utxo, dict)
+                else WalletManager.__utxo_from_outpoint(
+                    Outpoint.from_hexstr(utxo), network
+                )
             )
+        return {
+            "tokens": {
+                token.genesis: token
+                for token in (TokenRecord.from_dict(token) for token in tokens)
+            },
+            "funding_utxos": UtxoIndex(funding_utxos_to_add),
+        }
 
-        except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
-            print(f"Error loading wallet data: {e}")
-            return None
+    def user_index(self, name: str) -> int:
+        """The index of the user `name`. Raises `ValueError` if there is no such user."""
+        return self.accounts.index(name)
 
-    def save_wallet(self, wallet_path: str):
-        """
-        Save the wallet data to a JSON file.
+    def to_dict(self, loaded_only: bool = False) -> dict:
+        """The wallet data, in the format described in `load_wallet`.
 
         Args:
-            wallet_path (str): The path to save the wallet configuration file.
+            loaded_only (bool): Whether to skip the users whose state was not read from the store.
         """
         data = {}
         for i, name in enumerate(self.names):
-            bsv_priv_key_hex = self.bsv_wallets[i].to_hex()
+            if (
+                loaded_only
+                and isinstance(self.tokens.ledgers, LazyColumn)
+                and not self.tokens.ledgers.is_loaded(i)
+            ):
+                continue
+            bsv_priv_key_hex = self.accounts.private_keys[i]
             source_address_hex = self.source_addresses[i].hex()
-            genesis_utxos_hex = [utxo.to_hexstr() for utxo in self.genesis_utxos[i]]
-            token_utxos_hex = [utxo.to_hexstr() for utxo in self.token_utxos[i]]
-            pegout_utxos_hex = [utxo.to_hexstr() for utxo in self.pegout_utxos[i]]
-            zk_proof_path_str = [path for path in self.zk_proof_paths[i]]
-            funding_utxos_hex = [utxo.to_hexstr() for utxo in self.funding_utxos[i]]
-            burnt_tokens_hex = [utxo.to_hexstr() for utxo in self.burnt_tokens[i]]
+            tokens_dict = [token.to_dict() for token in self.tokens.ledgers[i].values()]
+            with self.funding_lock:
+                funding_utxos_dict = [utxo.to_dict() for utxo in self.funding_utxos[i]]
             data[name] = {}
             data[name]["bsv_wallet"] = bsv_priv_key_hex
             data[name]["source_address"] = source_address_hex
-            data[name]["genesis_utxos"] = genesis_utxos_hex
-            data[name]["token_utxos"] = token_utxos_hex
-            data[name]["pegout_utxos"] = pegout_utxos_hex
-            data[name]["zk_proof_paths"] = zk_proof_path_str
-            data[name]["funding_utxos"] = funding_utxos_hex
-            data[name]["burnt_tokens"] = burnt_tokens_hex
+            data[name]["tokens"] = tokens_dict
+            data[name]["funding_utxos"] = funding_utxos_dict
+
+        return data
+
+    def save_wallet(self, wallet_path: str):
+        """
+        Save the wallet data to the store of the JSON file at `wallet_path`.
+
+        Only the entries that changed since the wallet was loaded or last saved are written, in a single
+        transaction. Use `export_wallet` to write the JSON file itself (see `load_wallet`).
+
+        Args:
+            wallet_path (str): The path to the wallet configuration file.
+        """
+        if self.store is None or self.store.db_path != WalletStore.for_json_path(
+            wallet_path
+        ):
+            self.store = WalletStore.for_json(wallet_path)
+            # The JSON file, if any, is superseded by the store
+            self.store.import_data(self.to_dict(), wallet_path)
+        else:
+            self.store.save(self.to_dict(loaded_only=True))
 
+        return
+
+    @contextmanager
+    def operation(self, state: OperationState | None = None, end: bool = True):
+        """Scope of a change of the state of the wallet, e.g., a transfer.
+
+        When the wallet is backed by a store, several processes (workers) can drive it at once. The
+        funding UTXOs and token outputs spent in an operation are leased in the store, so that no other
+        worker spends them. If the operation succeeds, its changes are saved and the leases released in
+        one transaction, so that other workers see either all of its changes or none. If it raises, the
+        leases are released and nothing is saved. Operations nested in another one are part of it.
+
+        Only the funding UTXOs and tokens whose outpoints the operation leased, created or otherwise
+        changed are saved, so that the changes of other operations running at the same time, e.g., other
+        transfers of a `TransferPipeline`, are only saved when these operations end.
+
+        Outpoints created in the operation are not in the store until it is saved, so no other worker can
+        spend them, and they are not leased when the operation spends them.
+
+        An operation spanning several threads, e.g., a transfer in a `TransferPipeline`, passes the same
+        `state` to each of its parts, with `end=False` for all of them but the last. The scope of a part
+        that raises aborts the whole operation.
+
+        Args:
+            state (OperationState | None): The state of the operation this scope is part of. Defaults to a
+                new operation.
+            end (bool): Whether the operation ends, i.e., is saved, when this scope exits.
+        """
+        if getattr(self._operation, "state", None) is not None:
+            assert state is None or state is self._operation.state, (
+                "Operations of different states cannot be nested"
+            )
+            yield
+            return
+        self._operation.state = state if state is not None else OperationState()
+        leases = self._operation.state.leases
+        finished = self._operation.state.finished
+        try:
+            yield
+            if end:
+                if self.store is not None:
+                    self.store.save(
+                        self.to_dict(loaded_only=True),
+                        self.worker_id,
+                        leases,
+                        [
+                            entry.entry_id
+                            for entry in finished
+                            if entry.entry_id is not None
+                        ],
+                        outpoints=self._operation.state.outpoints(),
+                    )
+                for entry in finished:
+                    self.journal.remove_workspaces(entry)
+        except BaseException:
+            if self.store is not None and leases:
+                kept = self._operation.state.kept
+                self.store.release_leases(
+                    self.worker_id,
+                    [outpoint for outpoint in leases if outpoint not in kept],
+                )
+                leases.clear()
+            raise
+        finally:
+            self._operation.state = None
+
+    def reload_user(self, wallet_index: int):
+        """Read the state of wallet_index again from the store, e.g., after other workers changed it.
+
+        Changes made to wallet_index and not saved yet are lost, so it cannot be called in an operation.
+        """
+        assert getattr(self._operation, "state", None) is None, (
+            "Reloading a user would drop the changes of the running operation"
+        )
+        state = WalletManager.__user_state(
+            self.store.load_user(self.names[wallet_index]), self.network
+        )
+        self.tokens.reload(wallet_index, state["tokens"])
+        with self.funding_lock:
+            self.funding_utxos[wallet_index] = state["funding_utxos"]
+
+        return
+
+    def __lease(self, wallet_index: int, outpoints: list[bytes]):
+        """Lease the outpoints (see `Outpoint.key`) of wallet_index until the end of the current operation.
+
+        Raises `LeaseError` if another worker leased or spent any of them. The funding UTXOs spent by
+        another worker are dropped from the funding UTXOs of wallet_index, so that they are not selected
+        again, without touching the changes of the running operation.
+        """
+        state = getattr(self._operation, "state", None)
+        assert state is not None, "Outpoints can only be leased in an operation"
+        outpoints = [
+            outpoint for outpoint in outpoints if outpoint not in state.created
+        ]
+        if self.store is None or not outpoints:
+            return
+        if not self.store.acquire_leases(outpoints, self.worker_id, self.lease_timeout):
+            spent = self.store.spent_outpoints(outpoints)
+            with self.funding_lock:
+                funding = self.funding_utxos[wallet_index]
+                for outpoint in map(Outpoint.from_bytes, spent):
+                    if outpoint.key in funding:
+                        funding.remove(outpoint.prev_tx, outpoint.prev_index)
+            raise LeaseError(
+                f"Outpoints {[Outpoint.from_bytes(outpoint) for outpoint in outpoints]} of "
+                f"{self.names[wallet_index]} are leased or spent by another worker"
+            )
+        state.leases.extend(outpoints)
+
+        return
+
+    def __keep_leases(self):
+        """Keep the leases of the current operation if it fails, as an unfinished journal entry needs them.
+
+        The entry is finished by `resume_operations` once this worker is gone.
+        """
+        state = self._operation.state
+        state.kept.update(state.leases)
+        return
+
+    def __created(self, outpoints: list[Outpoint]):
+        """Record that the current operation created `outpoints`, if any."""
+        state = getattr(self._operation, "state", None)
+        if state is not None:
+            state.created.update(outpoint.key for outpoint in outpoints)
+        return
+
+    def __touch(self, outpoints: list[bytes]):
+        """Record that the current operation changed the funding UTXOs or tokens of `outpoints`, if any."""
+        state = getattr(self._operation, "state", None)
+        if state is not None:
+            state.touched.update(outpoints)
+        return
+
+    def __leased_elsewhere(self) -> set[bytes] | None:
+        """The outpoints leased by other workers, not to be selected."""
+        if self.store is None:
+            return None
+        return self.store.leased_outpoints(self.worker_id)
+
+    @property
+    def journal(self) -> OperationJournal:
+        """The write-ahead journal of the operations of this worker, kept in the store."""
+        return OperationJournal(self.store, self.worker_id, self.scheduler)
+
+    def __finish(self, entry: JournalEntry):
+        """Delete `entry` from the journal when the current operation is saved."""
+        self._operation.state.finished.append(entry)
+        return
+
+    def __is_known(self, txid: str) -> bool:
+        """Whether the network knows the transaction `txid`, e.g., broadcast before a crash.
+
+        Errors other than the transaction being unknown are raised, so that the operation is not dropped.
+        """
+        try:
+            return bool(self.network.get_raw_transaction(txid))
+        except JSONRPCException as e:
+            if e.code != RPC_UNKNOWN_TX:
+                raise
+            return False
+
+    def resume_operations(self) -> list[JournalEntry]:
+        """Finish the operations left in the journal by workers that are gone, e.g., that crashed.
+
+        An operation is resumed from the last stage it recorded, e.g., a transfer whose transaction was
+        broadcast only needs its proof, and a burn whose proof was generated only needs its unlocking
+        script. Operations whose transaction turns out to be rejected are dropped, as are the ones whose
+        user or token is no longer in the wallet. Each operation is resumed in its own `operation`, and
+        the first error is raised once all were tried.
+
+        Returns the entries of the operations finished.
+        """
+        resumed = []
+        errors = []
+        for entry in self.journal.unfinished():
+            if not abandoned(entry, self.lease_timeout):
+                continue
+            try:
+                if self.__orphaned(entry):
+                    if self.journal.claim(entry, []):
+                        self.journal.discard(entry)
+                    continue
+                with self.operation():
+                    if self.__resume(entry):
+                        resumed.append(entry)
+            except Exception as e:
+                errors.append(e)
+
+        if errors:
+            raise errors[0]
+
+        return resumed
+
+    def collect_proofs(self) -> list[str]:
+        """Remove the proofs not kept by the retention policy of the proof store. Returns their names.
+
+        The proofs of the tokens held and of the operations in the journal are always kept.
+        """
+        if self.store is not None:
+            pinned = self.store.held_proofs()
+        else:
+            pinned = {
+                token.zk_proof_path
+                for wallet_index in range(len(self.accounts))
+                for token in self.tokens.tokens(wallet_index)
+            }
+        pinned |= {
+            entry.data["proof_path"]
+            for entry in self.journal.unfinished()
+            if "proof_path" in entry.data
+        }
+
+        return self.proof_store.collect(pinned)
+
+    def __orphaned(self, entry: JournalEntry) -> bool:
+        """Whether the user or token of `entry` is no longer in the wallet, e.g., after a re-import."""
+        names = [
+            entry.data[key]
+            for key in ("user", "sender", "receiver")
+            if key in entry.data
+        ]
+        if any(name not in self.accounts for name in names):
+            return True
+        if "genesis" not in entry.data:
+            return False
+        found = self.tokens.find(Outpoint.from_hexstr(entry.data["genesis"]))
+        return found is None or found[0] != self.user_index(names[0])
+
+    def __resume(self, entry: JournalEntry) -> bool:
+        if entry.kind == PEGIN:
+            return self.__resume_pegin(entry)
+        if entry.kind == PEGIN_BATCH:
+            return self.__resume_pegin_batch(entry)
+        if entry.kind == TRANSFER:
+            return self.__resume_transfer(entry)
+        return self.__resume_burn(entry)
+
+    def __take_funding(self, wallet_index: int, utxo: Utxo):
+        """Remove `utxo` from the funding UTXOs of wallet_index if it is still there, e.g., after a crash."""
+        with self.funding_lock:
+            if utxo.key in self.funding_utxos[wallet_index]:
+                self.funding_utxos[wallet_index].remove(utxo.prev_tx, utxo.prev_index)
+        return
+
+    def export_wallet(self, wallet_path: str):
+        """
+        Save the wallet data to a JSON file.
+
+        The JSON file of the store is written from the store, after saving the wallet, and can then be
+        edited and loaded again (see `load_wallet`).
+
+        Args:
+            wallet_path (str): The path to save the wallet configuration file.
+        """
+        if self.store is not None and self.store.db_path == WalletStore.for_json_path(
+            wallet_path
+        ):
+            self.save_wallet(wallet_path)
+            self.store.export_json(wallet_path)
+            return
         with open(wallet_path, "w") as file:
-            json.dump(data, file, indent=4)
+            json.dump(self.to_dict(), file, indent=4)
 
         return
 
+    @_operation
     def get_funding(self, wallet_index: int):
         assert isinstance(self.network, RPCInterface), (
             "get_funding is supported only for regtest"
@@ -259,340 +693,925 @@ class WalletManager:
                 index = i
                 break
         assert index is not None
-        self.add_funding(wallet_index, Outpoint(funding_txid, index))
+        self.add_funding(
+            wallet_index,
+            Outpoint(funding_txid, index),
+            amount=funding_tx.tx_outs[index].amount,
+            confirmed=True,
+        )
 
         return
 
     def setup(self, wallet_index: int):
-        """Split funds for wallet_index into 10 smaller denominations.
+        """Split funds for wallet_index into smaller denominations.
 
-        To be called only at the beginning of the DEMO. It uses `SETUP_INDEX` to perform the setup."""
-        funding_tx = tx_from_id(
-            self.funding_utxos[wallet_index][SETUP_INDEX].prev_tx, self.network
+        Creates `SETUP_SPLITS` UTXOs to pay for transfers and one to pay for a burn, funded by coin selection.
+        """
+        self.split_funding(
+            wallet_index,
+            [BALLPARK_TRANSACTION_FEE] * SETUP_SPLITS + [BALLPARK_BURNING_TX_FEE],
         )
-        amount = funding_tx.tx_outs[
-            self.funding_utxos[wallet_index][SETUP_INDEX].prev_index
-        ].amount
-        split_amount = BALLPARK_TRANSACTION_FEE
-        remaning_amount = amount - split_amount * 10 - BALLPARK_BURNING_TX_FEE
 
-        outputs = [
-            p2pkh(self.bsv_wallets[wallet_index], split_amount) for _ in range(10)
-        ]
-        outputs.append(p2pkh(self.bsv_wallets[wallet_index], BALLPARK_BURNING_TX_FEE))
-        outputs.append(p2pkh(self.bsv_wallets[wallet_index], remaning_amount))
+        return
 
-        (spending_tx, response) = spend_p2pkh(
-            [funding_tx],
-            [self.funding_utxos[wallet_index][0].prev_index],
-            outputs,
-            11,
-            [self.bsv_wallets[wallet_index]],
-            50,
-            self.network,
+    @_operation
+    def split_funding(self, wallet_index: int, amounts: list[int]) -> str:
+        """Fan out funds of wallet_index into new funding UTXOs of the given `amounts`.
+
+        The funds may come from unconfirmed UTXOs, as long as the transaction stays within the mempool
+        ancestor limit. Returns the txid of the fan-out transaction.
+        """
+        outputs = [p2pkh(self.bsv_wallets[wallet_index], amount) for amount in amounts]
+        spending_tx = self.__spend_funding(
+            wallet_index, outputs, funded_outputs=len(outputs)
         )
 
-        assert response.status_code == 200, f"Error spending UTXO: {response.content}"
+        return spending_tx.id()
 
-        self.funding_utxos[wallet_index] = []
-        to_add = []
-        for i, _ in enumerate(spending_tx.tx_outs):
-            to_add.append(Outpoint(spending_tx.id(), i))
-        self.funding_utxos[wallet_index].extend(to_add)
+    @_operation
+    def refresh_confirmations(self, wallet_index: int) -> int:
+        """Drop the mined transactions from the unconfirmed ancestors of the funding UTXOs of wallet_index.
 
-        return
+        Returns the number of UTXOs that are still unconfirmed.
+        """
+        with self.funding_lock:
+            unconfirmed = [
+                utxo for utxo in self.funding_utxos[wallet_index] if not utxo.confirmed
+            ]
+            txids = set().union(*(utxo.ancestors for utxo in unconfirmed))
+        pending = self.__pending(txids)
+        with self.funding_lock:
+            for utxo in unconfirmed:
+                utxo.ancestors &= pending
+        self.__touch([utxo.key for utxo in unconfirmed])
+
+        return sum(not utxo.confirmed for utxo in unconfirmed)
+
+    def __pending(self, txids: set[str]) -> set[str]:
+        """The transactions among `txids` that are not mined yet, all of them if the network cannot tell."""
+        if not txids:
+            return set()
+        if isinstance(self.network, RPCInterface):
+            # The ancestor limit only counts the transactions in the mempool
+            try:
+                return txids & set(self.network.get_raw_mempool())
+            except JSONRPCException:
+                return txids
+        pending = set()
+        for txid in txids:
+            # `None` when the request failed
+            data = self.network.get_transaction(txid)
+            if data is None or data.get("confirmations", 0) == 0:
+                pending.add(txid)
+        return pending
+
+    @_operation
+    def generate_genesis_for_pegin(self, wallet_index: int) -> TokenRecord:
+        """Generate genesis for pegin, funded by coin selection. Returns the new token."""
+        genesis = p2pkh(self.bsv_wallets[wallet_index], 1)
 
-    def generate_genesis_for_pegin(self, wallet_index: int):
-        """Generate genesis for pegin.
+        entries = []
+
+        def begin_entry(spending_tx: Tx, spent: list[Utxo], created: list[Utxo]):
+            entries.append(
+                self.journal.begin(
+                    PEGIN,
+                    SIGNED,
+                    {
+                        "user": self.names[wallet_index],
+                        "tx": spending_tx.serialize().hex(),
+                        "spent": [utxo.to_dict() for utxo in spent],
+                        "created": [utxo.to_dict() for utxo in created],
+                    },
+                )
+            )
+            return
 
-        Uses last funding UTXO as that is the one with most funds by design."""
-        funding_tx = tx_from_id(
-            self.funding_utxos[wallet_index][-1].prev_tx, self.network
-        )
-        funding_index = self.funding_utxos[wallet_index][-1].prev_index
-        genesis = p2pkh(self.bsv_wallets[wallet_index], 1)
-        change = p2pkh(
-            self.bsv_wallets[wallet_index], funding_tx.tx_outs[funding_index].amount - 1
+        try:
+            spending_tx = self.__spend_funding(
+                wallet_index, [genesis], before_broadcast=begin_entry
+            )
+        except AssertionError:
+            # The transaction was rejected
+            for entry in entries:
+                self.journal.discard(entry)
+            raise
+        self.journal.record(entries[0], BROADCAST, {"txid": spending_tx.id()})
+
+        return self.__prove_genesis(wallet_index, entries[0])
+
+    def __prove_genesis(self, wallet_index: int, entry: JournalEntry) -> TokenRecord:
+        """Generate the proof of the broadcast genesis of `entry`, and add the new token."""
+        txid = entry.data["txid"]
+        if not entry.reached(PROVEN):
+            proof_name = self.proof_store.prove(
+                self.scheduler, WalletManager.__genesis_proof_data(txid)
+            )
+            self.journal.record(entry, PROVEN, {"proof_path": proof_name})
+
+        token = TokenRecord(Outpoint(txid, 0), entry.data["proof_path"])
+        self.tokens.add(wallet_index, token)
+        self.__created([token.genesis])
+        self.__finish(entry)
+
+        return token
+
+    def __resume_pegin(self, entry: JournalEntry) -> bool:
+        wallet_index = self.user_index(entry.data["user"])
+        spent = [Utxo.from_dict(utxo) for utxo in entry.data["spent"]]
+        created = [Utxo.from_dict(utxo) for utxo in entry.data["created"]]
+        if not self.journal.claim(entry, [utxo.key for utxo in spent]):
+            return False
+        if not entry.reached(BROADCAST):
+            spending_tx = Tx.parse_hexstr(entry.data["tx"])
+            response = broadcast_tx(spending_tx, self.network)
+            if response.status_code != 200 and not self.__is_known(spending_tx.id()):
+                self.journal.discard(entry)
+                return False
+            self.journal.record(entry, BROADCAST, {"txid": spending_tx.id()})
+
+        self.__lease(wallet_index, [utxo.key for utxo in spent])
+        with self.funding_lock:
+            for utxo in spent:
+                self.__take_funding(wallet_index, utxo)
+            for utxo in created:
+                if utxo.key not in self.funding_utxos[wallet_index]:
+                    self.funding_utxos[wallet_index].add(utxo)
+        self.__created([Outpoint(utxo.prev_tx, utxo.prev_index) for utxo in created])
+        self.__prove_genesis(wallet_index, entry)
+
+        return True
+
+    def generate_genesis_batch(
+        self, wallet_index: int, count: int
+    ) -> list[TokenRecord]:
+        """Generate `count` geneses for pegin at once. Returns the new tokens.
+
+        A fan-out transaction, funded by coin selection, creates one funding UTXO paying exactly for each
+        genesis transaction. The genesis transactions are broadcast back to back right after it, without
+        waiting for a block, and their proofs are generated in parallel by the scheduler.
+
+        The batch is journaled as a whole: if it fails after the fan-out transaction is broadcast, e.g.,
+        because a proof failed, nothing is saved and `resume_operations` finishes it. If a genesis
+        transaction is rejected, the tokens of the ones broadcast before it are saved and the error is
+        raised afterwards. The funding UTXOs of the genesis transactions that were not broadcast are kept
+        as funding UTXOs of wallet_index.
+        """
+        assert count > 0, "At least one genesis is required"
+        wallet = self.bsv_wallets[wallet_index]
+        builder = TransactionBuilder()
+        builder.add_output(p2pkh(wallet, 1))
+        genesis_fee = -(
+            -(builder.size() + tx_in_size(P2PKH_UNLOCKING_SCRIPT_SIZE))
+            * FEE_RATE
+            // 1024
         )
 
-        (spending_tx, response) = spend_p2pkh(
-            [funding_tx],
-            [funding_index],
-            [genesis, change],
-            1,
-            [self.bsv_wallets[wallet_index]],
-            50,
-            self.network,
+        entries = []
+
+        def begin_entry(fan_out: Tx, spent: list[Utxo], created: list[Utxo]):
+            genesis_txs = []
+            for utxo in created[:count]:
+                builder = TransactionBuilder()
+                self.__add_funding_input(builder, wallet_index, utxo)
+                builder.add_output(p2pkh(wallet, 1))
+                genesis_txs.append(builder.sign())
+            entries.append(
+                self.journal.begin(
+                    PEGIN_BATCH,
+                    SIGNED,
+                    {
+                        "user": self.names[wallet_index],
+                        "tx": fan_out.serialize().hex(),
+                        "spent": [utxo.to_dict() for utxo in spent],
+                        "created": [utxo.to_dict() for utxo in created],
+                        "geneses": [tx.serialize().hex() for tx in genesis_txs],
+                    },
+                )
+            )
+            return
+
+        with self.operation():
+            with self.funding_lock:
+                try:
+                    # The genesis transactions add one generation of unconfirmed transactions
+                    fan_out = self.__spend_funding(
+                        wallet_index,
+                        [p2pkh(wallet, 1 + genesis_fee) for _ in range(count)],
+                        funded_outputs=count,
+                        descendants=1,
+                        before_broadcast=begin_entry,
+                    )
+                except AssertionError:
+                    # The fan-out transaction was rejected
+                    for entry in entries:
+                        self.journal.discard(entry)
+                    raise
+                entry = entries[0]
+                genesis_txs = [
+                    Tx.parse_hexstr(genesis) for genesis in entry.data["geneses"]
+                ]
+                responses = broadcast_txs(genesis_txs, self.network)
+                rejected = None
+                if responses[-1].status_code != 200:
+                    rejected = responses.pop()
+                self.journal.record(
+                    entry,
+                    BROADCAST,
+                    {"txids": [tx.id() for tx in genesis_txs[: len(responses)]]},
+                )
+                for i in range(len(responses)):
+                    self.funding_utxos[wallet_index].remove(fan_out.id(), i)
+
+            tokens = self.__prove_geneses(wallet_index, entry)
+
+        if rejected is not None:
+            raise AssertionError(f"Error broadcasting genesis: {rejected.content}")
+
+        return tokens
+
+    def __prove_geneses(
+        self, wallet_index: int, entry: JournalEntry
+    ) -> list[TokenRecord]:
+        """Generate the proofs of the broadcast geneses of the batch `entry`, and add the new tokens."""
+        txids = entry.data["txids"]
+        proof_names = self.proof_store.prove_many(
+            self.scheduler,
+            [WalletManager.__genesis_proof_data(txid) for txid in txids],
         )
+        for proof_name in proof_names:
+            if isinstance(proof_name, Exception):
+                raise proof_name
+
+        tokens = []
+        for txid, proof_name in zip(txids, proof_names):
+            token = TokenRecord(Outpoint(txid, 0), proof_name)
+            self.tokens.add(wallet_index, token)
+            self.__created([token.genesis])
+            tokens.append(token)
+        self.__finish(entry)
+
+        return tokens
+
+    def __resume_pegin_batch(self, entry: JournalEntry) -> bool:
+        wallet_index = self.user_index(entry.data["user"])
+        spent = [Utxo.from_dict(utxo) for utxo in entry.data["spent"]]
+        created = [Utxo.from_dict(utxo) for utxo in entry.data["created"]]
+        if not self.journal.claim(entry, [utxo.key for utxo in spent]):
+            return False
+        if not entry.reached(BROADCAST):
+            fan_out = Tx.parse_hexstr(entry.data["tx"])
+            response = broadcast_tx(fan_out, self.network)
+            if response.status_code != 200 and not self.__is_known(fan_out.id()):
+                self.journal.discard(entry)
+                return False
+            txids = []
+            for genesis in entry.data["geneses"]:
+                genesis_tx = Tx.parse_hexstr(genesis)
+                response = broadcast_tx(genesis_tx, self.network)
+                if response.status_code != 200 and not self.__is_known(genesis_tx.id()):
+                    break
+                txids.append(genesis_tx.id())
+            self.journal.record(entry, BROADCAST, {"txids": txids})
+
+        self.__lease(wallet_index, [utxo.key for utxo in spent])
+        # The funding UTXOs of the broadcast geneses are spent by them
+        broadcast = len(entry.data["txids"])
+        with self.funding_lock:
+            funding = self.funding_utxos[wallet_index]
+            for utxo in spent + created[:broadcast]:
+                self.__take_funding(wallet_index, utxo)
+            for utxo in created[broadcast:]:
+                if utxo.key not in funding:
+                    funding.add(utxo)
+        self.__created([Outpoint(utxo.prev_tx, utxo.prev_index) for utxo in created])
+        self.__prove_geneses(wallet_index, entry)
+
+        return True
+
+    @_operation
+    def generate_pegout(
+        self, wallet_index: int, issuer_index: int, token: int | Outpoint
+    ) -> TokenRecord:
+        """Generate the pegout UTXO for the token owned by wallet_index, funded by issuer_index.
 
-        assert response.status_code == 200, f"Error spending UTXO: {response.content}"
+        Args:
+            wallet_index (int): The owner of the token.
+            issuer_index (int): The wallet paying for the pegout UTXO.
+            token (int | Outpoint): The token, see `token`.
+        """
+        token = self.token(wallet_index, token)
+        pegout = WalletManager.__pegout_output(token)
 
-        data = {
-            "proof_name": f"proof_{spending_tx.id()}",
-            "chain_parameters": {
-                "input_index": 1,
-                "output_index": 0,
-            },
-            "public_inputs": {
-                "outpoint_txid": spending_tx.id(),
-                "genesis_txid": spending_tx.id(),
-            },
-            "witness": {"tx": "", "prior_proof_path": ""},
-        }
-        # Write data
-        with open(
-            str(
-                Path(__file__).parent.parent.parent
-                / "zk_engine/data/tcp_engine/configs/prove.toml"
-            ),
-            "w",
-        ) as f:
-            toml.dump(data, f)
-            f.close()
-        # Generate proof
-        subprocess.run(
-            f"cd {Path(__file__).parent.parent.parent / 'zk_engine'} && {TRANSFER_ZK_PROOF}",
-            shell=True,
-            check=True,
-            text=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
+        spending_tx = self.__spend_funding(issuer_index, [pegout])
 
-        self.genesis_utxos[wallet_index].append(Outpoint(spending_tx.id(), 0))
-        self.zk_proof_paths[wallet_index].append(f"proof_{spending_tx.id()}")
-        self.token_utxos[wallet_index].append(Outpoint(spending_tx.id(), 0))
-        self.funding_utxos[wallet_index].pop(-1)
-        self.funding_utxos[wallet_index].append(Outpoint(spending_tx.id(), 1))
+        self.tokens.peg_in(token, Outpoint(spending_tx.id(), 0))
+        self.__created([token.pegout])
 
-        return
+        return token
 
-    def generate_pegout(self, wallet_index: int, issuer_index: int, token_index: int):
-        funding_tx = tx_from_id(
-            self.funding_utxos[issuer_index][-1].prev_tx, self.network
-        )
-        funding_index = self.funding_utxos[issuer_index][-1].prev_index
+    def generate_pegouts(
+        self,
+        issuer_index: int,
+        geneses: list[Outpoint],
+        max_tx_size: int = MAX_PEGOUT_TX_SIZE,
+    ) -> list[TokenRecord]:
+        """Generate the pegout UTXOs of many tokens at once, funded by issuer_index. Returns the tokens.
 
-        genesis_tx = tx_from_id(
-            self.genesis_utxos[wallet_index][token_index].prev_tx, self.network
-        )
+        The PoB outputs are packed, in order, into as few transactions as possible, each of about
+        `max_tx_size` bytes at most, so that the issuer pays for and broadcasts one transaction instead of
+        one per token. The verifying keys of all the tokens are processed before anything is spent.
 
-        vk, _, prepared_vk = load_and_process_vk(genesis_tx.hash())
-        pegout = generate_pob_utxo(vk, prepared_vk)
-        change = p2pkh(
-            self.bsv_wallets[issuer_index], funding_tx.tx_outs[funding_index].amount
+        The pegouts created before a transaction fails are saved, and the error is raised afterwards.
+
+        Args:
+            issuer_index (int): The wallet paying for the pegout UTXOs.
+            geneses (list[Outpoint]): The genesis outpoints of the tokens, possibly held by different users.
+            max_tx_size (int): The maximum size of a transaction, in bytes.
+        """
+        tokens = []
+        for genesis in geneses:
+            found = self.tokens.find(genesis)
+            assert found is not None, f"Unknown token {genesis}"
+            token = found[1]
+            assert token.state == GENESIS, f"Token {genesis} already has a pegout"
+            tokens.append(token)
+
+        # Batches of (token, PoB output), leaving room for the inputs and the change in each transaction
+        batches = []
+        size = max_tx_size
+        for token in tokens:
+            pegout = WalletManager.__pegout_output(token)
+            pegout_size = tx_out_size(script_size(pegout.script_pubkey))
+            if size + pegout_size > max_tx_size:
+                batches.append([])
+                size = BALLPARK_TRANSACTION_SIZE
+            batches[-1].append((token, pegout))
+            size += pegout_size
+
+        error = None
+        with self.operation():
+            for batch in batches:
+                try:
+                    spending_tx = self.__spend_funding(
+                        issuer_index, [pegout for _, pegout in batch]
+                    )
+                except Exception as e:
+                    error = e
+                    break
+                for i, (token, _) in enumerate(batch):
+                    self.tokens.peg_in(token, Outpoint(spending_tx.id(), i))
+                    self.__created([token.pegout])
+
+        if error is not None:
+            raise error
+
+        return tokens
+
+    @staticmethod
+    def __pegout_output(token: TokenRecord) -> TxOut:
+        """The PoB output locking the pegout UTXO of `token`."""
+        # The hash of the genesis transaction is its txid in internal byte order, no need to fetch it
+        vk, _, prepared_vk = load_and_process_vk(
+            bytes.fromhex(token.genesis.prev_tx)[::-1]
         )
+        return generate_pob_utxo(vk, prepared_vk)
+
+    @_operation
+    def add_pegout(self, wallet_index: int, pegout: Outpoint, token: int | Outpoint):
+        """Attach the existing pegout UTXO `pegout` to the token owned by wallet_index."""
+        token = self.token(wallet_index, token)
+        self.tokens.peg_in(token, pegout)
+        self.__touch([token.genesis.key, pegout.key])
+
+        return
 
-        (spending_tx, response) = spend_p2pkh(
-            [funding_tx],
-            [funding_index],
-            [pegout, change],
-            1,
-            [self.bsv_wallets[issuer_index]],
-            50,
-            self.network,
+    def token(self, wallet_index: int, token: int | Outpoint) -> TokenRecord:
+        """The token held by wallet_index, given by its position or by an outpoint.
+
+        Args:
+            wallet_index (int): The owner of the token.
+            token (int | Outpoint): Either the position of the token in the tokens held by wallet_index,
+                in the order they were received, or its genesis, tip or pegout outpoint.
+        """
+        if isinstance(token, int):
+            return self.tokens.tokens(wallet_index)[token]
+        found = self.tokens.find(token)
+        assert found is not None, f"Unknown token {token}"
+        owner, record = found
+        assert owner == wallet_index, (
+            f"Token {record.genesis} is held by {self.names[owner]}, not {self.names[wallet_index]}"
         )
+        return record
+
+    def burnt_token(self, wallet_index: int, token: int | Outpoint) -> TokenRecord:
+        """The token burnt by wallet_index, given by its position in the order of the burns or by an outpoint."""
+        if isinstance(token, int):
+            return self.tokens.burnt(wallet_index)[token]
+        found = self.tokens.find(token)
+        assert found is not None and found[0] == wallet_index, (
+            f"Unknown token {token} for {self.names[wallet_index]}"
+        )
+        return found[1]
 
-        assert response.status_code == 200, f"Error spending UTXO: {response.content}"
+    @_operation
+    def peg_out(self, wallet_index: int, token: int | Outpoint) -> TokenRecord:
+        """Record that the token burnt by wallet_index was redeemed on the source chain."""
+        token = self.burnt_token(wallet_index, token)
+        self.tokens.peg_out(token)
+        self.__touch([token.genesis.key])
 
-        self.pegout_utxos[wallet_index].append(Outpoint(spending_tx.id(), 0))
-        self.funding_utxos[issuer_index].pop(-1)
-        self.funding_utxos[issuer_index].append(Outpoint(spending_tx.id(), 1))
+        return token
 
+    @_operation
+    def add_funding(
+        self,
+        wallet_index: int,
+        funding: Outpoint,
+        amount: int | None = None,
+        confirmed: bool = False,
+    ):
+        """Add a P2PKH funding UTXO. If `amount` is not given, it is looked up on the network."""
+        utxo = (
+            Utxo(
+                funding.prev_tx,
+                funding.prev_index,
+                amount,
+                P2PKH,
+                set() if confirmed else None,
+            )
+            if amount is not None
+            else WalletManager.__utxo_from_outpoint(funding, self.network)
+        )
+        with self.funding_lock:
+            self.funding_utxos[wallet_index].add(utxo)
+        self.__created([funding])
         return
 
-    def add_pegout(self, wallet_index: int, pegout: Outpoint):
-        self.pegout_utxos[wallet_index].append(pegout)
+    @staticmethod
+    def __utxo_from_outpoint(outpoint: Outpoint, network: BlockchainInterface) -> Utxo:
+        """The P2PKH funding UTXO at `outpoint`, with the amount looked up on the network."""
+        output = tx_from_id(outpoint.prev_tx, network).tx_outs[outpoint.prev_index]
+        return Utxo(outpoint.prev_tx, outpoint.prev_index, output.amount, P2PKH)
 
+    def __add_funding_input(
+        self, builder: TransactionBuilder, wallet_index: int, utxo: Utxo
+    ):
+        """Add an input spending the funding `utxo` of wallet_index, without fetching its transaction."""
+        wallet = self.bsv_wallets[wallet_index]
+        if utxo.script_type == P2PKH:
+            locking_script = wallet.get_locking_script()
+            unlocking_script = bytes_to_script(
+                bytes.fromhex(wallet.get_public_key_as_hexstr())
+            )
+        else:
+            locking_script = p2pk_script(wallet)
+            unlocking_script = None
+        builder.add_outpoint(
+            utxo.prev_tx,
+            utxo.prev_index,
+            TxOut(amount=utxo.amount, script_pubkey=locking_script),
+            wallet,
+            unlocking_script,
+        )
         return
 
-    def add_funding(self, wallet_index: int, funding: Outpoint):
-        self.funding_utxos[wallet_index].append(funding)
+    @contextmanager
+    def __single_funding(self, wallet_index: int, fee: int):
+        """Take the funding UTXO paying the whole `fee` of a transaction whose shape is fixed by the circuits.
+
+        The UTXO is removed from the funding UTXOs of wallet_index while the transaction is built, so that
+        it is not spent by a concurrent refill, and given back if the block raises. It is also leased, so
+        that it is not spent by another worker.
+        """
+        utxo = self.__take_single_funding(wallet_index, fee)
+        try:
+            yield utxo
+        except BaseException:
+            self.__give_back_funding(wallet_index, utxo)
+            raise
+
+    def __take_single_funding(self, wallet_index: int, fee: int) -> Utxo:
+        """Lease and remove the funding UTXO of wallet_index paying the whole `fee`, see `__single_funding`."""
+        with self.funding_lock:
+            for attempt in range(LEASE_RETRIES):
+                utxo = self.funding_utxos[wallet_index].select_single(
+                    fee,
+                    max_amount=fee * MAX_FEE_OVERPAYMENT,
+                    max_ancestors=MAX_UNCONFIRMED_ANCESTORS,
+                    exclude=self.__leased_elsewhere(),
+                )
+                try:
+                    self.__lease(wallet_index, [utxo.key])
+                    break
+                except LeaseError:
+                    if attempt == LEASE_RETRIES - 1:
+                        raise
+            self.funding_utxos[wallet_index].remove(utxo.prev_tx, utxo.prev_index)
+        return utxo
+
+    def __give_back_funding(self, wallet_index: int, utxo: Utxo):
+        """Give back the funding UTXO taken by `__take_single_funding` for a transaction that was not broadcast."""
+        with self.funding_lock:
+            self.funding_utxos[wallet_index].add(utxo)
         return
 
-    def __generate_transfer_zk_proof(
-        self, spending_tx: Tx, wallet_index: int, token_index: int
-    ):
+    def __spend_funding(
+        self,
+        wallet_index: int,
+        outputs: list[TxOut],
+        funded_outputs: int = 0,
+        descendants: int = 0,
+        before_broadcast: Callable[[Tx, list[Utxo], list[Utxo]], None] | None = None,
+    ) -> Tx:
+        """Pay for `outputs` with funding UTXOs of wallet_index picked by coin selection, and broadcast the transaction.
+
+        The change, if worth creating, goes back to wallet_index. The spent UTXOs are removed from the
+        funding UTXOs of wallet_index, and the change is added to them. The selected UTXOs are leased, and
+        selected again if another worker leased or spent them in the meantime.
+
+        Args:
+            wallet_index (int): The wallet paying for the outputs.
+            outputs (list[TxOut]): The outputs to pay for. They come first in the transaction.
+            funded_outputs (int): How many of the first `outputs` are added to the funding UTXOs of wallet_index.
+            descendants (int): Number of unconfirmed transactions that will be chained after this one
+                before a block is mined, which must stay within `MAX_UNCONFIRMED_ANCESTORS` too.
+            before_broadcast (Callable[[Tx, list[Utxo], list[Utxo]], None] | None): Called with the signed
+                transaction, the funding UTXOs it spends and the ones it creates, before it is broadcast.
+        """
+        max_ancestors = MAX_UNCONFIRMED_ANCESTORS - descendants
+        builder = TransactionBuilder()
+        for output in outputs:
+            builder.add_output(output)
+
+        # Fees are rounded up, so that the selected UTXOs always cover the fee deducted by `pay_fee`
+        input_fee = -(-tx_in_size(P2PKH_UNLOCKING_SCRIPT_SIZE) * FEE_RATE // 1024)
+        change_fee = -(
+            -tx_out_size(
+                script_size(self.bsv_wallets[wallet_index].get_locking_script())
+            )
+            * FEE_RATE
+            // 1024
+        )
+        target = sum(output.amount for output in outputs) + -(
+            -builder.size() * FEE_RATE // 1024
+        )
+
+        with self.funding_lock:
+            for attempt in range(LEASE_RETRIES):
+                funding = self.funding_utxos[wallet_index]
+                exclude = self.__leased_elsewhere()
+                selected = funding.select(
+                    target,
+                    fee_per_input=input_fee,
+                    cost_of_change=change_fee + input_fee,
+                    max_ancestors=max_ancestors,
+                    exclude=exclude,
+                )
+                ancestors = set().union(*(utxo.ancestors for utxo in selected))
+                if len(ancestors) + 1 > max_ancestors:
+                    # Some ancestors may have been mined since the UTXOs were created
+                    self.refresh_confirmations(wallet_index)
+                    selected = funding.select(
+                        target,
+                        fee_per_input=input_fee,
+                        cost_of_change=change_fee + input_fee,
+                        max_ancestors=max_ancestors,
+                        exclude=exclude,
+                    )
+                    ancestors = set().union(*(utxo.ancestors for utxo in selected))
+                if len(ancestors) + 1 > max_ancestors:
+                    selected = funding.select(
+                        target,
+                        fee_per_input=input_fee,
+                        cost_of_change=change_fee + input_fee,
+                        max_ancestors=1,
+                        exclude=exclude,
+                    )
+                    ancestors = set()
+                try:
+                    self.__lease(wallet_index, [utxo.key for utxo in selected])
+                    break
+                except LeaseError:
+                    if attempt == LEASE_RETRIES - 1:
+                        raise
+            for utxo in selected:
+                self.__add_funding_input(builder, wallet_index, utxo)
+
+            new_funding = list(range(funded_outputs))
+            excess = sum(utxo.amount - input_fee for utxo in selected) - target
+            if excess > change_fee + input_fee:
+                change_index = builder.add_output(
+                    p2pkh(
+                        self.bsv_wallets[wallet_index],
+                        sum(utxo.amount for utxo in selected)
+                        - sum(output.amount for output in outputs),
+                    )
+                )
+                builder.pay_fee(change_index, FEE_RATE)
+                new_funding.append(change_index)
+
+            spending_tx = builder.sign()
+            created = [
+                Utxo(
+                    spending_tx.id(),
+                    i,
+                    builder.outputs[i].amount,
+                    P2PKH,
+                    ancestors | {spending_tx.id()},
+                )
+                for i in new_funding
+            ]
+            if before_broadcast is not None:
+                before_broadcast(spending_tx, selected, created)
+            response = broadcast_tx(spending_tx, self.network)
+            assert response.status_code == 200, (
+                f"Error spending UTXO: {response.content}"
+            )
+
+            for utxo in selected:
+                funding.remove(utxo.prev_tx, utxo.prev_index)
+            for utxo in created:
+                funding.add(utxo)
+            self.__created([Outpoint(spending_tx.id(), i) for i in new_funding])
+
+        return spending_tx
+
+    @staticmethod
+    def __genesis_proof_data(genesis_txid: str) -> dict:
+        """The proving data of the proof of the genesis `genesis_txid`, named by the proof store."""
+        return {
+            "chain_parameters": {
+                "input_index": 1,
+                "output_index": 0,
+            },
+            "public_inputs": {
+                "outpoint_txid": genesis_txid,
+                "genesis_txid": genesis_txid,
+            },
+            "witness": {"tx": "", "prior_proof_path": ""},
+        }
+
+    def __generate_transfer_zk_proof(self, spending_tx: Tx, token: TokenRecord) -> str:
+        """Generate the proof of `token` after `spending_tx`, extending its current proof. Returns its name."""
         data = {
-            "proof_name": self.zk_proof_paths[wallet_index][token_index],
             "chain_parameters": {
                 "input_index": 1,
                 "output_index": 0,
             },
             "public_inputs": {
                 "outpoint_txid": spending_tx.id(),
-                "genesis_txid": self.genesis_utxos[wallet_index][token_index].prev_tx,
+                "genesis_txid": token.genesis.prev_tx,
             },
             "witness": {
                 "tx": spending_tx.serialize().hex(),
-                "prior_proof_path": self.zk_proof_paths[wallet_index][token_index],
+                "prior_proof_path": token.zk_proof_path,
             },
         }
-        # Write data
-        with open(
-            str(
-                Path(__file__).parent.parent.parent
-                / "zk_engine/data/tcp_engine/configs/prove.toml"
-            ),
-            "w",
-        ) as f:
-            toml.dump(data, f)
-            f.close()
-        # Generate proof
-        subprocess.run(
-            f"cd {Path(__file__).parent.parent.parent / 'zk_engine'} && {TRANSFER_ZK_PROOF}",
-            shell=True,
-            check=True,
-            text=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
 
-        return
+        return self.proof_store.prove(self.scheduler, data)
 
     def __generate_burning_zk_proof(
-        self, wallet_index: int, spending_tx: Tx, token_index: int
+        self, spending_tx: Tx, token: TokenRecord, workspace: Path
     ):
+        """Generate the proof of burn for `spending_tx`, saving it and its public input in `workspace`."""
         data = {
-            "genesis_txid": self.genesis_utxos[wallet_index][token_index].prev_tx,
+            "genesis_txid": token.genesis.prev_tx,
             "spending_tx": spending_tx.serialize().hex(),
-            "tcp_proof_name": self.zk_proof_paths[wallet_index][token_index],
+            "tcp_proof_name": token.zk_proof_path,
             "prev_amount": 1,
         }
         # Write data
-        with open(
-            str(
-                Path(__file__).parent.parent.parent
-                / "zk_engine/data/pob_engine/configs/prove.toml"
-            ),
-            "w",
-        ) as f:
+        with open(workspace / PROVING_DATA, "w") as f:
             toml.dump(data, f)
-            f.close()
         # Generate proof
-        subprocess.run(
-            f"cd {Path(__file__).parent.parent.parent / 'zk_engine'} && {BURNING_ZK_PROOF}",
-            shell=True,
-            check=True,
-            text=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+        self.scheduler.prove(
+            POB_ENGINE,
+            config=workspace / PROVING_DATA,
+            proof=workspace / PROOF_OF_BURN,
+            public_input=workspace / INPUT_PROOF_OF_BURN,
+            prepared=workspace / PREPARED_PROOF_OF_BURN,
         )
 
         return
 
+    @_operation
     def transfer_token(
-        self, sender_index: int, receiver_index: int, token_index: int = 0
-    ):
-        """Transfer the token from sender_index to receiver_index."""
-        token_tx = tx_from_id(
-            self.token_utxos[sender_index][token_index].prev_tx, self.network
-        )
-        token_tx_index = self.token_utxos[sender_index][token_index].prev_index
-        funding_tx = tx_from_id(
-            self.funding_utxos[receiver_index][0].prev_tx, self.network
-        )
-        funding_tx_index = self.funding_utxos[receiver_index][0].prev_index
+        self, sender_index: int, receiver_index: int, token: int | Outpoint = 0
+    ) -> TokenRecord:
+        """Transfer the token from sender_index to receiver_index.
 
-        token_output = p2pkh(self.bsv_wallets[receiver_index], 1)
+        Args:
+            sender_index (int): The owner of the token.
+            receiver_index (int): The receiver of the token.
+            token (int | Outpoint): The token, see `token`.
+        """
+        transfer = self.build_transfer(sender_index, receiver_index, token)
+        self.broadcast_transfer(transfer)
+        self.prove_transfer(transfer)
+        self.commit_transfer(transfer)
+
+        return transfer.token
+
+    def build_transfer(
+        self, sender_index: int, receiver_index: int, token: int | Outpoint
+    ) -> Transfer:
+        """Lease the token and a funding UTXO, and sign the transaction transferring the token.
+
+        This is the first step of `transfer_token`, followed by `broadcast_transfer`, `prove_transfer`
+        and `commit_transfer`. The steps must run in the same operation, which may span several threads.
+        """
+        token = self.token(sender_index, token)
+        self.__lease(sender_index, [token.tip.key])
+        token_tx = tx_from_id(token.tip.prev_tx, self.network)
+        token_tx_index = token.tip.prev_index
+        # The transfer circuit fixes the shape of the transaction: one funding input paying the whole fee, no change
+        with self.__single_funding(receiver_index, BALLPARK_TRANSACTION_FEE) as funding:
+            token_output = p2pkh(self.bsv_wallets[receiver_index], 1)
+
+            builder = TransactionBuilder()
+            self.__add_funding_input(builder, receiver_index, funding)
+            builder.add_input(
+                token_tx,
+                token_tx_index,
+                self.bsv_wallets[sender_index],
+                bytes_to_script(
+                    bytes.fromhex(
+                        self.bsv_wallets[sender_index].get_public_key_as_hexstr()
+                    )
+                ),
+            )
+            builder.add_output(token_output)
+            spending_tx = builder.sign()
+
+            entry = self.journal.begin(
+                TRANSFER,
+                SIGNED,
+                {
+                    "sender": self.names[sender_index],
+                    "receiver": self.names[receiver_index],
+                    "genesis": token.genesis.to_hexstr(),
+                    "funding": funding.to_dict(),
+                    "tx": spending_tx.serialize().hex(),
+                },
+            )
 
-        (spending_tx, response) = spend_p2pkh(
-            [funding_tx, token_tx],
-            [funding_tx_index, token_tx_index],
-            [token_output],
-            0,  # dummy
-            [self.bsv_wallets[receiver_index], self.bsv_wallets[sender_index]],
-            0,
-            self.network,
+        return Transfer(
+            sender_index, receiver_index, token, funding, spending_tx, entry
         )
 
-        assert response.status_code == 200, f"Error spending UTXO: {response.content}"
+    def broadcast_transfer(self, transfer: Transfer):
+        """Broadcast the transaction of `transfer`. If it is rejected, its funding UTXO is given back."""
+        response = broadcast_tx(transfer.spending_tx, self.network)
+        # Already known if broadcast before a crash
+        accepted = response.status_code == 200 or self.__is_known(
+            transfer.spending_tx.id()
+        )
+        if not accepted:
+            self.__give_back_funding(transfer.receiver_index, transfer.funding)
+            self.journal.discard(transfer.entry)
 
-        self.__generate_transfer_zk_proof(spending_tx, sender_index, token_index)
+        assert accepted, f"Error spending UTXO: {response.content}"
 
-        self.token_utxos[sender_index].pop(token_index)
-        self.funding_utxos[receiver_index].pop(0)
+        self.journal.record(
+            transfer.entry, BROADCAST, {"txid": transfer.spending_tx.id()}
+        )
 
-        genesis_utxo = self.genesis_utxos[sender_index].pop(token_index)
-        pegout_utxo = self.pegout_utxos[sender_index].pop(token_index)
-        zk_proof_path = self.zk_proof_paths[sender_index].pop(token_index)
+        return
 
-        self.genesis_utxos[receiver_index].append(genesis_utxo)
-        self.pegout_utxos[receiver_index].append(pegout_utxo)
-        self.token_utxos[receiver_index].append(Outpoint(spending_tx.id(), 0))
-        self.zk_proof_paths[receiver_index].append(zk_proof_path)
+    def prove_transfer(self, transfer: Transfer):
+        """Generate the proof of the token after `transfer`, which only needs the transaction."""
+        proof_name = self.__generate_transfer_zk_proof(
+            transfer.spending_tx, transfer.token
+        )
+        self.journal.record(transfer.entry, PROVEN, {"proof_path": proof_name})
 
         return
 
-    def __generate_pegout_unlocking_script(self, wallet_index: int, token_index: int):
-        with open(
-            str(
-                Path(__file__).parent.parent.parent
-                / "zk_engine/data/pob_engine/proofs/proof_of_burn.bin"
-            ),
-            "rb",
-        ) as f:
-            proof_bytes = list(f.read())
-            proof = ProofMnt4753.deserialise(proof_bytes[8:])
-        with open(
-            str(
-                Path(__file__).parent.parent.parent
-                / "zk_engine/data/pob_engine/proofs/input_proof_of_burn.bin"
-            ),
-            "rb",
-        ) as f:
-            processed_input_bytes = list(f.read())
-            # Bit length of a single input
-            length = (MNT4_753.scalar_field.get_modulus().bit_length() + 8) // 8
-            # Fetch the second input (the first one is the genesis_txid, which we hard-coded)
-            # Bytes are:
-            #   [total length of bytestring] [2 as u64] [genesis_txid as element in MNT4_753.scalar_field] [integrity tag = sighash]
-            input = [
-                ScalarFieldMNT4.deserialise(
-                    processed_input_bytes[16 + length :]
-                ).to_int()
-            ]
+    def commit_transfer(self, transfer: Transfer):
+        """Record that the receiver of `transfer` holds the token."""
+        self.tokens.transfer(
+            transfer.token,
+            transfer.receiver_index,
+            Outpoint(transfer.spending_tx.id(), 0),
+            transfer.entry.data["proof_path"],
+        )
+        self.__created([transfer.token.tip])
+        self.__finish(transfer.entry)
 
-        genesis_tx = tx_from_id(
-            self.genesis_utxos[wallet_index][token_index].prev_tx, self.network
+        return
+
+    def __resume_transfer(self, entry: JournalEntry) -> bool:
+        sender_index = self.user_index(entry.data["sender"])
+        receiver_index = self.user_index(entry.data["receiver"])
+        funding = Utxo.from_dict(entry.data["funding"])
+        token = self.token(sender_index, Outpoint.from_hexstr(entry.data["genesis"]))
+        outpoints = [token.tip.key, funding.key]
+        if not self.journal.claim(entry, outpoints):
+            return False
+        self.__lease(sender_index, outpoints[:1])
+        self.__lease(receiver_index, outpoints[1:])
+        self.__take_funding(receiver_index, funding)
+
+        transfer = Transfer(
+            sender_index,
+            receiver_index,
+            token,
+            funding,
+            Tx.parse_hexstr(entry.data["tx"]),
+            entry,
+        )
+        if not entry.reached(BROADCAST):
+            try:
+                self.broadcast_transfer(transfer)
+            except AssertionError:
+                return False
+        if not entry.reached(PROVEN):
+            self.prove_transfer(transfer)
+        self.commit_transfer(transfer)
+
+        return True
+
+    def __generate_pegout_unlocking_script(self, token: TokenRecord, workspace: Path):
+        proof, input = load_pob_proof(
+            workspace / PROOF_OF_BURN, workspace / INPUT_PROOF_OF_BURN
         )
+
+        genesis_tx = tx_from_id(token.genesis.prev_tx, self.network)
         _, cache_vk, _ = load_and_process_vk(genesis_tx.hash())
 
-        # Prepare the proof
-        prepared_proof = proof.prepare_for_zkscript(cache_vk, input)
+        # Prepare the proof, reusing the inverse Miller loop output computed by zk_engine
+        a, b, c, inverse_miller_output = prepare_pob_proof(
+            proof, input, cache_vk, workspace / PREPARED_PROOF_OF_BURN
+        )
 
         # Generate unlocking script
         unlock_key = RefTxUnlockingKey.from_data(
             groth16_model=mnt4_753,
             pub=input,
-            A=prepared_proof.a,
-            B=prepared_proof.b,
-            C=prepared_proof.c,
+            A=a,
+            B=b,
+            C=c,
             max_multipliers=None,
-            inverse_miller_output=prepared_proof.inverse_miller_loop,
+            inverse_miller_output=inverse_miller_output,
             use_proj_coordinates=True,
         )
 
         return unlock_key.to_unlocking_script(mnt4_753)
 
-    def burn_token(self, wallet_index: int, token_index: int):
-        """Burn the token at token_index owned by the address at wallet_index."""
+    @_operation
+    def burn_token(self, wallet_index: int, token: int | Outpoint) -> TokenRecord:
+        """Burn the token owned by the address at wallet_index.
 
-        token_tx = tx_from_id(
-            self.token_utxos[wallet_index][token_index].prev_tx, self.network
-        )
-        token_tx_index = self.token_utxos[wallet_index][token_index].prev_index
-        pegout_tx = tx_from_id(
-            self.pegout_utxos[wallet_index][token_index].prev_tx, self.network
-        )
-        pegout_tx_index = self.pegout_utxos[wallet_index][token_index].prev_index
-        funding_tx = tx_from_id(
-            self.funding_utxos[wallet_index][BURNING_FUNDING_INDEX].prev_tx,
-            self.network,
-        )
-        funding_tx_index = self.funding_utxos[wallet_index][
-            BURNING_FUNDING_INDEX
-        ].prev_index
+        The burn is only dropped if its transaction is rejected. If it fails otherwise, e.g., the connection
+        drops while broadcasting, its journal entry, funding UTXO and leases are kept, and the burn is
+        finished by `resume_operations`.
+
+        Args:
+            wallet_index (int): The owner of the token.
+            token (int | Outpoint): The token, see `token`.
+        """
+        token = self.token(wallet_index, token)
+        assert token.pegout is not None, f"Token {token.genesis} has no pegout UTXO"
+        self.__lease(wallet_index, [token.tip.key, token.pegout.key])
+
+        # The burning circuit fixes the shape of the transaction: one funding input paying the whole fee, no change
+        with self.__single_funding(wallet_index, BALLPARK_BURNING_TX_FEE) as funding:
+            builder = self.__burning_builder(wallet_index, token, funding)
+            entry = self.journal.begin(
+                BURN,
+                SIGNED,
+                {
+                    "user": self.names[wallet_index],
+                    "genesis": token.genesis.to_hexstr(),
+                    "funding": funding.to_dict(),
+                },
+            )
+        try:
+            self.__run_burn(token, builder, entry)
+        except AssertionError:
+            if entry.reached(BROADCAST):
+                self.__keep_leases()
+                raise
+            # Rejected: the burn did not happen
+            self.__give_back_funding(wallet_index, funding)
+            self.journal.discard(entry)
+            raise
+        except BaseException:
+            # The burn may have reached the network, e.g., if the connection dropped while broadcasting
+            self.__keep_leases()
+            raise
+
+        return token
+
+    def __burning_builder(
+        self, wallet_index: int, token: TokenRecord, funding: Utxo
+    ) -> TransactionBuilder:
+        """The builder of the transaction burning `token`, paid by `funding`, without the PoB unlocking script."""
+        token_tx = tx_from_id(token.tip.prev_tx, self.network)
+        token_tx_index = token.tip.prev_index
+        pegout_tx = tx_from_id(token.pegout.prev_tx, self.network)
+        pegout_tx_index = token.pegout.prev_index
 
         output_script = Script.parse_string("OP_0 OP_RETURN")
 
@@ -602,78 +1621,90 @@ class WalletManager:
         )
         output_script.append_pushdata(extended_address)
 
-        spending_tx = Tx(
-            version=1,
-            tx_ins=[
-                tx_to_input(pegout_tx, pegout_tx_index, Script()),
-                tx_to_input(token_tx, token_tx_index, Script()),
-                tx_to_input(funding_tx, funding_tx_index, Script()),
-            ],
-            tx_outs=[TxOut(amount=0, script_pubkey=output_script)],
-            locktime=0,
-        )
-
-        self.__generate_burning_zk_proof(wallet_index, spending_tx, token_index)
-
-        pegout_unlocking_script = self.__generate_pegout_unlocking_script(
-            wallet_index, token_index
-        )
-
-        inputs = [
-            tx_to_input(pegout_tx, pegout_tx_index, pegout_unlocking_script),
-            tx_to_input(
-                token_tx,
-                token_tx_index,
-                bytes_to_script(
-                    bytes.fromhex(
-                        self.bsv_wallets[wallet_index].get_public_key_as_hexstr()
-                    )
-                ),
-            ),
-            tx_to_input(
-                funding_tx,
-                funding_tx_index,
-                bytes_to_script(
-                    bytes.fromhex(
-                        self.bsv_wallets[wallet_index].get_public_key_as_hexstr()
-                    )
-                ),
-            ),
-        ]
-
-        spending_tx = Tx(
-            version=1,
-            tx_ins=inputs,
-            tx_outs=spending_tx.tx_outs,
-            locktime=0,
+        public_key_script = bytes_to_script(
+            bytes.fromhex(self.bsv_wallets[wallet_index].get_public_key_as_hexstr())
         )
-
-        spending_tx = prepend_signature(
+        builder = TransactionBuilder()
+        builder.add_input(pegout_tx, pegout_tx_index)
+        builder.add_input(
             token_tx,
-            spending_tx,
-            1,
+            token_tx_index,
             self.bsv_wallets[wallet_index],
+            public_key_script,
         )
+        self.__add_funding_input(builder, wallet_index, funding)
+        builder.add_output(TxOut(amount=0, script_pubkey=output_script))
 
-        spending_tx = prepend_signature(
-            funding_tx,
-            spending_tx,
-            2,
-            self.bsv_wallets[wallet_index],
-        )
+        return builder
 
-        response = self.network.broadcast_tx(spending_tx.serialize().hex())
-        assert response.status_code == 200, f"Error burning pegout: {response.content}"
+    def __run_burn(
+        self, token: TokenRecord, builder: TransactionBuilder, entry: JournalEntry
+    ):
+        """Run the stages of the burn of `entry` not completed yet, and record the burn of `token`."""
+        if not entry.reached(UNLOCKED):
+            # The proof is kept with the entry, so that a crash does not waste it
+            workspace = self.journal.workspace(entry, POB_ENGINE)
+            if not entry.reached(PROVEN):
+                # The prover only needs the skeleton of the transaction, without unlocking scripts
+                self.__generate_burning_zk_proof(
+                    builder.skeleton_tx(), token, workspace
+                )
+                self.journal.record(
+                    entry, PROVEN, {"proof_path": str(workspace / PROOF_OF_BURN)}
+                )
+
+            pegout_unlocking_script = self.__generate_pegout_unlocking_script(
+                token, workspace
+            )
+            self.journal.record(
+                entry,
+                UNLOCKED,
+                {"unlocking_script": pegout_unlocking_script.raw_serialize().hex()},
+            )
 
-        genesis_txid = self.genesis_utxos[wallet_index].pop(token_index)
-        self.token_utxos[wallet_index].pop(token_index)
-        self.pegout_utxos[wallet_index].pop(token_index)
-        self.zk_proof_paths[wallet_index].pop(token_index)
-        self.burnt_tokens[wallet_index].append(
-            BurntToken(
-                genesis_txid.prev_tx,
-                spending_tx.id(),
+        if not entry.reached(BROADCAST):
+            # The signatures are computed on the skeleton, so the PoB unlocking script is only copied once,
+            # when the transaction is serialised
+            builder.set_unlocking_script(
+                0, Script(bytes.fromhex(entry.data["unlocking_script"]))
             )
-        )
+            raw_spending_tx = builder.serialise()
+
+            response = broadcast_raw_tx(raw_spending_tx, self.network)
+            # Already known if broadcast before a crash
+            assert response.status_code == 200 or self.__is_known(
+                raw_tx_id(raw_spending_tx)
+            ), f"Error burning pegout: {response.content}"
+            self.journal.record(entry, BROADCAST, {"txid": raw_tx_id(raw_spending_tx)})
+
+        self.tokens.burn(token, entry.data["txid"])
+        self.__finish(entry)
 
         return
+
+    def __resume_burn(self, entry: JournalEntry) -> bool:
+        wallet_index = self.user_index(entry.data["user"])
+        funding = Utxo.from_dict(entry.data["funding"])
+        token = self.token(wallet_index, Outpoint.from_hexstr(entry.data["genesis"]))
+        outpoints = [token.tip.key, token.pegout.key, funding.key]
+        if not self.journal.claim(entry, outpoints):
+            return False
+        self.__lease(wallet_index, outpoints)
+        self.__take_funding(wallet_index, funding)
+
+        builder = (
+            None
+            if entry.reached(BROADCAST)
+            else self.__burning_builder(wallet_index, token, funding)
+        )
+        try:
+            self.__run_burn(token, builder, entry)
+        except AssertionError:
+            if entry.reached(BROADCAST):
+                raise
+            # Rejected: the burn did not happen
+            self.__give_back_funding(wallet_index, funding)
+            self.journal.discard(entry)
+            return False
+
+        return True
@@ -0,0 +1,585 @@
+"""SQLite store of the state of a `WalletManager`, updated row by row."""
+
+import copy
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from bsv.records import Outpoint
+from bsv.tokens import HELD
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    bsv_wallet TEXT NOT NULL,
+    source_address TEXT NOT NULL
+);
+-- Outpoints are stored in their `OUTPOINT_BYTES`-byte encoding (see `Outpoint.key`), txids as 32 bytes
+CREATE TABLE IF NOT EXISTS tokens (
+    genesis BLOB PRIMARY KEY,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    tip BLOB,
+    pegout BLOB,
+    zk_proof_path TEXT,
+    burning_txid BLOB
+);
+CREATE INDEX IF NOT EXISTS tokens_by_user ON tokens (name, position);
+CREATE INDEX IF NOT EXISTS tokens_by_tip ON tokens (tip);
+CREATE INDEX IF NOT EXISTS tokens_by_pegout ON tokens (pegout);
+CREATE TABLE IF NOT EXISTS funding_utxos (
+    outpoint BLOB PRIMARY KEY,
+    name TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    script_type TEXT NOT NULL,
+    -- Concatenated txids of the unconfirmed transactions leading to the UTXO
+    ancestors BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS funding_utxos_by_user ON funding_utxos (name, amount);
+CREATE TABLE IF NOT EXISTS leases (
+    outpoint BLOB PRIMARY KEY,
+    worker TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leases_by_worker ON leases (worker);
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+# Seconds to wait for another process to release its lock on the database
+BUSY_TIMEOUT = 30
+
+
+class LeaseError(Exception):
+    """Raised when outpoints are leased by another worker or were spent by one."""
+
+
+class WalletStore:
+    """SQLite database holding the state of a `WalletManager`.
+
+    The state is exchanged in the format of the wallet JSON file (see `WalletManager.load_wallet`),
+    which remains the import/export format. The state of each user can be loaded on its own with
+    `load_user`. `save` compares the state with the one last loaded or saved and only writes the rows
+    that changed, in a single transaction, so that a crash never leaves the database half-updated.
+
+    The database records the modification time of the JSON file it was imported from. If the JSON file
+    is modified afterwards, e.g., by the `setup` command of the demos, `is_stale` reports it so that the
+    file is imported again. `changed_since_import` tells whether importing it would discard changes
+    saved to the store since the last import, or since the last `export_json` to the JSON file.
+
+    Several processes, each with its own `WalletStore`, can share the database. A process (worker) leases
+    the funding UTXOs and token outputs it is about to spend with `acquire_leases`, which fails if
+    another worker holds them or already spent them, and releases them with `save` once its changes
+    are written, or with `release_leases` if the operation failed. Leases expire after a timeout, so
+    that the outpoints of a crashed worker become available again. The store can also be shared by the
+    threads of a process.
+
+    The store also holds the journal of the operations in progress (see `bsv.journal`), whose entries
+    are deleted by `save` in the same transaction as the changes of the operations.
+
+    Args:
+        db_path (Path): The path to the database, created if it does not exist.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.connection = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,
+            timeout=BUSY_TIMEOUT,
+            check_same_thread=False,
+        )
+        # Serialises the use of the connection by the threads of the process
+        self._lock = threading.RLock()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        # State as last loaded or saved, by user. Only holds the users whose state was loaded
+        self._saved = {}
+
+    @staticmethod
+    def for_json(json_path: Path):
+        """The store of the wallet JSON file `json_path`."""
+        return WalletStore(WalletStore.for_json_path(json_path))
+
+    @staticmethod
+    def for_json_path(json_path: Path) -> Path:
+        """The path to the store of the wallet JSON file `json_path`: same name, `.db` suffix."""
+        return Path(json_path).with_suffix(".db")
+
+    def is_stale(self, json_path: Path) -> bool:
+        """Whether `json_path` was modified since it was last imported."""
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return False
+        return self.__meta("json_stamp") != WalletStore.__stamp(json_path)
+
+    def import_data(self, data: dict, json_path: Path | None = None):
+        """Replace the content of the store with `data`, which supersedes the JSON file `json_path` if given.
+
+        The journal and the leases are cleared too, as they refer to the replaced state.
+        """
+        with self.__transaction():
+            for table in ("users", "tokens", "funding_utxos", "journal", "leases"):
+                self.connection.execute(f"DELETE FROM {table}")
+            for position, (name, user) in enumerate(data.items()):
+                self.__insert_user(name, position, user)
+            if json_path is not None and Path(json_path).exists():
+                self.__record_json(Path(json_path))
+        self._saved = copy.deepcopy(data)
+        return
+
+    def changed_since_import(self) -> bool:
+        """Whether `save` wrote changes since the JSON file was last imported or exported."""
+        return self.__meta("changed_since_import") is not None
+
+    def export_json(self, json_path: Path):
+        """Write the content of the store to `json_path` in the wallet JSON format.
+
+        If `json_path` is the JSON file of the store, it is recorded as up to date with the store.
+        """
+        with open(json_path, "w") as file:
+            json.dump(self.load(), file, indent=4)
+        if WalletStore.for_json_path(json_path) == self.db_path:
+            with self.__transaction():
+                self.__record_json(Path(json_path))
+        return
+
+    def load(self) -> dict:
+        """The state held in the store, in the wallet JSON format."""
+        return {
+            name: {
+                "bsv_wallet": bsv_wallet,
+                "source_address": source_address,
+                **self.load_user(name),
+            }
+            for name, bsv_wallet, source_address in self.load_accounts()
+        }
+
+    def load_accounts(self) -> list[tuple[str, str, str]]:
+        """The `(name, private key, source address)` of every user, as stored in the wallet JSON format."""
+        return self.connection.execute(
+            "SELECT name, bsv_wallet, source_address FROM users ORDER BY position"
+        ).fetchall()
+
+    def load_user(self, name: str) -> dict:
+        """The tokens and funding UTXOs of the user `name`, in the wallet JSON format."""
+        # In a transaction, so that the rows written by another worker are read all or none
+        with self.__transaction():
+            return self.__load_user(name)
+
+    def __load_user(self, name: str) -> dict:
+        user = {"tokens": [], "funding_utxos": []}
+        for row in self.connection.execute(
+            "SELECT genesis, state, tip, pegout, zk_proof_path, burning_txid FROM tokens "
+            "WHERE name = ? ORDER BY position",
+            (name,),
+        ):
+            user["tokens"].append(_token_from_row(row))
+        for outpoint, amount, script_type, ancestors in self.connection.execute(
+            "SELECT outpoint, amount, script_type, ancestors FROM funding_utxos WHERE name = ? ORDER BY amount, outpoint",
+            (name,),
+        ):
+            user["funding_utxos"].append(
+                {
+                    "outpoint": Outpoint.from_bytes(outpoint).to_hexstr(),
+                    "amount": amount,
+                    "script_type": script_type,
+                    "ancestors": [
+                        ancestors[i : i + 32].hex()
+                        for i in range(0, len(ancestors), 32)
+                    ],
+                }
+            )
+
+        self._saved[name] = copy.deepcopy(user)
+        return user
+
+    def save(
+        self,
+        data: dict,
+        worker: str | None = None,
+        leases: list[bytes] | None = None,
+        finished: list[int] | None = None,
+        outpoints: set[bytes] | None = None,
+    ):
+        """Write the rows of `data` that changed since they were last loaded or saved.
+
+        `data` only needs to hold the users whose state was loaded: the other users are left untouched.
+        Users that are not in the store yet are added after the existing ones. If `outpoints` is given,
+        only the funding UTXOs and the tokens (by genesis, tip or pegout) with one of these outpoints are
+        written, the other rows are left as they were last loaded or saved.
+
+        Args:
+            data (dict): The state of the users, in the wallet JSON format.
+            worker (str | None): The worker saving the state.
+            leases (list[bytes] | None): Outpoints leased by `worker`, released in the same transaction
+                as the changes are written.
+            finished (list[int] | None): Ids of the journal entries of the operations whose changes
+                are written, deleted in the same transaction.
+            outpoints (set[bytes] | None): The outpoints of the rows to write, all if `None`.
+        """
+        with self._lock:
+            with self.__transaction():
+                if worker is not None and leases:
+                    self.__release_leases(worker, leases)
+                if finished:
+                    self.connection.executemany(
+                        "DELETE FROM journal WHERE id = ?",
+                        [(entry_id,) for entry_id in finished],
+                    )
+                changes = self.connection.total_changes
+                for name, user in data.items():
+                    saved = self._saved.get(name)
+                    if saved is None:
+                        (position,) = self.connection.execute(
+                            "SELECT COALESCE(MAX(position) + 1, 0) FROM users"
+                        ).fetchone()
+                        self.__insert_user(name, position, user)
+                        self._saved[name] = copy.deepcopy(user)
+                        continue
+                    if outpoints is not None:
+                        user = WalletStore.__select_rows(saved, user, outpoints)
+                    self.__update_tokens(name, saved["tokens"], user["tokens"])
+                    self.__update_funding_utxos(
+                        name, saved["funding_utxos"], user["funding_utxos"]
+                    )
+                    self._saved[name] = copy.deepcopy(user)
+                if self.connection.total_changes != changes:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO meta VALUES ('changed_since_import', '1')"
+                    )
+        return
+
+    @staticmethod
+    def __select_rows(saved: dict, user: dict, outpoints: set[bytes]) -> dict:
+        """The state `saved` of a user, with the funding UTXOs and tokens of `outpoints` taken from `user`."""
+
+        def token_outpoints(token: dict) -> set[bytes]:
+            return {
+                Outpoint.from_hexstr(token[key]).key
+                for key in ("genesis", "tip", "pegout")
+                if token[key]
+            }
+
+        tokens = {token["genesis"]: token for token in user["tokens"]}
+        selected = {
+            genesis
+            for genesis, token in tokens.items()
+            if token_outpoints(token) & outpoints
+        } | {
+            token["genesis"]
+            for token in saved["tokens"]
+            if token_outpoints(token) & outpoints
+        }
+        # The tokens keep their saved order, the new ones come after them
+        merged = [
+            tokens.get(token["genesis"]) if token["genesis"] in selected else token
+            for token in saved["tokens"]
+        ]
+        saved_tokens = {token["genesis"] for token in saved["tokens"]}
+        merged += [
+            token
+            for genesis, token in tokens.items()
+            if genesis in selected and genesis not in saved_tokens
+        ]
+
+        funding = {utxo["outpoint"]: utxo for utxo in saved["funding_utxos"]}
+        for utxo in saved["funding_utxos"] + user["funding_utxos"]:
+            if Outpoint.from_hexstr(utxo["outpoint"]).key in outpoints:
+                funding.pop(utxo["outpoint"], None)
+        funding.update(
+            (utxo["outpoint"], utxo)
+            for utxo in user["funding_utxos"]
+            if Outpoint.from_hexstr(utxo["outpoint"]).key in outpoints
+        )
+
+        return {
+            **user,
+            "tokens": [token for token in merged if token is not None],
+            "funding_utxos": list(funding.values()),
+        }
+
+    def acquire_leases(
+        self, outpoints: list[bytes], worker: str, timeout: float
+    ) -> bool:
+        """Lease `outpoints` (see `Outpoint.key`) to `worker` for `timeout` seconds, or until they are released.
+
+        Either every outpoint is leased or none is. Leasing fails if any of them is leased by another
+        worker, or if it is neither a funding UTXO nor the tip or pegout UTXO of a held token, i.e., it
+        was spent by another worker since this one loaded its state.
+        """
+        now = time.time()
+        with self.__transaction():
+            self.connection.execute("DELETE FROM leases WHERE expires < ?", (now,))
+            for outpoint in outpoints:
+                lease = self.connection.execute(
+                    "SELECT worker FROM leases WHERE outpoint = ?", (outpoint,)
+                ).fetchone()
+                if lease is not None and lease[0] != worker:
+                    return False
+                if not self.__unspent(outpoint):
+                    return False
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO leases VALUES (?, ?, ?)",
+                [(outpoint, worker, now + timeout) for outpoint in outpoints],
+            )
+        return True
+
+    def spent_outpoints(self, outpoints: list[bytes]) -> list[bytes]:
+        """The outpoints among `outpoints` that are neither a funding UTXO nor the tip or pegout UTXO of a
+        held token, e.g., spent by another worker."""
+        with self._lock:
+            return [outpoint for outpoint in outpoints if not self.__unspent(outpoint)]
+
+    def __unspent(self, outpoint: bytes) -> bool:
+        return (
+            self.connection.execute(
+                "SELECT 1 FROM funding_utxos WHERE outpoint = ? "
+                "UNION ALL SELECT 1 FROM tokens WHERE tip = ? AND burning_txid IS NULL "
+                "UNION ALL SELECT 1 FROM tokens WHERE pegout = ? AND burning_txid IS NULL",
+                (outpoint,) * 3,
+            ).fetchone()
+            is not None
+        )
+
+    def release_leases(self, worker: str, outpoints: list[bytes] | None = None):
+        """Release the `outpoints` leased by `worker`, or all of its leases."""
+        with self.__transaction():
+            self.__release_leases(worker, outpoints)
+        return
+
+    def leased_outpoints(self, worker: str) -> set[bytes]:
+        """The outpoints currently leased by workers other than `worker`."""
+        with self._lock:
+            return {
+                outpoint
+                for (outpoint,) in self.connection.execute(
+                    "SELECT outpoint FROM leases WHERE worker != ? AND expires >= ?",
+                    (worker, time.time()),
+                )
+            }
+
+    def find_token(self, outpoint: bytes) -> str | None:
+        """The name of the owner of the token with genesis, tip or pegout `outpoint`, if any."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT name FROM tokens WHERE genesis = ? "
+                "UNION ALL SELECT name FROM tokens WHERE tip = ? "
+                "UNION ALL SELECT name FROM tokens WHERE pegout = ?",
+                (outpoint,) * 3,
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def held_proofs(self) -> set[str]:
+        """The proofs of the tokens held by any user, i.e., needed by their next transfer or burn."""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT zk_proof_path FROM tokens WHERE zk_proof_path IS NOT NULL "
+                f"AND state IN ({', '.join('?' * len(HELD))})",
+                HELD,
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def journal_append(
+        self, kind: str, stage: str, worker: str, data: dict, updated: float
+    ) -> int:
+        """Add an entry to the journal. Returns its id."""
+        with self.__transaction():
+            cursor = self.connection.execute(
+                "INSERT INTO journal (kind, stage, worker, data, updated) VALUES (?, ?, ?, ?, ?)",
+                (kind, stage, worker, json.dumps(data), updated),
+            )
+        return cursor.lastrowid
+
+    def journal_update(self, entry_id: int, stage: str, data: dict, updated: float):
+        """Record the stage reached by the journal entry `entry_id`, with its data."""
+        with self.__transaction():
+            self.connection.execute(
+                "UPDATE journal SET stage = ?, data = ?, updated = ? WHERE id = ?",
+                (stage, json.dumps(data), updated, entry_id),
+            )
+        return
+
+    def journal_delete(self, entry_id: int):
+        with self.__transaction():
+            self.connection.execute("DELETE FROM journal WHERE id = ?", (entry_id,))
+        return
+
+    def journal_entries(self) -> list[tuple]:
+        """The `(id, kind, stage, worker, data, updated)` of every journal entry, oldest first."""
+        with self._lock:
+            return [
+                (entry_id, kind, stage, worker, json.loads(data), updated)
+                for entry_id, kind, stage, worker, data, updated in self.connection.execute(
+                    "SELECT id, kind, stage, worker, data, updated FROM journal ORDER BY id"
+                )
+            ]
+
+    def journal_claim(
+        self,
+        entry_id: int,
+        previous_worker: str,
+        worker: str,
+        outpoints: list[bytes],
+    ) -> bool:
+        """Hand the journal entry `entry_id` over from `previous_worker` to `worker`.
+
+        The leases of `previous_worker` on `outpoints` are released in the same transaction. Returns
+        `False` if the entry is gone or was handed over to another worker already.
+        """
+        with self.__transaction():
+            cursor = self.connection.execute(
+                "UPDATE journal SET worker = ?, updated = ? WHERE id = ? AND worker = ?",
+                (worker, time.time(), entry_id, previous_worker),
+            )
+            if cursor.rowcount == 0:
+                return False
+            self.__release_leases(previous_worker, outpoints)
+        return True
+
+    def close(self):
+        self.connection.close()
+        return
+
+    @contextmanager
+    def __transaction(self):
+        """Run the statements of the block in one transaction, rolled back if the block raises."""
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def __meta(self, key: str) -> str | None:
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def __record_json(self, json_path: Path):
+        """Record that the store holds the content of `json_path`, which is the last version imported."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('json_stamp', ?)",
+            (WalletStore.__stamp(json_path),),
+        )
+        self.connection.execute("DELETE FROM meta WHERE key = 'changed_since_import'")
+        return
+
+    @staticmethod
+    def __stamp(json_path: Path) -> str:
+        stat = json_path.stat()
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def __release_leases(self, worker: str, outpoints: list[bytes] | None = None):
+        if outpoints is None:
+            self.connection.execute("DELETE FROM leases WHERE worker = ?", (worker,))
+        else:
+            self.connection.executemany(
+                "DELETE FROM leases WHERE outpoint = ? AND worker = ?",
+                [(outpoint, worker) for outpoint in outpoints],
+            )
+        return
+
+    def __insert_user(self, name: str, position: int, user: dict):
+        self.connection.execute(
+            "INSERT INTO users VALUES (?, ?, ?, ?)",
+            (name, position, user["bsv_wallet"], user["source_address"]),
+        )
+        self.__update_tokens(name, [], user["tokens"])
+        self.__update_funding_utxos(name, [], user["funding_utxos"])
+        return
+
+    def __update_tokens(self, name: str, saved: list[dict], tokens: list[dict]):
+        # Tokens move between users, so rows are only deleted if they still belong to `name`
+        saved = {
+            token["genesis"]: (position, token) for position, token in enumerate(saved)
+        }
+        tokens = {
+            token["genesis"]: (position, token) for position, token in enumerate(tokens)
+        }
+        self.connection.executemany(
+            "DELETE FROM tokens WHERE genesis = ? AND name = ?",
+            [
+                (Outpoint.from_hexstr(genesis).key, name)
+                for genesis in saved.keys() - tokens.keys()
+            ],
+        )
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                _token_to_row(name, position, token)
+                for genesis, (position, token) in tokens.items()
+                if saved.get(genesis) != (position, token)
+            ],
+        )
+        return
+
+    def __update_funding_utxos(self, name: str, saved: list[dict], utxos: list[dict]):
+        saved = {utxo["outpoint"]: utxo for utxo in saved}
+        utxos = {utxo["outpoint"]: utxo for utxo in utxos}
+        self.connection.executemany(
+            "DELETE FROM funding_utxos WHERE outpoint = ?",
+            [
+                (Outpoint.from_hexstr(outpoint).key,)
+                for outpoint in saved.keys() - utxos.keys()
+            ],
+        )
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO funding_utxos VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    Outpoint.from_hexstr(outpoint).key,
+                    name,
+                    utxo["amount"],
+                    utxo["script_type"],
+                    b"".join(bytes.fromhex(txid) for txid in utxo["ancestors"]),
+                )
+                for outpoint, utxo in utxos.items()
+                if saved.get(outpoint) != utxo
+            ],
+        )
+        return
+
+
+def _token_to_row(name: str, position: int, token: dict) -> tuple:
+    return (
+        Outpoint.from_hexstr(token["genesis"]).key,
+        name,
+        position,
+        token["state"],
+        Outpoint.from_hexstr(token["tip"]).key if token["tip"] else None,
+        Outpoint.from_hexstr(token["pegout"]).key if token["pegout"] else None,
+        token["zk_proof_path"],
+        bytes.fromhex(token["burning_txid"]) if token["burning_txid"] else None,
+    )
+
+
+def _token_from_row(row: tuple) -> dict:
+    genesis, state, tip, pegout, zk_proof_path, burning_txid = row
+    return {
+        "genesis": Outpoint.from_bytes(genesis).to_hexstr(),
+        "tip": Outpoint.from_bytes(tip).to_hexstr() if tip is not None else None,
+        "pegout": Outpoint.from_bytes(pegout).to_hexstr()
+        if pegout is not None
+        else None,
+        "zk_proof_path": zk_proof_path,
+        "state": state,
+        "burning_txid": burning_txid.hex() if burning_txid is not None else None,
+    }
@@ -0,0 +1,76 @@
+"""Readers for the binary files written by zk_engine."""
+
+from pathlib import Path
+
+# `utils::save_to_file` prefixes the data with its length as a little-endian u64
+LENGTH_PREFIX_BYTES = 8
+
+
+class ZkFile:
+    """A file written by zk_engine's `utils::save_to_file`.
+
+    The file holds the length of the data as a little-endian u64, followed by the `CanonicalSerialize`
+    serialisation of an arkworks item. The data is exposed as a `memoryview`, so sections of it can be
+    passed to the deserialisers without copying them or turning every byte into a Python int.
+
+    Args:
+        path (Path): The file to read.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        data = self.path.read_bytes()
+        if len(data) < LENGTH_PREFIX_BYTES:
+            raise ValueError(f"{self.path} is too short to hold a length prefix")
+        length = int.from_bytes(data[:LENGTH_PREFIX_BYTES], "little")
+        if len(data) < LENGTH_PREFIX_BYTES + length:
+            raise ValueError(
+                f"{self.path} is truncated: expected {length} bytes, found {len(data) - LENGTH_PREFIX_BYTES}"
+            )
+        self.payload = memoryview(data)[
+            LENGTH_PREFIX_BYTES : LENGTH_PREFIX_BYTES + length
+        ]
+
+    def section(self, offset: int, length: int | None = None) -> memoryview:
+        """The `length` bytes of the data starting at `offset`, or all the remaining ones if `length` is `None`."""
+        end = len(self.payload) if length is None else offset + length
+        if end > len(self.payload):
+            raise ValueError(
+                f"Section [{offset}, {end}) is out of bounds in {self.path}"
+            )
+        return self.payload[offset:end]
+
+    def chunks(self, element_bytes: int) -> list[memoryview]:
+        """Split the data into consecutive elements of `element_bytes` bytes, e.g., the coordinates of a field element."""
+        if len(self.payload) % element_bytes != 0:
+            raise ValueError(
+                f"Data in {self.path} is not a multiple of {element_bytes} bytes"
+            )
+        return [
+            self.payload[i : i + element_bytes]
+            for i in range(0, len(self.payload), element_bytes)
+        ]
+
+    def elements(self, element_bytes: int) -> list[memoryview]:
+        """The elements of a serialised `Vec`: a little-endian u64 count followed by elements of `element_bytes` bytes."""
+        count = int.from_bytes(self.section(0, LENGTH_PREFIX_BYTES), "little")
+        if LENGTH_PREFIX_BYTES + count * element_bytes != len(self.payload):
+            raise ValueError(
+                f"{self.path} does not hold {count} elements of {element_bytes} bytes"
+            )
+        return [
+            self.section(LENGTH_PREFIX_BYTES + i * element_bytes, element_bytes)
+            for i in range(count)
+        ]
+
+
+def deserialise(cls, buffer: memoryview):
+    """Deserialise an instance of `cls` from `buffer` via `cls.deserialise`.
+
+    The buffer is passed as is. It is only converted to a list of ints for deserialisers that do not
+    support the buffer protocol.
+    """
+    try:
+        return cls.deserialise(buffer)
+    except TypeError:
+        return cls.deserialise(list(buffer))
@@ -7,53 +7,80 @@ from elliptic_curves.data_structures.vk import PreparedVerifyingKey
 from elliptic_curves.data_structures.zkscript import ZkScriptVerifyingKey
 from elliptic_curves.instantiations.mnt4_753.mnt4_753 import (
     MNT4_753,
+    ProofMnt4753,
     VerifyingKeyMnt4753,
 )
-from tx_engine import SIGHASH, TxOut
+from tx_engine import SIGHASH, Script, TxOut
 
 from src.zkscript.groth16.mnt4_753.mnt4_753 import mnt4_753
 from src.zkscript.reftx.reftx import RefTx
 from src.zkscript.script_types.locking_keys.reftx import RefTxLockingKey
 
+from bsv.fixed_base import load_or_build_table
+from bsv.script_template import ScriptTemplate
+from bsv.vk_cache import VkCache, load_or_build_artefact
+from bsv.zk_files import ZkFile, deserialise
+
 ScalarFieldMNT4 = MNT4_753.scalar_field
 
+POB_KEYS = Path(__file__).parent.parent.parent / "zk_engine/data/pob_engine/keys"
+VK_CACHE = VkCache(
+    vk_path=POB_KEYS / "vk.bin",
+    cache_dir=Path(__file__).parent.parent.parent / "zk_engine/data/pob_engine/cache",
+)
+# Precomputed multiples of vk.gamma_abc[1], the base multiplied by the genesis txid
+GAMMA_ABC_1_TABLE = POB_KEYS / "gamma_abc_1_table.pkl"
+# Template of the PoB locking script, in which only precomputed_l_out depends on the genesis
+POB_LOCKING_SCRIPT_TEMPLATE = POB_KEYS / "pob_locking_script_template.pkl"
+# Genesis txids compiled to locate and validate the genesis-dependent part of the template
+TEMPLATE_GENESIS_TXIDS = (bytes([1]) * 32, bytes([2]) * 32)
+# Whether the inverse Miller loop output computed by zk_engine matches `prepare_for_zkscript`
+NATIVE_PREPARATION_CHECK = POB_KEYS / "native_preparation_check.pkl"
+# Elements of the base field of MNT4-753 are serialised by zk_engine in ceil(753 / 8) bytes
+BASE_FIELD_BYTES = 95
+# Elements of the scalar field of MNT4-753 are serialised in the same number of bytes
+SCALAR_FIELD_BYTES = (ScalarFieldMNT4.get_modulus().bit_length() + 8) // 8
+
 
 def load_and_process_vk(
     genesis_txid: bytes,
+) -> list[VerifyingKeyMnt4753, PreparedVerifyingKey, ZkScriptVerifyingKey]:
+    """Load the PoB verifying key, hard-code `genesis_txid` in it and prepare it.
+
+    The result is cached (in memory and on disk) per verifying key and genesis txid, see `VkCache`.
+    """
+    return VK_CACHE.get(genesis_txid, lambda: _process_vk(genesis_txid))
+
+
+def _process_vk(
+    genesis_txid: bytes,
 ) -> list[VerifyingKeyMnt4753, PreparedVerifyingKey, ZkScriptVerifyingKey]:
     genesis_txid_as_input = int.from_bytes(genesis_txid, "little")
 
-    with open(
-        str(
-            Path(__file__).parent.parent.parent
-            / "zk_engine/data/pob_engine/keys/vk.bin"
-        ),
-        "rb",
-    ) as f:
-        vk_bytes = list(f.read())
-        vk = VerifyingKeyMnt4753.deserialise(vk_bytes[8:])
-
-        # Precompute locking data
-        precomputed_l_out = vk.gamma_abc[0] + vk.gamma_abc[1].multiply(
-            genesis_txid_as_input
-        )
-        # Modified gamma_abc
-        gamma_abc_mod = [precomputed_l_out, *vk.gamma_abc[2:]]
-        # Modified vk
-        vk_mod = VerifyingKeyMnt4753(
-            vk.alpha, vk.beta, vk.gamma, vk.delta, gamma_abc_mod
-        )
-        # Prepare the vk
-        cache_vk = vk_mod.prepare()
-        prepared_vk = vk_mod.prepare_for_zkscript(cache_vk)
+    vk = deserialise(VerifyingKeyMnt4753, ZkFile(POB_KEYS / "vk.bin").payload)
 
-        return vk_mod, cache_vk, prepared_vk
+    # Precompute locking data
+    gamma_abc_1_table = load_or_build_table(
+        GAMMA_ABC_1_TABLE, VK_CACHE.vk_hash(), vk.gamma_abc[1]
+    )
+    precomputed_l_out = vk.gamma_abc[0] + gamma_abc_1_table.multiply(
+        genesis_txid_as_input
+    )
+    # Modified gamma_abc
+    gamma_abc_mod = [precomputed_l_out, *vk.gamma_abc[2:]]
+    # Modified vk
+    vk_mod = VerifyingKeyMnt4753(vk.alpha, vk.beta, vk.gamma, vk.delta, gamma_abc_mod)
+    # Prepare the vk
+    cache_vk = vk_mod.prepare()
+    prepared_vk = vk_mod.prepare_for_zkscript(cache_vk)
 
+    return vk_mod, cache_vk, prepared_vk
 
-def generate_pob_utxo(
+
+def compile_pob_locking_script(
     vk: PreparedVerifyingKey, prepared_vk: ZkScriptVerifyingKey
-) -> TxOut:
-    # Generate PoB locking script
+) -> Script:
+    """Compile the Groth16 verifier locking the PoB UTXO."""
     locking_key = RefTxLockingKey(
         alpha_beta=prepared_vk.alpha_beta,
         minus_gamma=prepared_vk.minus_gamma,
@@ -64,7 +91,7 @@ def generate_pob_utxo(
         use_proj_coordinates=True,
     )
 
-    lock = RefTx(mnt4_753).locking_script(
+    return RefTx(mnt4_753).locking_script(
         sighash_flags=SIGHASH.ALL_FORKID,
         locking_key=locking_key,
         modulo_threshold=200 * 8,
@@ -72,4 +99,156 @@ def generate_pob_utxo(
         check_constant=True,
     )
 
-    return TxOut(amount=1, script_pubkey=lock)
+
+def pob_locking_script_template() -> ScriptTemplate | None:
+    """The template of the PoB locking script for the current verifying key.
+
+    It is built once per key set and stored next to the keys. It is `None` if the genesis-dependent
+    part of the script could not be isolated, in which case scripts must be fully compiled.
+    """
+    return load_or_build_artefact(
+        POB_LOCKING_SCRIPT_TEMPLATE,
+        VK_CACHE.vk_hash(),
+        _build_pob_locking_script_template,
+    )
+
+
+def _build_pob_locking_script_template() -> ScriptTemplate | None:
+    (vk_a, _, prepared_vk_a), (vk_b, _, prepared_vk_b) = [
+        load_and_process_vk(genesis_txid) for genesis_txid in TEMPLATE_GENESIS_TXIDS
+    ]
+    script_a = compile_pob_locking_script(vk_a, prepared_vk_a).raw_serialize()
+    script_b = compile_pob_locking_script(vk_b, prepared_vk_b).raw_serialize()
+
+    template = ScriptTemplate.from_script(script_a, vk_a.gamma_abc[0].to_list())
+    # The template is only valid if it reproduces a script it was not derived from
+    if template is None or template.render(vk_b.gamma_abc[0].to_list()) != script_b:
+        print(
+            "WARNING: Could not template the PoB locking script, compiling it in full."
+        )
+        return None
+
+    return template
+
+
+def generate_pob_utxo(
+    vk: PreparedVerifyingKey,
+    prepared_vk: ZkScriptVerifyingKey,
+    use_template: bool = True,
+    self_check: bool = False,
+) -> TxOut:
+    """Generate the PoB UTXO for the verifying key `vk` processed for a genesis txid.
+
+    Args:
+        vk (PreparedVerifyingKey): The verifying key returned by `load_and_process_vk`.
+        prepared_vk (ZkScriptVerifyingKey): The prepared verifying key returned by `load_and_process_vk`.
+        use_template (bool): Whether to splice `vk.gamma_abc[0]` into the template of the locking script
+            instead of compiling the whole script. Defaults to `True`.
+        self_check (bool): Whether to check the spliced script against a full compilation. Defaults to `False`.
+    """
+    template = pob_locking_script_template() if use_template else None
+    if template is None:
+        return TxOut(
+            amount=1, script_pubkey=compile_pob_locking_script(vk, prepared_vk)
+        )
+
+    lock = template.render(vk.gamma_abc[0].to_list())
+    if self_check:
+        assert lock == compile_pob_locking_script(vk, prepared_vk).raw_serialize(), (
+            "Spliced PoB locking script differs from the compiled one"
+        )
+
+    return TxOut(amount=1, script_pubkey=Script(lock))
+
+
+def load_inverse_miller_output(path: Path) -> list[int]:
+    """Load the inverse Miller loop output saved by `pob-engine prove --prepared`.
+
+    The output is an element of the degree-4 extension of the base field, as the list of its coordinates.
+    """
+    return [
+        int.from_bytes(coordinate, "little")
+        for coordinate in ZkFile(path).chunks(BASE_FIELD_BYTES)
+    ]
+
+
+def load_pob_proof(
+    proof_path: Path, public_input_path: Path
+) -> tuple[ProofMnt4753, list[int]]:
+    """Load a proof of burn and the public input required to spend the PoB UTXO.
+
+    The public input file holds `[genesis_txid, integrity tag]`. The genesis txid is hard-coded in the
+    verifying key (see `load_and_process_vk`), so only the integrity tag is returned.
+    """
+    proof = deserialise(ProofMnt4753, ZkFile(proof_path).payload)
+    _, integrity_tag = ZkFile(public_input_path).elements(SCALAR_FIELD_BYTES)
+    return proof, [deserialise(ScalarFieldMNT4, integrity_tag).to_int()]
+
+
+def prepare_pob_proof(
+    proof: ProofMnt4753,
+    public_input: list[int],
+    cache_vk: PreparedVerifyingKey,
+    inverse_miller_output: Path | None = None,
+) -> list[list[int]]:
+    """Compute A, B, C and the inverse Miller loop output for the unlocking script of the PoB UTXO.
+
+    If zk_engine saved the inverse Miller loop output at `inverse_miller_output`, it is used instead of
+    preparing the proof in Python. The first time this happens for a verifying key, the proof is prepared
+    in Python too: if the two disagree, the native output is ignored for that key.
+
+    Args:
+        proof (ProofMnt4753): The proof of burn.
+        public_input (list[int]): The public input of the proof, without the genesis txid.
+        cache_vk (PreparedVerifyingKey): The prepared verifying key returned by `load_and_process_vk`.
+        inverse_miller_output (Path | None): The file written by `pob-engine prove --prepared`.
+    """
+    if inverse_miller_output is not None and inverse_miller_output.exists():
+        native = [
+            proof.a.to_list(),
+            proof.b.to_list(),
+            proof.c.to_list(),
+            load_inverse_miller_output(inverse_miller_output),
+        ]
+        if load_or_build_artefact(
+            NATIVE_PREPARATION_CHECK,
+            VK_CACHE.vk_hash(),
+            lambda: _matches_prepare_for_zkscript(
+                native, proof, public_input, cache_vk
+            ),
+        ):
+            return native
+
+    prepared_proof = proof.prepare_for_zkscript(cache_vk, public_input)
+    return [
+        prepared_proof.a,
+        prepared_proof.b,
+        prepared_proof.c,
+        prepared_proof.inverse_miller_loop,
+    ]
+
+
+def _matches_prepare_for_zkscript(
+    native: list[list[int]],
+    proof: ProofMnt4753,
+    public_input: list[int],
+    cache_vk: PreparedVerifyingKey,
+) -> bool:
+    prepared_proof = proof.prepare_for_zkscript(cache_vk, public_input)
+    expected = [
+        prepared_proof.a,
+        prepared_proof.b,
+        prepared_proof.c,
+        prepared_proof.inverse_miller_loop,
+    ]
+    if [_to_list(element) for element in expected] != native:
+        print(
+            "WARNING: zk_engine and zkscript disagree on the prepared proof, preparing it in Python."
+        )
+        return False
+
+    return True
+
+
+def _to_list(element) -> list[int]:
+    return element.to_list() if hasattr(element, "to_list") else list(element)
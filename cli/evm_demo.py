@@ -82,7 +82,9 @@ def setup_wallets(network):
 
     populate_wallet_json("./empty_wallet.json", wallets, "./eth_bsv_wallet.json")
     network.generate_blocks(1)
-    wallet_manager = WalletManager.load_wallet("./eth_bsv_wallet.json", network)
+    wallet_manager = WalletManager.load_wallet(
+        "./eth_bsv_wallet.json", network, replace=True
+    )
     for i, name in enumerate(wallet_manager.names):
         if name != "issuer":
             wallet_manager.setup(i)
@@ -189,7 +191,7 @@ def setup_demo(network):
 
 
 def map_user_to_index(user_name: str, wallet_manager: WalletManager) -> int:
-    return wallet_manager.names.index(user_name)
+    return wallet_manager.user_index(user_name)
 
 
 def conditional_generate_block(network: WoCInterface | RPCInterface):
@@ -209,14 +211,10 @@ def pegin_prep(wallet_manager: WalletManager, user_name: str, pegin_amount: int)
     # Generate genesis
     print("\nGenerating genesis transaction...")
     start = time.perf_counter()
-    wallet_manager.generate_genesis_for_pegin(user)
+    token = wallet_manager.generate_genesis_for_pegin(user)
     end = time.perf_counter()
     wallet_manager.save_wallet("./eth_bsv_wallet.json")
-    print(
-        f"\nGenesis transaction generated at: \n{wallet_manager.genesis_utxos[user][-1]}".replace(
-            "prev_", ""
-        )
-    )
+    print(f"\nGenesis transaction generated at: \n{token.genesis}".replace("prev_", ""))
     print(f"\nElapsed time: {end - start} seconds")
 
     conditional_generate_block(wallet_manager.network)
@@ -224,23 +222,19 @@ def pegin_prep(wallet_manager: WalletManager, user_name: str, pegin_amount: int)
     # Generate pegout
     print("\nGenerating pegout UTXO...")
 
-    wallet_manager.generate_pegout(user, issuer_index, -1)
+    wallet_manager.generate_pegout(user, issuer_index, token.genesis)
     wallet_manager.save_wallet("./eth_bsv_wallet.json")
 
-    print(
-        f"\nPegout UTXO generated at: \n{wallet_manager.pegout_utxos[user][-1]}".replace(
-            "prev_", ""
-        )
-    )
+    print(f"\nPegout UTXO generated at: \n{token.pegout}".replace("prev_", ""))
 
     conditional_generate_block(wallet_manager.network)
 
     # Save data to file
     data = {
-        "genesis_txid": f"0x{wallet_manager.genesis_utxos[user][-1].prev_tx}",
-        "genesis_index": wallet_manager.genesis_utxos[user][-1].prev_index,
-        "pegout_txid": f"0x{wallet_manager.pegout_utxos[user][-1].prev_tx}",
-        "pegout_index": wallet_manager.pegout_utxos[user][-1].prev_index,
+        "genesis_txid": f"0x{token.genesis.prev_tx}",
+        "genesis_index": token.genesis.prev_index,
+        "pegout_txid": f"0x{token.pegout.prev_tx}",
+        "pegout_index": token.pegout.prev_index,
         "pegin_amount": pegin_amount,
     }
     with open("../evm/pegin_info.json", "w") as file:
@@ -273,12 +267,10 @@ def transfer(
 
     print(f"Transferring from {sender_name} to {receiver_name}")
     start = time.perf_counter()
-    wallet_manager.transfer_token(sender, receiver, token_index)
+    token = wallet_manager.transfer_token(sender, receiver, token_index)
     end = time.perf_counter()
     wallet_manager.save_wallet("./eth_bsv_wallet.json")
-    print(
-        f"Successfully transferred token in {wallet_manager.token_utxos[receiver][-1].prev_tx}"
-    )
+    print(f"Successfully transferred token in {token.tip.prev_tx}")
     print(f"\nElapsed time: {end - start} seconds")
 
     return
@@ -312,17 +304,18 @@ def update_headers(start_height, end_height, network):
 def burn(wallet_manager: WalletManager, user_name: str, token_index: int):
     user = map_user_to_index(user_name, wallet_manager)
 
-    txid_genesis = wallet_manager.genesis_utxos[user][token_index].prev_tx
+    token = wallet_manager.token(user, token_index)
+    txid_genesis = token.genesis.prev_tx
 
     print(f"\nBurning token generated at {txid_genesis}")
     start = time.perf_counter()
-    wallet_manager.burn_token(user, token_index)
+    wallet_manager.burn_token(user, token.genesis)
     end = time.perf_counter()
     wallet_manager.save_wallet("./eth_bsv_wallet.json")
 
     conditional_generate_block(wallet_manager.network)
 
-    txid_burn = wallet_manager.burnt_tokens[user][-1].burning_txid
+    txid_burn = token.burning_txid
     best_blockhash = wallet_manager.network.get_best_block_hash()
     best_blockheader = wallet_manager.network.get_block_header(best_blockhash)
     best_blockheight = best_blockheader.get("height")
@@ -439,6 +432,9 @@ def main():
         setup_demo(bsv_client)
     else:
         wallet_manager = WalletManager.load_wallet("./eth_bsv_wallet.json", bsv_client)
+        # Finish the operations left unfinished by a previous run, e.g., after a crash
+        for entry in wallet_manager.resume_operations():
+            print(f"Resumed {entry.kind} operation {entry.entry_id}")
         if args.command == "pegin":
             pegin(wallet_manager, args.user, args.pegin_amount)
         elif args.command == "transfer":
@@ -447,6 +443,8 @@ def main():
             burn(wallet_manager, args.user, args.token_index)
         elif args.command == "pegout":
             pegout(bsv_client)
+        # Remove the proofs no longer needed
+        wallet_manager.collect_proofs()
 
 
 if __name__ == "__main__":
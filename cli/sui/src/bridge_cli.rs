@@ -22,6 +22,14 @@ const BRIDGE_IDENTIFIER: &str = "tcpbridge";
 pub(crate) async fn add(
     client: SuiClient,
     new_bridge_entry: BridgeEntry,
+) -> Result<(), anyhow::Error> {
+    add_many(client, vec![new_bridge_entry]).await
+}
+
+/// Add all the bridge entries in a single programmable transaction, with one `add` call per entry
+pub(crate) async fn add_many(
+    client: SuiClient,
+    new_bridge_entries: Vec<BridgeEntry>,
 ) -> Result<(), anyhow::Error> {
     let (bridge_admin_ref, bridge_obj_arg, bridge_package_id) =
         crate::configs::bridge_config(&client, true).await;
@@ -31,37 +39,39 @@ pub(crate) async fn add(
     // Call add
     let mut builder = ProgrammableTransactionBuilder::new();
 
-    // Arguments
+    // Arguments shared by all the calls
     let bridge_admin = builder.obj(ObjectArg::ImmOrOwnedObject(bridge_admin_ref))?;
     let bridge = builder.obj(bridge_obj_arg)?;
 
-    let genesis_txid = builder.pure(hex::decode(new_bridge_entry.genesis_txid)?)?;
-    let genesis_index = builder.pure(new_bridge_entry.genesis_index)?;
-
-    let pegout_txid = builder.pure(hex::decode(new_bridge_entry.pegout_txid)?)?;
-    let pegout_index = builder.pure(new_bridge_entry.pegout_index)?;
-
     let clock = builder.obj(ObjectArg::SharedObject {
         id: SUI_CLOCK_OBJECT_ID,
         initial_shared_version: SUI_CLOCK_OBJECT_SHARED_VERSION,
         mutable: false,
     })?;
 
-    builder.programmable_move_call(
-        bridge_package_id,
-        Identifier::from_str(BRIDGE_IDENTIFIER)?,
-        Identifier::from_str("add")?,
-        vec![TypeTag::from_str(SUI_COIN_TYPE)?],
-        vec![
-            bridge_admin,
-            bridge,
-            genesis_txid,
-            genesis_index,
-            pegout_txid,
-            pegout_index,
-            clock,
-        ],
-    );
+    for new_bridge_entry in new_bridge_entries {
+        let genesis_txid = builder.pure(hex::decode(new_bridge_entry.genesis_txid)?)?;
+        let genesis_index = builder.pure(new_bridge_entry.genesis_index)?;
+
+        let pegout_txid = builder.pure(hex::decode(new_bridge_entry.pegout_txid)?)?;
+        let pegout_index = builder.pure(new_bridge_entry.pegout_index)?;
+
+        builder.programmable_move_call(
+            bridge_package_id,
+            Identifier::from_str(BRIDGE_IDENTIFIER)?,
+            Identifier::from_str("add")?,
+            vec![TypeTag::from_str(SUI_COIN_TYPE)?],
+            vec![
+                bridge_admin,
+                bridge,
+                genesis_txid,
+                genesis_index,
+                pegout_txid,
+                pegout_index,
+                clock,
+            ],
+        );
+    }
 
     // Execute the transaction
     let tx_kind =
@@ -16,6 +16,8 @@ pub enum Commands {
     UpdateChain,
     /// Add a new bridge entry
     AddBridgeEntry,
+    /// Add several bridge entries in a single transaction
+    AddBridgeEntries,
     /// Check if a couple (genesis, pegout) is valid for pegin
     IsValidForPegin,
     /// Check if a couple (genesis, pegout) is valid for pegout
@@ -45,6 +47,11 @@ pub struct BridgeEntry {
     pub pegout_index: u32,
 }
 
+#[derive(Clone, Deserialize)]
+pub struct BridgeEntries {
+    pub entries: Vec<BridgeEntry>,
+}
+
 #[derive(Clone, Deserialize)]
 pub struct ElapsedBridgeEntry {
     pub genesis_txid: String,
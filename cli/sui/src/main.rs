@@ -12,6 +12,7 @@ pub mod utils;
 
 const CONFIG_PATH_UPDATE_CHAIN: &str = "config_files/config_update_chain.toml";
 const CONFIG_PATH_ADD_BRIDGE_ENTRY: &str = "config_files/config_add_bridge_entry.toml";
+const CONFIG_PATH_ADD_BRIDGE_ENTRIES: &str = "config_files/config_add_bridge_entries.toml";
 const CONFIG_PATH_CHECK_BRIDGE_ENTRY: &str = "config_files/config_check_bridge_entry.toml";
 const CONFIG_PATH_DROP_ELAPSED: &str = "config_files/config_drop_elapsed.toml";
 const CONFIG_PATH_PEGIN: &str = "config_files/config_pegin.toml";
@@ -63,6 +64,12 @@ async fn main() -> Result<(), anyhow::Error> {
             )?)?;
             bridge_cli::add(client, bridge_entry).await?;
         }
+        cli::Commands::AddBridgeEntries => {
+            let bridge_entries = toml::from_str::<cli::BridgeEntries>(&std::fs::read_to_string(
+                format!("{config_file_path_as_str}/{CONFIG_PATH_ADD_BRIDGE_ENTRIES}"),
+            )?)?;
+            bridge_cli::add_many(client, bridge_entries.entries).await?;
+        }
         cli::Commands::IsValidForPegin => {
             let bridge_entry = toml::from_str::<cli::BridgeEntry>(&std::fs::read_to_string(
                 format!("{config_file_path_as_str}/{CONFIG_PATH_CHECK_BRIDGE_ENTRY}"),
@@ -25,6 +25,7 @@ OUTPUT_INDEX = 0
 # transaction size exceeds 128kB
 
 ADD_BRIDGE_ENTRY_COMMAND = "cargo run -- add-bridge-entry"
+ADD_BRIDGE_ENTRIES_COMMAND = "cargo run -- add-bridge-entries"
 PEGIN_COMMAND = "cargo run -- pegin"
 PEGOUT_COMMAND = "cargo run -- pegout"
 
@@ -78,7 +79,7 @@ def get_bulk_tx_data(txid: str, network: WoCInterface | RPCInterface):
 
 
 def map_user_to_index(user_name: str, wallet_manager: WalletManager) -> int:
-    return wallet_manager.names.index(user_name)
+    return wallet_manager.user_index(user_name)
 
 
 def conditional_generate_block(network: WoCInterface | RPCInterface):
@@ -197,7 +198,9 @@ def setup_for_regtest(network):
 
     network.generate_blocks(1)
 
-    wallet_manager = WalletManager.load_wallet("./sui_bsv_wallet.json", network)
+    wallet_manager = WalletManager.load_wallet(
+        "./sui_bsv_wallet.json", network, replace=True
+    )
 
     setup_wallets(wallet_manager, "./sui_bsv_wallet.json")
 
@@ -304,22 +307,20 @@ def pegin(wallet_manager: WalletManager, user_name: str, pegin_amount: int):
     # Generate genesis
     print("\nGenerating genesis transaction...")
 
-    wallet_manager.generate_genesis_for_pegin(user)
+    token = wallet_manager.generate_genesis_for_pegin(user)
     wallet_manager.save_wallet("./sui_bsv_wallet.json")
 
-    print(
-        f"\nGenesis transaction generated at: {wallet_manager.genesis_utxos[user][-1]}"
-    )
+    print(f"\nGenesis transaction generated at: {token.genesis}")
 
     conditional_generate_block(wallet_manager.network)
 
     # Generate pegout
     print("\nGenerating pegout UTXO...")
 
-    wallet_manager.generate_pegout(user, issuer_index, -1)
+    wallet_manager.generate_pegout(user, issuer_index, token.genesis)
     wallet_manager.save_wallet("./sui_bsv_wallet.json")
 
-    print(f"\nPegout UTXO generated at: {wallet_manager.pegout_utxos[user][-1]}")
+    print(f"\nPegout UTXO generated at: {token.pegout}")
 
     conditional_generate_block(wallet_manager.network)
 
@@ -327,10 +328,10 @@ def pegin(wallet_manager: WalletManager, user_name: str, pegin_amount: int):
     print("\nAdd bridge entry...")
 
     data = {
-        "genesis_txid": wallet_manager.genesis_utxos[user][-1].prev_tx,
-        "genesis_index": wallet_manager.genesis_utxos[user][-1].prev_index,
-        "pegout_txid": wallet_manager.pegout_utxos[user][-1].prev_tx,
-        "pegout_index": wallet_manager.pegout_utxos[user][-1].prev_index,
+        "genesis_txid": token.genesis.prev_tx,
+        "genesis_index": token.genesis.prev_index,
+        "pegout_txid": token.pegout.prev_tx,
+        "pegout_index": token.pegout.prev_index,
     }
     with open(
         str(Path(__file__).parent / "sui/config_files/config_add_bridge_entry.toml"),
@@ -355,16 +356,14 @@ def pegin(wallet_manager: WalletManager, user_name: str, pegin_amount: int):
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
     )
-    print(
-        f"Added bridge entry: \n\tgenesis: {wallet_manager.genesis_utxos[user][-1]}\n\tpegout: {wallet_manager.pegout_utxos[user][-1]}"
-    )
+    print(f"Added bridge entry: \n\tgenesis: {token.genesis}\n\tpegout: {token.pegout}")
 
     # Save data to file
     print("Pegin...")
 
     data = {
-        "genesis_txid": wallet_manager.genesis_utxos[user][-1].prev_tx,
-        "genesis_index": wallet_manager.genesis_utxos[user][-1].prev_index,
+        "genesis_txid": token.genesis.prev_tx,
+        "genesis_index": token.genesis.prev_index,
         "pegin_amount": pegin_amount,
     }
     with open(
@@ -384,9 +383,98 @@ def pegin(wallet_manager: WalletManager, user_name: str, pegin_amount: int):
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
     )
-    print(
-        f"\nSuccessfully pegged in for \n\tgenesis: {wallet_manager.genesis_utxos[user][-1]}"
+    print(f"\nSuccessfully pegged in for \n\tgenesis: {token.genesis}")
+
+    return
+
+
+def pegin_batch(
+    wallet_manager: WalletManager, user_name: str, pegin_amount: int, count: int
+):
+    user = map_user_to_index(user_name, wallet_manager)
+    issuer_index = map_user_to_index("issuer", wallet_manager)
+
+    # Generate geneses
+    print(f"\nGenerating {count} genesis transactions...")
+
+    tokens = wallet_manager.generate_genesis_batch(user, count)
+    wallet_manager.save_wallet("./sui_bsv_wallet.json")
+
+    for token in tokens:
+        print(f"\nGenesis transaction generated at: {token.genesis}")
+
+    conditional_generate_block(wallet_manager.network)
+
+    # Generate pegouts
+    print("\nGenerating pegout UTXOs...")
+
+    wallet_manager.generate_pegouts(issuer_index, [token.genesis for token in tokens])
+    wallet_manager.save_wallet("./sui_bsv_wallet.json")
+
+    for token in tokens:
+        print(f"\nPegout UTXO generated at: {token.pegout}")
+
+    conditional_generate_block(wallet_manager.network)
+
+    # Save data to file
+    print("\nAdd bridge entries...")
+
+    data = {
+        "entries": [
+            {
+                "genesis_txid": token.genesis.prev_tx,
+                "genesis_index": token.genesis.prev_index,
+                "pegout_txid": token.pegout.prev_tx,
+                "pegout_index": token.pegout.prev_index,
+            }
+            for token in tokens
+        ]
+    }
+    with open(
+        str(Path(__file__).parent / "sui/config_files/config_add_bridge_entries.toml"),
+        "w",
+    ) as file:
+        toml.dump(data, file)
+
+    # switch to admin to add bridge entries. This address should be the same as the address that is used to publish the bridge contract
+    admin_sui_address = get_sui_address(wallet_manager, "issuer")
+    run_sui_command(["client", "switch", "--address", f"{admin_sui_address}"])
+
+    # Add all bridge entries in a single transaction
+    subprocess.run(
+        f"cd {Path(__file__).parent / 'sui'} && {ADD_BRIDGE_ENTRIES_COMMAND}",
+        shell=True,
+        check=True,
+        text=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
     )
+    print(f"Added {len(tokens)} bridge entries")
+
+    user_sui_address = get_sui_address(wallet_manager, user_name)
+    run_sui_command(["client", "switch", "--address", f"{user_sui_address}"])
+
+    # Pegin
+    for token in tokens:
+        data = {
+            "genesis_txid": token.genesis.prev_tx,
+            "genesis_index": token.genesis.prev_index,
+            "pegin_amount": pegin_amount,
+        }
+        with open(
+            str(Path(__file__).parent / "sui/config_files/config_pegin.toml"), "w"
+        ) as file:
+            toml.dump(data, file)
+
+        subprocess.run(
+            f"cd {Path(__file__).parent / 'sui'} && {PEGIN_COMMAND}",
+            shell=True,
+            check=True,
+            text=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        print(f"\nSuccessfully pegged in for \n\tgenesis: {token.genesis}")
 
     return
 
@@ -431,7 +519,7 @@ def pegout_for_regtest(
     block_height: int,
 ):
     user = map_user_to_index(user_name, wallet_manager)
-    burnt_token = wallet_manager.burnt_tokens[user][token_index]
+    burnt_token = wallet_manager.burnt_token(user, token_index)
     burning_tx = tx_from_id(burnt_token.burning_txid, wallet_manager.network)
     merkle_proof = MerkleProof.get_merkle_proof(
         blockhash, burnt_token.burning_txid, wallet_manager.network
@@ -441,7 +529,11 @@ def pegout_for_regtest(
     print(f"\n{user_name} sui address: {sui_address}")
     print(f"{run_sui_command(['client', 'balance'])}")
 
-    run_pegout_command(burnt_token.genesis_txid, burning_tx, block_height, merkle_proof)
+    run_pegout_command(
+        burnt_token.genesis.prev_tx, burning_tx, block_height, merkle_proof
+    )
+    wallet_manager.peg_out(user, burnt_token.genesis)
+    wallet_manager.save_wallet("./sui_bsv_wallet.json")
 
     print(f"\n{user_name} sui address: {sui_address}")
     print(f"{run_sui_command(['client', 'balance'])}")
@@ -451,7 +543,7 @@ def pegout_for_regtest(
 
 def pegout(wallet_manager: WalletManager, user_name: str, token_index: int):
     user = map_user_to_index(user_name, wallet_manager)
-    burnt_token = wallet_manager.burnt_tokens[user][token_index]
+    burnt_token = wallet_manager.burnt_token(user, token_index)
     burning_tx = tx_from_id(burnt_token.burning_txid, wallet_manager.network)
     bulk_tx_data = get_bulk_tx_data(
         burnt_token.burning_txid, wallet_manager.network
@@ -461,7 +553,11 @@ def pegout(wallet_manager: WalletManager, user_name: str, token_index: int):
         bulk_tx_data[0]["blockhash"], burnt_token.burning_txid, wallet_manager.network
     )
 
-    run_pegout_command(burnt_token.genesis_txid, burning_tx, block_height, merkle_proof)
+    run_pegout_command(
+        burnt_token.genesis.prev_tx, burning_tx, block_height, merkle_proof
+    )
+    wallet_manager.peg_out(user, burnt_token.genesis)
+    wallet_manager.save_wallet("./sui_bsv_wallet.json")
 
     return
 
@@ -476,11 +572,9 @@ def transfer(
     receiver = map_user_to_index(receiver_name, wallet_manager)
 
     print(f"Transferring from {sender_name} to {receiver_name}")
-    wallet_manager.transfer_token(sender, receiver, token_index)
+    token = wallet_manager.transfer_token(sender, receiver, token_index)
     wallet_manager.save_wallet("./sui_bsv_wallet.json")
-    print(
-        f"Successfully transferred token in {wallet_manager.token_utxos[receiver][-1].prev_tx}"
-    )
+    print(f"Successfully transferred token in {token.tip.prev_tx}")
 
     return
 
@@ -488,11 +582,10 @@ def transfer(
 def burn(wallet_manager: WalletManager, user_name: str, token_index: int):
     user = map_user_to_index(user_name, wallet_manager)
 
-    print(
-        f"\nBurning token generated at {wallet_manager.genesis_utxos[user][token_index].prev_tx}"
-    )
+    token = wallet_manager.token(user, token_index)
+    print(f"\nBurning token generated at {token.genesis.prev_tx}")
 
-    wallet_manager.burn_token(user, token_index)
+    wallet_manager.burn_token(user, token.genesis)
     wallet_manager.save_wallet("./sui_bsv_wallet.json")
 
     conditional_generate_block(wallet_manager.network)
@@ -504,7 +597,7 @@ def burn(wallet_manager: WalletManager, user_name: str, token_index: int):
     save_info("burn_blockheight", blockheight)
 
     print(
-        f"\nToken successfully burned at transaction {wallet_manager.burnt_tokens[user][-1].burning_txid} \nblock height {blockheight} \nblock hash {blockhash}"
+        f"\nToken successfully burned at transaction {token.burning_txid} \nblock height {blockheight} \nblock hash {blockhash}"
     )
 
     return
@@ -552,6 +645,23 @@ def main():
     )
     pegin_parser.add_argument("--network", type=str, required=True, help="The network")
 
+    # Batch pegin command
+    pegin_batch_parser = subparsers.add_parser(
+        "pegin-batch", help="Peg in several tokens with a single fan-out transaction"
+    )
+    pegin_batch_parser.add_argument(
+        "--user", type=str, required=True, help="The user name"
+    )
+    pegin_batch_parser.add_argument(
+        "--pegin-amount", type=int, required=True, help="The pegin amount of each token"
+    )
+    pegin_batch_parser.add_argument(
+        "--count", type=int, required=True, help="The number of tokens"
+    )
+    pegin_batch_parser.add_argument(
+        "--network", type=str, required=True, help="The network"
+    )
+
     # Pegout command
     pegout_parser = subparsers.add_parser("pegout", help="Execute the pegout command")
     pegout_parser.add_argument("--user", type=str, required=True, help="The user name")
@@ -611,8 +721,13 @@ def main():
     else:
         # setup should be skipped if not in regtest, in which case wallet.json must be populated before calling the commands below.
         wallet_manager = WalletManager.load_wallet("./sui_bsv_wallet.json", network)
+        # Finish the operations left unfinished by a previous run, e.g., after a crash
+        for entry in wallet_manager.resume_operations():
+            print(f"Resumed {entry.kind} operation {entry.entry_id}")
         if args.command == "pegin":
             pegin(wallet_manager, args.user, args.pegin_amount)
+        elif args.command == "pegin-batch":
+            pegin_batch(wallet_manager, args.user, args.pegin_amount, args.count)
         elif args.command == "pegout":
             if args.update:
                 genesis_height = read_info("genesis_height")
@@ -633,6 +748,8 @@ def main():
             genesis_height = read_info("genesis_height")
             update_oracle(genesis_height, args.network)
         wallet_manager.save_wallet("./sui_bsv_wallet.json")
+        # Remove the proofs no longer needed
+        wallet_manager.collect_proofs()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules are imported as `bsv.*`, as when running the demos from `cli`
+sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -0,0 +1,73 @@
+import pytest
+
+from bsv.records import Outpoint
+from bsv.tokens import (
+    BURNT,
+    GENESIS,
+    PEGGED_IN,
+    PEGGED_OUT,
+    TRANSFERRED,
+    TokenRecord,
+)
+
+GENESIS_OUTPOINT = Outpoint("01" * 32, 0)
+
+
+def test_new_token_is_held_at_genesis():
+    token = TokenRecord(GENESIS_OUTPOINT, "proof")
+    assert token.state == GENESIS
+    assert token.held
+    assert token.tip == GENESIS_OUTPOINT
+
+
+def test_lifecycle():
+    token = TokenRecord(GENESIS_OUTPOINT, "proof")
+    for state in (PEGGED_IN, TRANSFERRED, TRANSFERRED, BURNT):
+        token.advance(state)
+        assert token.state == state
+    assert not token.held
+    token.advance(PEGGED_OUT)
+    assert token.state == PEGGED_OUT
+
+
+def test_burn_without_transfer():
+    token = TokenRecord(GENESIS_OUTPOINT, "proof", state=PEGGED_IN)
+    token.advance(BURNT)
+    assert token.state == BURNT
+
+
+@pytest.mark.parametrize(
+    "state, target",
+    [
+        (GENESIS, TRANSFERRED),
+        (GENESIS, BURNT),
+        (PEGGED_IN, PEGGED_OUT),
+        (TRANSFERRED, PEGGED_IN),
+        (BURNT, TRANSFERRED),
+        (PEGGED_OUT, BURNT),
+    ],
+)
+def test_forbidden_transitions(state, target):
+    token = TokenRecord(GENESIS_OUTPOINT, "proof", state=state)
+    with pytest.raises(AssertionError):
+        token.advance(target)
+    assert token.state == state
+
+
+def test_unknown_state():
+    with pytest.raises(AssertionError):
+        TokenRecord(GENESIS_OUTPOINT, "proof", state="lost")
+
+
+def test_dict_round_trip():
+    token = TokenRecord(
+        GENESIS_OUTPOINT,
+        "proof",
+        tip=Outpoint("02" * 32, 1),
+        pegout=Outpoint("03" * 32, 1),
+        state=BURNT,
+        burning_txid="04" * 32,
+    )
+    restored = TokenRecord.from_dict(token.to_dict())
+    assert restored.to_dict() == token.to_dict()
+    assert restored.tip == token.tip and restored.pegout == token.pegout
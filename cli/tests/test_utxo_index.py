@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from bsv.utxo_index import (
+    InsufficientFundsError,
+    Utxo,
+    UtxoIndex,
+    _knapsack,
+)
+
+
+def utxo(n: int, amount: int, ancestors: int = 0) -> Utxo:
+    """A UTXO with txid `n` repeated, and `ancestors` unconfirmed ancestors."""
+    return Utxo(
+        f"{n:02x}" * 32,
+        0,
+        amount,
+        ancestors={f"{n:02x}{i:062x}" for i in range(ancestors)},
+    )
+
+
+def amounts(utxos: list[Utxo]) -> list[int]:
+    return sorted(utxo.amount for utxo in utxos)
+
+
+def test_select_exact_match():
+    index = UtxoIndex([utxo(1, 100), utxo(2, 300), utxo(3, 500), utxo(4, 750)])
+    # 300 + 500 is the only selection paying the target without change
+    assert amounts(index.select(800)) == [300, 500]
+
+
+def test_select_exact_match_within_cost_of_change():
+    index = UtxoIndex([utxo(1, 250), utxo(2, 1000)])
+    assert amounts(index.select(240, cost_of_change=20)) == [250]
+
+
+def test_select_exact_match_with_fees():
+    index = UtxoIndex([utxo(1, 110), utxo(2, 210), utxo(3, 1000)])
+    # The effective values are 100 and 200
+    assert amounts(index.select(300, fee_per_input=10)) == [110, 210]
+
+
+def test_select_with_change():
+    index = UtxoIndex([utxo(1, 400), utxo(2, 700), utxo(3, 1100)])
+    selected = index.select(1000, rng=random.Random(0))
+    assert sum(amounts(selected)) > 1000
+    # Without an exact match, the knapsack solver keeps the excess small
+    assert amounts(selected) == [1100]
+
+
+def test_knapsack_smallest_excess():
+    candidates = [(value, utxo(i, value)) for i, value in enumerate([900, 60, 50, 45])]
+    assert amounts(_knapsack(candidates, 100, random.Random(0))) == [45, 60]
+
+
+def test_knapsack_larger_candidate():
+    candidates = [(value, utxo(i, value)) for i, value in enumerate([900, 300, 20, 10])]
+    # The small candidates cannot pay the target, so the smallest one covering it is used
+    assert amounts(_knapsack(candidates, 100, random.Random(0))) == [300]
+
+
+def test_select_insufficient_funds():
+    index = UtxoIndex([utxo(1, 100), utxo(2, 200)])
+    with pytest.raises(InsufficientFundsError):
+        index.select(301)
+    with pytest.raises(InsufficientFundsError):
+        # The fees leave 280
+        index.select(290, fee_per_input=10)
+
+
+def test_select_excluded():
+    utxos = [utxo(1, 100), utxo(2, 200)]
+    index = UtxoIndex(utxos)
+    assert amounts(index.select(100, exclude={utxos[0].key})) == [200]
+    with pytest.raises(InsufficientFundsError):
+        index.select(250, exclude={utxos[1].key})
+
+
+def test_select_ancestor_limit():
+    index = UtxoIndex([utxo(1, 100, ancestors=3), utxo(2, 300, ancestors=1)])
+    assert amounts(index.select(100)) == [100]
+    assert amounts(index.select(100, max_ancestors=3)) == [300]
+    with pytest.raises(InsufficientFundsError):
+        index.select(100, max_ancestors=1)
+
+
+def test_select_single():
+    index = UtxoIndex([utxo(1, 100), utxo(2, 300, ancestors=5), utxo(3, 500)])
+    assert index.select_single(150).amount == 300
+    assert index.select_single(150, max_ancestors=5).amount == 500
+    with pytest.raises(InsufficientFundsError):
+        index.select_single(150, max_amount=400, max_ancestors=5)
+
+
+def test_add_remove():
+    index = UtxoIndex([utxo(1, 300), utxo(2, 100)])
+    assert [u.amount for u in index] == [100, 300]
+    removed = index.remove("01" * 32, 0)
+    assert removed.amount == 300
+    assert removed.key not in index
+    assert len(index) == 1 and index.total() == 100
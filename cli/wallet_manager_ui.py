@@ -8,24 +8,28 @@ from bsv.wallet import WalletManager
 from bsv.utils import setup_network_connection
 
 
-def display_wallet_info(wallet_manager: WalletManager):
+def display_wallet_info(wallet_manager: WalletManager, user: str | None = None):
     print("=" * 50)
     print("Wallet Manager Overview")
     print("=" * 50)
 
-    for index, user_name in enumerate(wallet_manager.names):
+    # Only the displayed users are decoded and read from the wallet store
+    indices = (
+        [wallet_manager.user_index(user)]
+        if user is not None
+        else range(len(wallet_manager.names))
+    )
+    for index in indices:
+        user_name = wallet_manager.names[index]
         print(f"User: {user_name}")
         print(f"  BSV Address: {wallet_manager.bsv_wallets[index].get_address()}")
         print(f"  Source Address: {wallet_manager.source_addresses[index].hex()}")
-        print("  Genesis UTXOs:")
-        for utxo in wallet_manager.genesis_utxos[index]:
-            print(f"    - {utxo}")
-        print("  Token UTXOs:")
-        for utxo in wallet_manager.token_utxos[index]:
-            print(f"    - {utxo}")
+        print("  Tokens:")
+        for token in wallet_manager.tokens.tokens(index):
+            print(f"    - {token}")
         print("  Burnt tokens:")
-        for burnt_token in wallet_manager.burnt_tokens[index]:
-            print(f"    - {burnt_token}")
+        for token in wallet_manager.tokens.burnt(index):
+            print(f"    - Genesis: {token.genesis}, Burning tx: {token.burning_txid}")
         print("-" * 50)
 
 
@@ -42,6 +46,10 @@ if __name__ == "__main__":
         choices=["sui", "eth"],
         help="Specify the source blockchain: eth or sui",
     )
+    parser.add_argument(
+        "--user",
+        help="Only display the wallet of this user.",
+    )
 
     # Parse args
     args = parser.parse_args()
@@ -62,7 +70,7 @@ if __name__ == "__main__":
                 wallet_manager = WalletManager.load_wallet(
                     "./eth_bsv_wallet.json", network
                 )
-            display_wallet_info(wallet_manager)
+            display_wallet_info(wallet_manager, args.user)
         elif choice == "2":
             print("Exiting...")
             break
@@ -1,10 +1,14 @@
 use clap::{Parser, Subcommand};
 
 pub mod pob_engine;
+pub mod prover_service;
 pub mod tcp_engine;
 pub mod utils;
 
-use pob_engine::pob::{prove, setup, verify};
+use pob_engine::pob::{
+    POB_PROOF, POB_PROVING_DATA, POB_PUBLIC_INPUT, ProofFiles, prove, setup, verify,
+};
+use prover_service::ProverService;
 use tcp_engine::{
     data_structures::{
         proving_data::ProvingData as ProvingDataTCP, setup_data::SetupData as SetupDataTCP,
@@ -34,6 +38,12 @@ enum Commands {
         #[command(subcommand)]
         subcommand: PobEngineCommands,
     },
+    /// Keep the TCP and PoB keys in memory and serve prove/verify jobs over a Unix socket
+    Serve {
+        /// Path of the Unix socket to listen on
+        #[arg(long, default_value = "data/prover.sock")]
+        socket: String,
+    },
 }
 
 #[derive(Subcommand)]
@@ -41,9 +51,20 @@ enum TcpEngineCommands {
     /// Setup the TCP engine
     Setup,
     /// Prove using the TCP engine
-    Prove,
+    Prove {
+        /// Path of the proving data
+        #[arg(long, default_value = "data/tcp_engine/configs/prove.toml")]
+        config: String,
+        /// Path the proof is saved to. Defaults to `data/tcp_engine/proofs/<proof_name>.bin`
+        #[arg(long)]
+        proof: Option<String>,
+    },
     /// Verify using the TCP engine
-    Verify,
+    Verify {
+        /// Path of the verifying data
+        #[arg(long, default_value = "data/tcp_engine/configs/verify.toml")]
+        config: String,
+    },
 }
 
 #[derive(Subcommand)]
@@ -51,9 +72,29 @@ enum PobEngineCommands {
     /// Setup the POB engine
     Setup,
     /// Prove using the POB engine
-    Prove,
+    Prove {
+        /// Path of the proving data
+        #[arg(long, default_value = POB_PROVING_DATA)]
+        config: String,
+        /// Path the proof is saved to
+        #[arg(long, default_value = POB_PROOF)]
+        proof: String,
+        /// Path the public input is saved to
+        #[arg(long, default_value = POB_PUBLIC_INPUT)]
+        public_input: String,
+        /// Path the inverse of the Miller loop output is saved to, for the unlocking script
+        #[arg(long)]
+        prepared: Option<String>,
+    },
     /// Verify using the POB engine
-    Verify,
+    Verify {
+        /// Path of the proof
+        #[arg(long, default_value = POB_PROOF)]
+        proof: String,
+        /// Path of the public input
+        #[arg(long, default_value = POB_PUBLIC_INPUT)]
+        public_input: String,
+    },
 }
 
 fn main() {
@@ -82,18 +123,16 @@ fn main() {
 
                 println!("Setup complete.")
             }
-            TcpEngineCommands::Prove => {
+            TcpEngineCommands::Prove { config, proof } => {
                 println!("Proving using the TCP engine...");
 
-                let proving_data =
-                    ProvingDataTCP::load("data/tcp_engine/configs/prove.toml".to_string()).unwrap();
-                <UniversalTCPSnark as TCPSystem>::prove(proving_data).unwrap();
+                let proving_data = ProvingDataTCP::load(config).unwrap();
+                <UniversalTCPSnark as TCPSystem>::prove(proving_data, proof).unwrap();
             }
-            TcpEngineCommands::Verify => {
+            TcpEngineCommands::Verify { config } => {
                 println!("Verifying using the TCP engine...");
 
-                let verifying_data =
-                    VerifyingDataTCP::load("data/tcp_engine/configs/verify.toml".to_string()).unwrap();
+                let verifying_data = VerifyingDataTCP::load(config).unwrap();
                 assert!(
                     <UniversalTCPSnark as TCPSystem>::verify(verifying_data).unwrap(),
                     "\nProof not valid.\n"
@@ -108,15 +147,44 @@ fn main() {
 
                 println!("Setup complete.")
             }
-            PobEngineCommands::Prove => {
+            PobEngineCommands::Prove {
+                config,
+                proof,
+                public_input,
+                prepared,
+            } => {
                 println!("Proving using the POB engine...");
-                prove();
+                prove(
+                    &config,
+                    &ProofFiles {
+                        proof,
+                        public_input,
+                        prepared,
+                    },
+                );
             }
-            PobEngineCommands::Verify => {
+            PobEngineCommands::Verify {
+                proof,
+                public_input,
+            } => {
                 println!("Verifying using the POB engine...");
-                assert!(verify(), "\nProof not valid.\n");
+                assert!(
+                    verify(&ProofFiles {
+                        proof,
+                        public_input,
+                        prepared: None,
+                    }),
+                    "\nProof not valid.\n"
+                );
                 println!("\nValid proof.\n")
             }
         },
+        Commands::Serve { socket } => {
+            println!("Loading TCP and PoB keys...");
+            let service = ProverService::load().unwrap();
+
+            println!("Serving prover jobs on {}", socket);
+            service.serve(&socket).unwrap();
+        }
     }
 }
@@ -19,10 +19,11 @@ use rand_chacha::ChaChaRng;
 
 use std::io::Cursor;
 
-use anyhow::anyhow;
+use anyhow::{Result, anyhow};
 use ark_crypto_primitives::SNARK;
-use ark_ff::PrimeField;
-use ark_groth16::{Proof, ProvingKey, VerifyingKey};
+use ark_ec::{PairingEngine, ProjectiveCurve};
+use ark_ff::{Field, PrimeField};
+use ark_groth16::{Proof, ProvingKey, VerifyingKey, prepare_inputs, prepare_verifying_key};
 use ark_pcd::variable_length_crh::pedersen::VariableLengthPedersenParameters;
 use ark_serialize::CanonicalDeserialize;
 use bitcoin_r1cs::bitcoin_predicates::data_structures::proof::BitcoinProof;
@@ -78,35 +79,87 @@ pub type PoB = ProofOfBurn<ScalarFieldMNT4, ScalarFieldMNT6, PCDGroth16, Config>
 const TCP_SYSTEM_KEYS: &str = "data/tcp_engine/keys/";
 const TCP_SYSTEM_PROOFS: &str = "data/tcp_engine/proofs/";
 const POB_SYSTEM_KEYS: &str = "data/pob_engine/keys/";
-const POB_SYSTEM_PROOFS: &str = "data/pob_engine/proofs/";
 const POB_DATA: &str = "data/pob_engine/configs/";
 
-fn generate_pob_predicate() -> PoB {
+/// Default location of the proving data
+pub const POB_PROVING_DATA: &str = "data/pob_engine/configs/prove.toml";
+/// Default location of the proof of burn
+pub const POB_PROOF: &str = "data/pob_engine/proofs/proof_of_burn.bin";
+/// Default location of the public input of the proof of burn
+pub const POB_PUBLIC_INPUT: &str = "data/pob_engine/proofs/input_proof_of_burn.bin";
+
+/// Location of the files written by [prove_with_pk] and read by [verify_with_vk]
+pub struct ProofFiles {
+    pub proof: String,
+    pub public_input: String,
+    /// If set, [prove_with_pk] also saves the output of [inverse_miller_output] here
+    pub prepared: Option<String>,
+}
+
+impl Default for ProofFiles {
+    fn default() -> Self {
+        Self {
+            proof: POB_PROOF.to_string(),
+            public_input: POB_PUBLIC_INPUT.to_string(),
+            prepared: None,
+        }
+    }
+}
+
+/// Parameters of the TCP system required to instantiate the PoB predicate
+pub struct PredicateParameters {
+    pub crh_pp: VariableLengthPedersenParameters,
+    pub help_vk: VerifyingKey<MNT6_753>,
+    pub index: usize,
+}
+
+/// Load the parameters required to instantiate the PoB predicate
+pub fn load_predicate_parameters() -> Result<PredicateParameters> {
     // Load the key of the TCP System
     let crh_pp_seed_bytes = read_from_file(&(TCP_SYSTEM_KEYS.to_owned() + "crh_pp_seed.bin"))
-        .map_err(|e| anyhow!("Failed to read crh_pp. Error: {}", e))
-        .unwrap();
+        .map_err(|e| anyhow!("Failed to read crh_pp. Error: {}", e))?;
     let help_vk_bytes = read_from_file(&(TCP_SYSTEM_KEYS.to_owned() + "help_vk.bin"))
-        .map_err(|e: std::io::Error| anyhow!("Failed to read help_vk. Error: {}", e))
-        .unwrap();
+        .map_err(|e: std::io::Error| anyhow!("Failed to read help_vk. Error: {}", e))?;
 
     let crh_pp = VariableLengthPedersenParameters {
         seed: crh_pp_seed_bytes,
     };
     let help_vk = VerifyingKey::<MNT6_753>::deserialize_unchecked(help_vk_bytes.as_slice())
-        .map_err(|e| anyhow!("Failed to deserialize help_vk. Error: {}", e))
-        .unwrap();
+        .map_err(|e| anyhow!("Failed to deserialize help_vk. Error: {}", e))?;
 
     // Setup data
-    let setup_data = SetupData::load(POB_DATA.to_owned() + "setup.toml").unwrap();
+    let setup_data = SetupData::load(POB_DATA.to_owned() + "setup.toml")?;
 
-    // PoB
-    PoB::new(&crh_pp, &help_vk, setup_data.index)
+    Ok(PredicateParameters {
+        crh_pp,
+        help_vk,
+        index: setup_data.index,
+    })
+}
+
+fn generate_pob_predicate(parameters: &PredicateParameters) -> PoB {
+    PoB::new(&parameters.crh_pp, &parameters.help_vk, parameters.index)
+}
+
+/// Load the proving key of the PoB system
+pub fn load_pk() -> Result<ProvingKey<MNT4_753>> {
+    let pk_serialised = read_from_file(&(POB_SYSTEM_KEYS.to_owned() + "pk.bin"))
+        .map_err(|e: std::io::Error| anyhow!("Failed to read pk. Error: {}", e))?;
+    ProvingKey::<MNT4_753>::deserialize_unchecked(pk_serialised.as_slice())
+        .map_err(|e| anyhow!("Failed to deserialize pk. Error: {}", e))
+}
+
+/// Load the verifying key of the PoB system
+pub fn load_vk() -> Result<VerifyingKey<MNT4_753>> {
+    let vk_serialised = read_from_file(&(POB_SYSTEM_KEYS.to_owned() + "vk.bin"))
+        .map_err(|e: std::io::Error| anyhow!("Failed to read vk. Error: {}", e))?;
+    VerifyingKey::<MNT4_753>::deserialize_unchecked(vk_serialised.as_slice())
+        .map_err(|e| anyhow!("Failed to deserialize vk. Error: {}", e))
 }
 
 pub fn setup() {
     // PoB
-    let pob = generate_pob_predicate();
+    let pob = generate_pob_predicate(&load_predicate_parameters().unwrap());
 
     // Dummy RefTx
     let dummy_reftx = RefTxCircuit::<PoB, ScalarFieldMNT4, Config> {
@@ -138,30 +191,41 @@ pub fn setup() {
     .unwrap();
 }
 
-pub fn prove() {
-    let proving_data = ProvingData::load(&(POB_DATA.to_owned() + "prove.toml")).unwrap();
+pub fn prove(config_path: &str, files: &ProofFiles) {
+    let parameters = load_predicate_parameters().unwrap();
+    let pk = load_pk().unwrap();
+    let proving_data = ProvingData::load(config_path).unwrap();
+    prove_with_pk(&parameters, &pk, proving_data, files).unwrap();
+}
+
+/// Generate a proof of burn for `proving_data` with the already loaded `parameters` and `pk`
+pub fn prove_with_pk(
+    parameters: &PredicateParameters,
+    pk: &ProvingKey<MNT4_753>,
+    proving_data: ProvingData,
+    files: &ProofFiles,
+) -> Result<()> {
     let genesis_txid =
         FieldArray::<1, ScalarFieldMNT4, Config>::new([ScalarFieldMNT4::from_le_bytes_mod_order(
-            &Hash256::decode(&proving_data.genesis_txid).unwrap().0,
+            &Hash256::decode(&proving_data.genesis_txid)
+                .map_err(|e| anyhow!("Failed to decode genesis txid. Error: {}", e))?
+                .0,
         )]);
     let spending_tx = Tx::read(&mut Cursor::new(
         hex::decode(proving_data.spending_tx)
-            .map_err(|e| anyhow!("Failed to hex decode witness tx. Error: {}", e))
-            .unwrap(),
+            .map_err(|e| anyhow!("Failed to hex decode witness tx. Error: {}", e))?,
     ))
-    .map_err(|e| anyhow!("Failed to read witness tx. Error: {}", e))
-    .unwrap();
+    .map_err(|e| anyhow!("Failed to read witness tx. Error: {}", e))?;
     let tcp_proof = Proof::<MNT6_753>::deserialize_unchecked(Cursor::new(
         read_from_file(
             &(TCP_SYSTEM_PROOFS.to_owned() + &format!("{}.bin", proving_data.tcp_proof_name)),
         )
-        .map_err(|e| anyhow!("Failed to read prior proof. Error: {}", e))
-        .unwrap(),
+        .map_err(|e| anyhow!("Failed to read prior proof. Error: {}", e))?,
     ))
-    .unwrap();
+    .map_err(|e| anyhow!("Failed to deserialize prior proof. Error: {}", e))?;
 
     // PoB
-    let pob = generate_pob_predicate();
+    let pob = generate_pob_predicate(parameters);
 
     // Tag
     let tag = TransactionIntegrityScheme::<Config>::commit(
@@ -184,59 +248,88 @@ pub fn prove() {
         predicate: pob,
     };
 
-    // Load key of RefTx
-    let pk_serialised = read_from_file(&(POB_SYSTEM_KEYS.to_owned() + "pk.bin"))
-        .map_err(|e: std::io::Error| anyhow!("Failed to read pk. Error: {}", e))
-        .unwrap();
-    let pk = ProvingKey::<MNT4_753>::deserialize_unchecked(pk_serialised.as_slice())
-        .map_err(|e| anyhow!("Failed to deserialize pk. Error: {}", e))
-        .unwrap();
-
     // Save the public input
+    let public_input = reftx.public_input();
     save_to_file(
-        data_to_serialisation(&reftx.public_input()).as_slice(),
-        &(POB_SYSTEM_PROOFS.to_owned() + "input_proof_of_burn.bin"),
+        data_to_serialisation(&public_input).as_slice(),
+        &files.public_input,
     )
-    .unwrap();
+    .map_err(|e| anyhow!("Failed to save public input. Error: {}", e))?;
 
     // Proof
     let mut rng = ChaChaRng::from_entropy();
-    let proof = Groth16::<MNT4_753>::prove(&pk, reftx, &mut rng).unwrap();
+    let proof = Groth16::<MNT4_753>::prove(pk, reftx, &mut rng)
+        .map_err(|e| anyhow!("Failed to generate proof. Error: {:?}", e))?;
 
     // Save the proof
-    save_to_file(
-        &data_to_serialisation(&proof),
-        &(POB_SYSTEM_PROOFS.to_owned() + "proof_of_burn.bin"),
-    )
-    .unwrap();
+    save_to_file(&data_to_serialisation(&proof), &files.proof)
+        .map_err(|e| anyhow!("Failed to save proof. Error: {}", e))?;
+
+    // Save the data required by the unlocking script of the PoB UTXO
+    if let Some(prepared) = &files.prepared {
+        save_to_file(
+            &data_to_serialisation(&inverse_miller_output(&pk.vk, &public_input, &proof)?),
+            prepared,
+        )
+        .map_err(|e| anyhow!("Failed to save prepared proof. Error: {}", e))?;
+    }
+
+    Ok(())
 }
 
-pub fn verify() -> bool {
-    // Load vk of RefTx
-    let vk_serialised = read_from_file(&(POB_SYSTEM_KEYS.to_owned() + "vk.bin"))
-        .map_err(|e: std::io::Error| anyhow!("Failed to read vk. Error: {}", e))
-        .unwrap();
-    let vk = VerifyingKey::<MNT4_753>::deserialize_unchecked(vk_serialised.as_slice())
-        .map_err(|e| anyhow!("Failed to deserialize vk. Error: {}", e))
-        .unwrap();
+/// Compute the inverse of the Miller loop
+///     miller_loop([(A, B), (prepared_inputs, -gamma), (C, -delta)])
+/// which the unlocking script of the PoB UTXO passes to the verifier to skip the inversion in the final
+/// exponentiation. Fails if the proof does not verify.
+pub fn inverse_miller_output(
+    vk: &VerifyingKey<MNT4_753>,
+    public_input: &[ScalarFieldMNT4],
+    proof: &Proof<MNT4_753>,
+) -> Result<<MNT4_753 as PairingEngine>::Fqk> {
+    let pvk = prepare_verifying_key(vk);
+    let prepared_inputs = prepare_inputs(&pvk, public_input)
+        .map_err(|e| anyhow!("Failed to prepare public input. Error: {:?}", e))?;
+
+    let miller_output = MNT4_753::miller_loop(
+        [
+            (proof.a.into(), proof.b.into()),
+            (
+                prepared_inputs.into_affine().into(),
+                pvk.gamma_g2_neg_pc.clone(),
+            ),
+            (proof.c.into(), pvk.delta_g2_neg_pc.clone()),
+        ]
+        .iter(),
+    );
+    if MNT4_753::final_exponentiation(&miller_output) != Some(pvk.alpha_g1_beta_g2) {
+        return Err(anyhow!("Proof of burn not valid"));
+    }
+
+    miller_output
+        .inverse()
+        .ok_or_else(|| anyhow!("Miller loop output is not invertible"))
+}
+
+pub fn verify(files: &ProofFiles) -> bool {
+    let vk = load_vk().unwrap();
+    verify_with_vk(&vk, files).unwrap()
+}
 
+/// Verify the proof of burn stored in `files` with the already loaded `vk`
+pub fn verify_with_vk(vk: &VerifyingKey<MNT4_753>, files: &ProofFiles) -> Result<bool> {
     // Load the public input
-    let public_input_serialised =
-        read_from_file(&(POB_SYSTEM_PROOFS.to_owned() + "input_proof_of_burn.bin"))
-            .map_err(|e: std::io::Error| anyhow!("Failed to read public input. Error: {}", e))
-            .unwrap();
+    let public_input_serialised = read_from_file(&files.public_input)
+        .map_err(|e: std::io::Error| anyhow!("Failed to read public input. Error: {}", e))?;
     let public_input =
         Vec::<ScalarFieldMNT4>::deserialize_unchecked(public_input_serialised.as_slice())
-            .map_err(|e| anyhow!("Failed to deserialize public input. Error: {}", e))
-            .unwrap();
+            .map_err(|e| anyhow!("Failed to deserialize public input. Error: {}", e))?;
 
     // Load the proof
-    let proof_serialised = read_from_file(&(POB_SYSTEM_PROOFS.to_owned() + "proof_of_burn.bin"))
-        .map_err(|e: std::io::Error| anyhow!("Failed to read proof. Error: {}", e))
-        .unwrap();
+    let proof_serialised = read_from_file(&files.proof)
+        .map_err(|e: std::io::Error| anyhow!("Failed to read proof. Error: {}", e))?;
     let proof = Proof::<MNT4_753>::deserialize_unchecked(proof_serialised.as_slice())
-        .map_err(|e| anyhow!("Failed to deserialize proof. Error: {}", e))
-        .unwrap();
+        .map_err(|e| anyhow!("Failed to deserialize proof. Error: {}", e))?;
 
-    Groth16::<MNT4_753>::verify(&vk, &public_input, &proof).unwrap()
+    Groth16::<MNT4_753>::verify(vk, &public_input, &proof)
+        .map_err(|e| anyhow!("Failed to verify the proof. Error: {:?}", e))
 }
@@ -0,0 +1,203 @@
+use std::fs;
+use std::io::{BufRead, BufReader, Write};
+use std::os::unix::net::{UnixListener, UnixStream};
+use std::path::Path;
+use std::sync::Arc;
+use std::thread;
+
+use anyhow::{Result, anyhow};
+use ark_groth16::{ProvingKey, VerifyingKey};
+use ark_mnt4_753::MNT4_753;
+use serde::{Deserialize, Serialize};
+
+use crate::pob_engine::pob::{self, POB_PROVING_DATA, PredicateParameters, ProofFiles};
+use crate::pob_engine::proving_data::ProvingData as ProvingDataPoB;
+use crate::tcp_engine::{
+    data_structures::{
+        proving_data::ProvingData as ProvingDataTCP,
+        verifying_data::VerifyingData as VerifyingDataTCP,
+    },
+    tcp_system::{TCPSystem, groth16_tcp::UniversalTCPSnark},
+};
+
+const TCP_PROVING_DATA: &str = "data/tcp_engine/configs/prove.toml";
+const TCP_VERIFYING_DATA: &str = "data/tcp_engine/configs/verify.toml";
+
+/// Engine a job is addressed to
+#[derive(Deserialize)]
+#[serde(rename_all = "kebab-case")]
+pub enum Engine {
+    TcpEngine,
+    PobEngine,
+}
+
+/// Operation requested by a job
+#[derive(Deserialize)]
+#[serde(rename_all = "lowercase")]
+pub enum Operation {
+    Prove,
+    Verify,
+}
+
+/// A job sent to the prover service, one JSON object per line
+///
+/// Paths default to the ones used by the one-shot commands, so jobs that should run concurrently
+/// must set them explicitly.
+#[derive(Deserialize)]
+pub struct Job {
+    pub engine: Engine,
+    pub command: Operation,
+    /// Path of the proving/verifying data
+    #[serde(default)]
+    pub config: Option<String>,
+    /// Path of the proof to write (prove) or read (PoB verify)
+    #[serde(default)]
+    pub proof: Option<String>,
+    /// Path of the PoB public input to write (prove) or read (verify)
+    #[serde(default)]
+    pub public_input: Option<String>,
+    /// Path of the inverse Miller loop output to write (PoB prove)
+    #[serde(default)]
+    pub prepared: Option<String>,
+}
+
+impl Job {
+    fn pob_files(&self) -> ProofFiles {
+        let default = ProofFiles::default();
+        ProofFiles {
+            proof: self.proof.clone().unwrap_or(default.proof),
+            public_input: self.public_input.clone().unwrap_or(default.public_input),
+            prepared: self.prepared.clone(),
+        }
+    }
+}
+
+/// The reply to a [Job], one JSON object per line
+#[derive(Serialize)]
+pub struct JobResult {
+    pub ok: bool,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    pub valid: Option<bool>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    pub error: Option<String>,
+}
+
+/// Keys of the TCP and PoB systems, loaded once and shared by all jobs
+pub struct ProverService {
+    tcp_pk: <UniversalTCPSnark as TCPSystem>::ProvingKey,
+    tcp_vk: <UniversalTCPSnark as TCPSystem>::VerifyingKey,
+    pob_parameters: PredicateParameters,
+    pob_pk: ProvingKey<MNT4_753>,
+    pob_vk: VerifyingKey<MNT4_753>,
+}
+
+impl ProverService {
+    /// Load the keys of both engines
+    pub fn load() -> Result<Self> {
+        Ok(Self {
+            tcp_pk: <UniversalTCPSnark as TCPSystem>::load_pk()
+                .map_err(|e| anyhow!("Failed to load TCP pk. Error: {}", e))?,
+            tcp_vk: <UniversalTCPSnark as TCPSystem>::load_vk()
+                .map_err(|e| anyhow!("Failed to load TCP vk. Error: {}", e))?,
+            pob_parameters: pob::load_predicate_parameters()?,
+            pob_pk: pob::load_pk()?,
+            pob_vk: pob::load_vk()?,
+        })
+    }
+
+    /// Execute `job` with the keys held in memory
+    pub fn run(&self, job: Job) -> Result<Option<bool>> {
+        match (&job.engine, &job.command) {
+            (Engine::TcpEngine, Operation::Prove) => {
+                let proving_data = ProvingDataTCP::load(
+                    job.config.unwrap_or_else(|| TCP_PROVING_DATA.to_string()),
+                )?;
+                <UniversalTCPSnark as TCPSystem>::prove_with_pk(
+                    &self.tcp_pk,
+                    proving_data,
+                    job.proof,
+                )?;
+                Ok(None)
+            }
+            (Engine::TcpEngine, Operation::Verify) => {
+                let verifying_data = VerifyingDataTCP::load(
+                    job.config.unwrap_or_else(|| TCP_VERIFYING_DATA.to_string()),
+                )?;
+                <UniversalTCPSnark as TCPSystem>::verify_with_vk(&self.tcp_vk, verifying_data)
+                    .map(Some)
+            }
+            (Engine::PobEngine, Operation::Prove) => {
+                let files = job.pob_files();
+                let proving_data =
+                    ProvingDataPoB::load(job.config.as_deref().unwrap_or(POB_PROVING_DATA))?;
+                pob::prove_with_pk(&self.pob_parameters, &self.pob_pk, proving_data, &files)?;
+                Ok(None)
+            }
+            (Engine::PobEngine, Operation::Verify) => {
+                pob::verify_with_vk(&self.pob_vk, &job.pob_files()).map(Some)
+            }
+        }
+    }
+
+    /// Serve jobs received over the Unix socket at `socket_path`
+    ///
+    /// Each connection is handled on its own thread, so that independent jobs can run concurrently.
+    pub fn serve(self, socket_path: &str) -> Result<()> {
+        let socket_path = Path::new(socket_path);
+        if let Some(parent) = socket_path.parent() {
+            fs::create_dir_all(parent)?;
+        }
+        // Remove a socket left behind by a previous instance
+        let _ = fs::remove_file(socket_path);
+        let listener = UnixListener::bind(socket_path)
+            .map_err(|e| anyhow!("Failed to bind {}. Error: {}", socket_path.display(), e))?;
+
+        let service = Arc::new(self);
+        for stream in listener.incoming() {
+            match stream {
+                Ok(stream) => {
+                    let service = Arc::clone(&service);
+                    thread::spawn(move || {
+                        if let Err(e) = service.handle_connection(stream) {
+                            eprintln!("Connection closed with error: {}", e);
+                        }
+                    });
+                }
+                Err(e) => eprintln!("Failed to accept connection. Error: {}", e),
+            }
+        }
+        Ok(())
+    }
+
+    fn handle_connection(&self, stream: UnixStream) -> Result<()> {
+        let mut writer = stream.try_clone()?;
+        for line in BufReader::new(stream).lines() {
+            let line = line?;
+            if line.trim().is_empty() {
+                continue;
+            }
+            let result = match serde_json::from_str::<Job>(&line) {
+                Ok(job) => match self.run(job) {
+                    Ok(valid) => JobResult {
+                        ok: true,
+                        valid,
+                        error: None,
+                    },
+                    Err(e) => JobResult {
+                        ok: false,
+                        valid: None,
+                        error: Some(e.to_string()),
+                    },
+                },
+                Err(e) => JobResult {
+                    ok: false,
+                    valid: None,
+                    error: Some(format!("Failed to parse job. Error: {}", e)),
+                },
+            };
+            writeln!(writer, "{}", serde_json::to_string(&result)?)?;
+            writer.flush()?;
+        }
+        Ok(())
+    }
+}
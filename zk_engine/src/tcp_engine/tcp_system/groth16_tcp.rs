@@ -108,9 +108,17 @@ impl TCPSystem for UniversalTCPSnark {
     }
 
     /// Generate a proof for the provided `ProvingData`
-    fn prove(proving_data: ProvingData) -> Result<()> {
+    fn prove(proving_data: ProvingData, proof_path: Option<String>) -> Result<()> {
         let pk = Self::load_pk().map_err(|e| anyhow!("Failed to load pk. Error: {}", e))?;
+        <Self as TCPSystem>::prove_with_pk(&pk, proving_data, proof_path)
+    }
 
+    /// Generate a proof for the provided `ProvingData` with the proving key `pk`
+    fn prove_with_pk(
+        pk: &Self::ProvingKey,
+        proving_data: ProvingData,
+        proof_path: Option<String>,
+    ) -> Result<()> {
         // Proving data
         let input_index = proving_data.chain_parameters.input_index;
         let output_index = proving_data.chain_parameters.output_index;
@@ -140,10 +148,11 @@ impl TCPSystem for UniversalTCPSnark {
         // Proof generation
         let public_input: UniversalTransactionChainProofPublicInput = proving_data.clone().into();
         let witness = UniversalTransactionChainProofWitness::<Self::Proof> { tx, prior_proof };
-        let proof = Self::prove(input_index, output_index, &pk, &public_input, &witness).unwrap();
+        let proof = Self::prove(input_index, output_index, pk, &public_input, &witness).unwrap();
 
         // Save proof to file
-        let proof_path = Self::PROOFS_PATH.to_owned() + &proving_data.proof_name + ".bin";
+        let proof_path = proof_path
+            .unwrap_or_else(|| Self::PROOFS_PATH.to_owned() + &proving_data.proof_name + ".bin");
         save_to_file(&data_to_serialisation(&proof), &proof_path)
             .map_err(|e| anyhow!("Failed to save proof. Error: {}", e))?;
 
@@ -153,12 +162,17 @@ impl TCPSystem for UniversalTCPSnark {
     /// Verify the proof contained in `VerifyingData`
     fn verify(verifying_data: VerifyingData) -> Result<bool> {
         let vk = Self::load_vk().map_err(|e| anyhow!("Failed to load vk. Error: {}", e))?;
+        <Self as TCPSystem>::verify_with_vk(&vk, verifying_data)
+    }
+
+    /// Verify the proof contained in `VerifyingData` with the verifying key `vk`
+    fn verify_with_vk(vk: &Self::VerifyingKey, verifying_data: VerifyingData) -> Result<bool> {
         let proof_path = Self::PROOFS_PATH.to_owned() + &verifying_data.proof_path + ".bin";
         let proof =
             Self::Proof::deserialize_unchecked(Cursor::new(read_from_file(&proof_path).unwrap()))
                 .map_err(|e| anyhow!("Failed to deserialize proof. Error: {}", e))?;
         let public_input: UniversalTransactionChainProofPublicInput = verifying_data.into();
-        Self::verify(&vk, &public_input, &proof)
+        Self::verify(vk, &public_input, &proof)
             .map_err(|e| anyhow!("Failed to verify the proof. Error: {:?}", e))
     }
 
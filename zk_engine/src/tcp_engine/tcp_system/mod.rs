@@ -23,11 +23,22 @@ pub trait TCPSystem {
     fn setup(setup_data: SetupData) -> Result<()>;
 
     // Prove that an input is in a transaction chain
-    fn prove(proving_data: ProvingData) -> Result<()>;
+    // The proof is saved to `proof_path`, or under `PROOFS_PATH` with the name in `proving_data` if `None`
+    fn prove(proving_data: ProvingData, proof_path: Option<String>) -> Result<()>;
+
+    // Prove that an input is in a transaction chain using an already loaded proving key
+    fn prove_with_pk(
+        pk: &Self::ProvingKey,
+        proving_data: ProvingData,
+        proof_path: Option<String>,
+    ) -> Result<()>;
 
     // Verify that an input is in a transaction chain
     fn verify(verifying_data: VerifyingData) -> Result<bool>;
 
+    // Verify that an input is in a transaction chain using an already loaded verifying key
+    fn verify_with_vk(vk: &Self::VerifyingKey, verifying_data: VerifyingData) -> Result<bool>;
+
     // Load the proving key of the TCP system
     fn load_pk() -> Result<Self::ProvingKey>;
 